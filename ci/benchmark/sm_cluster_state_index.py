@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark for services lookups in SMClusterState, that are used during validation and reporting.
+It compares the previous implementation (scan of services of all sites on every call) with lookups in services index,
+that is built once after sites discovery.
+
+Usage: python3 ci/benchmark/sm_cluster_state_index.py [services-number] [calls-number]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from sm_client.data import settings  # noqa: E402
+from sm_client.data.structures import SMClusterState, SMConf  # noqa: E402
+
+SITES = ("site-1", "site-2")
+MODULES = ("stateful", "notstateful")
+
+
+def make_cluster_state(services_number: int) -> SMClusterState:
+    """ Makes cluster state, where all services exist on both sites """
+    settings.current().sm_conf = SMConf({site: {} for site in SITES})
+    settings.current().module_flow = [{module: None} for module in MODULES]
+    return SMClusterState({site: {"status": True, "services": {
+        f"serv{i}": {"module": MODULES[i % len(MODULES)], "sequence": ["standby", "active"]}
+        for i in range(services_number)}} for site in SITES})
+
+
+def scan_services_list(sm_dict: SMClusterState) -> list:
+    """ Previous get_services_list_for_ok_site implementation """
+    final_set: set = set()
+    for site in sm_dict.sm.values():
+        final_set = final_set.union(set(list(site['services'].keys())))
+    return list(final_set)
+
+
+def scan_module_services(sm_dict: SMClusterState, site, module) -> list:
+    """ Previous get_module_services implementation """
+    module_list = []
+    for serv in sm_dict.sm[site]['services'].keys():
+        if sm_dict.sm[site]['services'][serv].get('module') and module == sm_dict.sm[site]['services'][serv]['module']:
+            module_list.append(serv)
+    return module_list
+
+
+def scan_ignored_services(sm_dict: SMClusterState, service_dep_ordered: list) -> list:
+    """ Previous make_ignored_services implementation """
+    ignored_list = []
+    for site in sm_dict.sm.keys():
+        for serv in sm_dict.sm[site]['services']:
+            if serv not in service_dep_ordered and serv not in settings.current().ignored_services:
+                ignored_list.append(serv)
+    return list(set(ignored_list))
+
+
+def run_scan(sm_dict: SMClusterState, calls_number: int, run_services: list):
+    """ Runs lookups with previous implementation """
+    for _ in range(calls_number):
+        scan_services_list(sm_dict)
+        scan_module_services(sm_dict, SITES[0], MODULES[0])
+    scan_ignored_services(sm_dict, run_services)
+
+
+def run_index(sm_dict: SMClusterState, calls_number: int, run_services: list):
+    """ Runs lookups with services index """
+    sm_dict.build_index()
+    for _ in range(calls_number):
+        sm_dict.get_services_list_for_ok_site()
+        sm_dict.get_module_services(SITES[0], MODULES[0])
+    sm_dict.make_ignored_services(run_services)
+
+
+def measure(func, *args) -> float:
+    """ Returns execution time of func in seconds """
+    start_time = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    services_number = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    calls_number = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    state = make_cluster_state(services_number)
+    services_to_run = [f"serv{i}" for i in range(0, services_number, 2)]
+    assert sorted(scan_services_list(state)) == sorted(state.get_services_list_for_ok_site())
+    assert scan_module_services(state, SITES[0], MODULES[0]) == state.get_module_services(SITES[0], MODULES[0])
+    assert sorted(scan_ignored_services(state, services_to_run)) == \
+           sorted(state.make_ignored_services(services_to_run))
+
+    scan_time = measure(run_scan, state, calls_number, services_to_run)
+    index_time = measure(run_index, state, calls_number, services_to_run)
+    print(f"Services: {services_number} x {len(SITES)} sites, calls: {calls_number}")
+    print(f"Scan: {scan_time:.3f} seconds")
+    print(f"Index: {index_time:.3f} seconds")
+    print(f"Speedup: {scan_time / index_time:.0f}x")
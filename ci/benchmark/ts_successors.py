@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark for successors lookup in TopologicalSorter2, that is used to skip services, that depend on failed one.
+It compares the previous implementation (linear scan of all nodes for every lookup and cascading skip through
+direct successors) with indexed transitive lookup on the graph, where the root service fails.
+
+Usage: python3 ci/benchmark/ts_successors.py [nodes-number]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from sm_client.data.structures import TopologicalSorter2  # noqa: E402
+
+
+def make_graph(nodes_number: int) -> TopologicalSorter2:
+    """ Makes graph, where all services depend on root one directly or through other services """
+    rnd = random.Random(42)
+    ts = TopologicalSorter2()
+    ts.add("serv0")
+    for i in range(1, nodes_number):
+        ts.add(f"serv{i}", *{f"serv{rnd.randrange(max(0, i - 50), i)}" for _ in range(rnd.randint(1, 3))})
+    ts.prepare()
+    return ts
+
+
+def linear_successors(ts: TopologicalSorter2, node):
+    """ Previous successors implementation: scan of all nodes """
+    for i in ts._node2info.values():
+        if i.node == node:
+            return i.successors
+    return None
+
+
+def skip_with_linear_lookup(ts: TopologicalSorter2) -> int:
+    """ Previous failed services handling: direct successors of every failed or skipped service are marked """
+    failed_successors = []
+    failed = ["serv0"]
+    while failed:
+        for s in linear_successors(ts, failed.pop()):
+            if s not in failed_successors:
+                failed_successors.append(s)
+                failed.append(s)
+    return len(failed_successors)
+
+
+def skip_with_indexed_lookup(ts: TopologicalSorter2) -> int:
+    """ Current failed services handling: all transitive successors of failed service are marked at once """
+    failed_successors = set(ts.transitive_successors("serv0"))
+    return len(failed_successors)
+
+
+def measure(func, ts) -> float:
+    """ Returns execution time of func in seconds """
+    start_time = time.perf_counter()
+    func(ts)
+    return time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    nodes_number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    graph = make_graph(nodes_number)
+    assert skip_with_linear_lookup(graph) == skip_with_indexed_lookup(graph) == nodes_number - 1
+
+    linear_time = measure(skip_with_linear_lookup, graph)
+    indexed_time = measure(skip_with_indexed_lookup, graph)
+    print(f"Nodes: {nodes_number}")
+    print(f"Linear lookup: {linear_time:.3f} seconds")
+    print(f"Indexed lookup: {indexed_time:.3f} seconds")
+    print(f"Speedup: {linear_time / indexed_time:.0f}x")
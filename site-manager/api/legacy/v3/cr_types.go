@@ -47,6 +47,8 @@ type CRSpecSiteManager struct {
 	Sequence                []string         `json:"sequence"`
 	AllowedStandbyStateList []string         `json:"allowedStandbyStateList"`
 	Timeout                 *int64           `json:"timeout,omitempty"`
+	PollingInitialDelay     *int64           `json:"pollingInitialDelay,omitempty"`
+	PollingMaxDelay         *int64           `json:"pollingMaxDelay,omitempty"`
 	Parameters              CRSpecParameters `json:"parameters"`
 }
 
@@ -147,6 +147,16 @@ func (in *CRSpecSiteManager) DeepCopyInto(out *CRSpecSiteManager) {
 		*out = new(int64)
 		**out = **in
 	}
+	if in.PollingInitialDelay != nil {
+		in, out := &in.PollingInitialDelay, &out.PollingInitialDelay
+		*out = new(int64)
+		**out = **in
+	}
+	if in.PollingMaxDelay != nil {
+		in, out := &in.PollingMaxDelay, &out.PollingMaxDelay
+		*out = new(int64)
+		**out = **in
+	}
 	out.Parameters = in.Parameters
 }
 
@@ -42,6 +42,12 @@ type SiteManagerOptions struct {
 	//+kubebuilder:validation:Minimum:=10
 	//+kubebuilder:validation:Maximum:=1000
 	Timeout                 *int64     `json:"timeout,omitempty"`
+	//+kubebuilder:validation:Minimum:=1
+	//+kubebuilder:validation:Maximum:=60
+	PollingInitialDelay     *int64     `json:"pollingInitialDelay,omitempty"`
+	//+kubebuilder:validation:Minimum:=1
+	//+kubebuilder:validation:Maximum:=300
+	PollingMaxDelay         *int64     `json:"pollingMaxDelay,omitempty"`
 	Parameters              Parameters `json:"parameters,omitempty"`
 }
 
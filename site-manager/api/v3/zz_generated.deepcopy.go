@@ -131,6 +131,16 @@ func (in *SiteManagerOptions) DeepCopyInto(out *SiteManagerOptions) {
 		*out = new(int64)
 		**out = **in
 	}
+	if in.PollingInitialDelay != nil {
+		in, out := &in.PollingInitialDelay, &out.PollingInitialDelay
+		*out = new(int64)
+		**out = **in
+	}
+	if in.PollingMaxDelay != nil {
+		in, out := &in.PollingMaxDelay, &out.PollingMaxDelay
+		*out = new(int64)
+		**out = **in
+	}
 	out.Parameters = in.Parameters
 }
 
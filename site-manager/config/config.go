@@ -26,6 +26,13 @@ type Config struct {
 	// timeouts
 	PostRequestTimeout int64 `envconfig:"SM_POST_REQUEST_TIMEOUT" default:"30"`
 	GetRequestTimeout  int64 `envconfig:"SM_GET_REQUEST_TIMEOUT" default:"10"`
+
+	// the number of parallel requests to services during status collection for the list of services
+	StatusWorkers int `envconfig:"SM_STATUS_WORKERS" default:"10"`
+
+	// long-poll status configuration: interval between service status requests and max wait time in seconds
+	LongPollInterval   int64 `envconfig:"SM_LONG_POLL_INTERVAL" default:"1"`
+	LongPollMaxTimeout int64 `envconfig:"SM_LONG_POLL_MAX_TIMEOUT" default:"60"`
 }
 
 var EnvConfig Config
@@ -123,7 +123,7 @@ func getServices(crManager service.CRManager) func(c echo.Context) error {
 		if smErr != nil {
 			return c.JSON(smErr.GetStatusCode(), smErr)
 		}
-		return c.JSON(http.StatusOK, smDict)
+		return c.JSON(http.StatusOK, model.SMDictionaryResponse{SMDictionary: *smDict, Features: model.AllFeatures})
 	}
 }
 
@@ -165,6 +165,20 @@ func processService(crManager service.CRManager) func(c echo.Context) error {
 			}
 			return c.JSON(http.StatusOK, listResp)
 		case model.ProcedureStatus:
+			if smRequest.Services != nil {
+				statusResp, smErr := crManager.GetServicesStatus(c.Request().Context(), smRequest.Services, smRequest.WithDeps)
+				if smErr != nil {
+					return c.JSON(smErr.GetStatusCode(), smErr)
+				}
+				return c.JSON(http.StatusOK, statusResp)
+			}
+			if smRequest.WaitTimeout > 0 && !smRequest.WithDeps {
+				statusResp, smErr := crManager.WaitServiceStatus(c.Request().Context(), smRequest.Service, smRequest.WaitMode, smRequest.WaitTimeout)
+				if smErr != nil {
+					return c.JSON(smErr.GetStatusCode(), smErr)
+				}
+				return c.JSON(http.StatusOK, statusResp)
+			}
 			statusResp, smErr := crManager.GetServiceStatus(c.Request().Context(), smRequest.Service, smRequest.WithDeps)
 			if smErr != nil {
 				return c.JSON(smErr.GetStatusCode(), smErr)
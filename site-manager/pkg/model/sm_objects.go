@@ -20,6 +20,8 @@ type SMObject struct {
 	AllowedStandbyStateList []string           `yaml:"allowedStandbyStateList" json:"allowedStandbyStateList"`
 	Parameters              SMObjectParameters `yaml:"parameters" json:"parameters"`
 	Timeout                 *int64             `yaml:"timeout" json:"timeout,omitempty"`
+	PollingInitialDelay     *int64             `yaml:"pollingInitialDelay" json:"pollingInitialDelay,omitempty"`
+	PollingMaxDelay         *int64             `yaml:"pollingMaxDelay" json:"pollingMaxDelay,omitempty"`
 	Alias                   *string            `yaml:"alias" json:"alias,omitempty"`
 }
 
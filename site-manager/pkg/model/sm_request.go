@@ -1,6 +1,9 @@
 package model
 
-import "net/http"
+import (
+	"encoding/json"
+	"net/http"
+)
 
 // ProcedureType is special type for procedures
 type ProcedureType string
@@ -15,12 +18,52 @@ const (
 
 var AllProcedures = [...]ProcedureType{ProcedureList, ProcedureStatus, ProcedureActive, ProcedureStandby, ProcedureDisable}
 
+const (
+	// FeatureServicesList means, that run-service can be defined as the list of services for status procedure
+	FeatureServicesList = "services-list"
+	// FeatureLongPoll means, that status procedure can wait till the end of service procedure
+	FeatureLongPoll = "long-poll"
+)
+
+// AllFeatures is the list of api features, that are supported by site-manager
+var AllFeatures = []string{FeatureServicesList, FeatureLongPoll}
+
 // SMRequest is used as request body in site-manager api
 type SMRequest struct {
 	Procedure ProcedureType `json:"procedure"`
 	Service   *string       `json:"run-service"`
+	Services  []string      `json:"-"` // is filled, if run-service is defined as the list of services
 	WithDeps  bool          `json:"with_deps"`
 	NoWait    bool          `json:"no-wait"`
+	// WaitTimeout enables long-poll for status procedure: max time in seconds to wait till the end of procedure
+	WaitTimeout int64 `json:"wait-timeout"`
+	// WaitMode is the mode, that is expected after the end of procedure in long-poll
+	WaitMode string `json:"wait-mode"`
+}
+
+// UnmarshalJSON allows to define run-service as single service name or as the list of service names
+func (smr *SMRequest) UnmarshalJSON(data []byte) error {
+	type smRequestAlias SMRequest
+	aux := struct {
+		*smRequestAlias
+		Service json.RawMessage `json:"run-service"`
+	}{smRequestAlias: (*smRequestAlias)(smr)}
+	if err := json.Unmarshal(data, &aux); err != nil {
+		return err
+	}
+	smr.Service, smr.Services = nil, nil
+	if len(aux.Service) == 0 || string(aux.Service) == "null" {
+		return nil
+	}
+	if aux.Service[0] == '[' {
+		return json.Unmarshal(aux.Service, &smr.Services)
+	}
+	var service string
+	if err := json.Unmarshal(aux.Service, &service); err != nil {
+		return err
+	}
+	smr.Service = &service
+	return nil
 }
 
 // SMListResponse is used as response for list procedure
@@ -28,9 +71,21 @@ type SMListResponse struct {
 	Services []string `json:"all-services"`
 }
 
+// SMDictionaryResponse is used as response for services dictionary request
+type SMDictionaryResponse struct {
+	SMDictionary
+	Features []string `json:"features"`
+}
+
 // SMStatusResponse is used as response for status procedure
 type SMStatusResponse struct {
 	Services map[string]SMStatus `json:"services"`
+	LongPoll bool                `json:"long-poll,omitempty"`
+}
+
+// IsFinished checks, if service procedure is finished: it's failed or done in expected mode (any mode, if it's empty)
+func (sms *SMStatus) IsFinished(mode string) bool {
+	return sms.Status == "failed" || (sms.Status == "done" && (mode == "" || sms.Mode == mode))
 }
 
 // SMStatus collects the status only for specific service
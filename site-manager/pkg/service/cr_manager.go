@@ -9,6 +9,7 @@ import (
 	"os"
 	"strconv"
 	"strings"
+	"sync"
 	"time"
 
 	legacyv3 "github.com/netcracker/drnavigator/site-manager/api/legacy/v3"
@@ -33,6 +34,10 @@ type CRManager interface {
 	GetServicesList(ctx context.Context) (*model.SMListResponse, *model.SMError)
 	// GetServiceStatus returns the status of given service
 	GetServiceStatus(ctx context.Context, serviceName *string, withDeps bool) (*model.SMStatusResponse, *model.SMError)
+	// GetServicesStatus returns the statuses of given services
+	GetServicesStatus(ctx context.Context, serviceNames []string, withDeps bool) (*model.SMStatusResponse, *model.SMError)
+	// WaitServiceStatus waits till the end of procedure for given service and returns its status
+	WaitServiceStatus(ctx context.Context, serviceName *string, mode string, timeout int64) (*model.SMStatusResponse, *model.SMError)
 	// ProcessService do given procudedure for given service
 	ProcessService(ctx context.Context, serviceName *string, procedure string, noWait bool) (*model.SMProcedureResponse, *model.SMError)
 }
@@ -141,6 +146,95 @@ func (crm *CRManagerImpl) GetServiceStatus(ctx context.Context, serviceName *str
 	return result, nil
 }
 
+// GetServicesStatus returns the statuses of given services. Without dependencies statuses are collected in parallel
+// by SM_STATUS_WORKERS workers, service, which status can't be collected, is returned with "--" status and error message
+func (crm *CRManagerImpl) GetServicesStatus(ctx context.Context, serviceNames []string, withDeps bool) (*model.SMStatusResponse, *model.SMError) {
+	smDict, smErr := crm.GetAllServices(ctx)
+	if smErr != nil {
+		return nil, smErr
+	}
+	for i := range serviceNames {
+		if _, smErr = crm.getServiceObject(&serviceNames[i], smDict, true); smErr != nil {
+			return nil, smErr
+		}
+	}
+
+	result := &model.SMStatusResponse{Services: map[string]model.SMStatus{}}
+	if withDeps {
+		if err := crm.collectServicesStatuses(serviceNames, smDict, nil, withDeps, result); err != nil {
+			return nil, err
+		}
+		return result, nil
+	}
+
+	workers := envconfig.EnvConfig.StatusWorkers
+	if workers < 1 {
+		workers = 1
+	}
+	semaphore := make(chan struct{}, workers)
+	var mutex sync.Mutex
+	var wg sync.WaitGroup
+	requested := map[string]bool{}
+	for _, serviceName := range serviceNames {
+		if requested[serviceName] {
+			continue
+		}
+		requested[serviceName] = true
+		serviceObj := smDict.Services[serviceName]
+		wg.Add(1)
+		go func(serviceName string, serviceObj model.SMObject) {
+			defer wg.Done()
+			semaphore <- struct{}{}
+			defer func() { <-semaphore }()
+			status, err := crm.getServiceStatus(&serviceObj)
+			if err != nil {
+				crManagerLog.Error(err, "Can't collect service status", "service-name", serviceName)
+				status.Message = err.Message
+			}
+			mutex.Lock()
+			result.Services[serviceName] = status
+			mutex.Unlock()
+		}(serviceName, serviceObj)
+	}
+	wg.Wait()
+	return result, nil
+}
+
+// WaitServiceStatus waits till the end of procedure for given service (service is failed or done in given mode)
+// during timeout and returns its status. Service status is requested every SM_LONG_POLL_INTERVAL seconds
+func (crm *CRManagerImpl) WaitServiceStatus(ctx context.Context, serviceName *string, mode string, timeout int64) (*model.SMStatusResponse, *model.SMError) {
+	smDict, smErr := crm.GetAllServices(ctx)
+	if smErr != nil {
+		return nil, smErr
+	}
+	serviceObj, smErr := crm.getServiceObject(serviceName, smDict, true)
+	if smErr != nil {
+		return nil, smErr
+	}
+
+	timeout = min(timeout, envconfig.EnvConfig.LongPollMaxTimeout)
+	deadline := time.NewTimer(time.Duration(timeout) * time.Second)
+	defer deadline.Stop()
+	interval := time.Duration(max(envconfig.EnvConfig.LongPollInterval, 1)) * time.Second
+	for {
+		status, err := crm.getServiceStatus(serviceObj)
+		if err != nil {
+			status.Message = err.Message
+		}
+		result := &model.SMStatusResponse{Services: map[string]model.SMStatus{*serviceName: status}, LongPoll: true}
+		if err == nil && status.IsFinished(mode) {
+			return result, nil
+		}
+		select {
+		case <-ctx.Done():
+			return result, nil
+		case <-deadline.C:
+			return result, nil
+		case <-time.After(interval):
+		}
+	}
+}
+
 // ProcessService do given procudedure for given service
 func (crm *CRManagerImpl) ProcessService(ctx context.Context, serviceName *string, procedure string, noWait bool) (*model.SMProcedureResponse, *model.SMError) {
 	smDict, smErr := crm.GetAllServices(ctx)
@@ -274,8 +368,10 @@ func (crm *CRManagerImpl) convertToDict(legacyList *legacyv3.CRList, list *quber
 				ServiceEndpoint: obj.Spec.SiteManager.Parameters.ServiceEndpoint,
 				HealthzEndpoint: obj.Spec.SiteManager.Parameters.HealthzEndpoint,
 			},
-			Timeout: obj.Spec.SiteManager.Timeout,
-			Alias:   obj.Spec.SiteManager.Alias,
+			Timeout:             obj.Spec.SiteManager.Timeout,
+			PollingInitialDelay: obj.Spec.SiteManager.PollingInitialDelay,
+			PollingMaxDelay:     obj.Spec.SiteManager.PollingMaxDelay,
+			Alias:               obj.Spec.SiteManager.Alias,
 		}
 		applyDefaults(&smObj)
 		result.Services[obj.GetServiceName()] = smObj
@@ -296,8 +392,10 @@ func (crm *CRManagerImpl) convertToDict(legacyList *legacyv3.CRList, list *quber
 				ServiceEndpoint: obj.Spec.SiteManager.Parameters.ServiceEndpoint,
 				HealthzEndpoint: obj.Spec.SiteManager.Parameters.HealthzEndpoint,
 			},
-			Timeout: obj.Spec.SiteManager.Timeout,
-			Alias:   obj.Spec.SiteManager.Alias,
+			Timeout:             obj.Spec.SiteManager.Timeout,
+			PollingInitialDelay: obj.Spec.SiteManager.PollingInitialDelay,
+			PollingMaxDelay:     obj.Spec.SiteManager.PollingMaxDelay,
+			Alias:               obj.Spec.SiteManager.Alias,
 		}
 		applyDefaults(&smObj)
 		if prev, ok := result.Services[obj.GetServiceName()]; ok {
@@ -3,6 +3,7 @@ package test
 import (
 	"context"
 	"testing"
+	"time"
 
 	envconfig "github.com/netcracker/drnavigator/site-manager/config"
 	"github.com/netcracker/drnavigator/site-manager/pkg/model"
@@ -380,3 +381,93 @@ func TestCRManager_DepsCycles(t *testing.T) {
 		},
 	}, serviceEStatus, "status for serviceE is not desired")
 }
+
+func TestCRManager_StatusForServicesList(t *testing.T) {
+	_ = envconfig.InitConfig()
+	assert := require.New(t)
+	httpClientMock := mock.HttpClientMock{
+		ServiceStatus: model.ServiceSiteManagerResponse{Mode: "active", Status: "done"},
+		ServiceHealth: model.ServiceHealthzResponse{Status: "up"},
+	}
+	tokenWatcher, err := service.NewTokenWatcher(&smConfig, nil, "")
+	assert.Nil(err, "Can't create token watcher")
+
+	crManager := service.CRManagerImpl{
+		SMConfig:      &smConfig,
+		GetHttpClient: &httpClientMock,
+		TokenWatcher:  tokenWatcher,
+	}
+
+	// Check, that all requested services are returned without deps
+	servicesStatus, err := crManager.GetServicesStatus(context.Background(), []string{serviceA, serviceC, serviceD, serviceA}, false)
+	assert.Nil(err, "Can't get status for services list")
+	assert.Equal(3, len(servicesStatus.Services), "only requested services should be in status")
+	for _, serviceName := range []string{serviceA, serviceC, serviceD} {
+		assert.Contains(servicesStatus.Services, serviceName, "%s should be specified in status", serviceName)
+		assert.Equal("done", servicesStatus.Services[serviceName].Status, "status for %s is not desired", serviceName)
+		assert.Nil(servicesStatus.Services[serviceName].Deps, "deps should not be in status")
+	}
+
+	// Check, that deps are collected for all requested services
+	servicesStatus, err = crManager.GetServicesStatus(context.Background(), []string{serviceA, serviceC}, true)
+	assert.Nil(err, "Can't get status for services list")
+	assert.Equal(&model.SMStatusResponse{
+		Services: map[string]model.SMStatus{
+			serviceA: expectedStatusA,
+			serviceB: expectedStatusB,
+			serviceC: expectedStatusC,
+		},
+	}, servicesStatus, "status for services list is not desired")
+
+	// Check, that not exist service is reported
+	notExistService := "not-exist"
+	_, err = crManager.GetServicesStatus(context.Background(), []string{serviceA, notExistService}, false)
+	assert.Equal(&model.SMError{
+		Message: "Service doesn't exist",
+		Service: &notExistService,
+	}, err, "not exist service error should be returned")
+}
+
+func TestCRManager_WaitServiceStatus(t *testing.T) {
+	_ = envconfig.InitConfig()
+	assert := require.New(t)
+	httpClientMock := mock.HttpClientMock{
+		ServiceStatus: model.ServiceSiteManagerResponse{Mode: "active", Status: "done"},
+		ServiceHealth: model.ServiceHealthzResponse{Status: "up"},
+	}
+	tokenWatcher, err := service.NewTokenWatcher(&smConfig, nil, "")
+	assert.Nil(err, "Can't create token watcher")
+
+	crManager := service.CRManagerImpl{
+		SMConfig:      &smConfig,
+		GetHttpClient: &httpClientMock,
+		TokenWatcher:  tokenWatcher,
+	}
+
+	// Check, that finished service is returned immediately
+	startTime := time.Now()
+	serviceStatus, err := crManager.WaitServiceStatus(context.Background(), &serviceA, "active", 10)
+	assert.Nil(err, "Can't wait status for %s", serviceA)
+	assert.Less(time.Since(startTime), time.Second, "finished service should be returned immediately")
+	assert.Equal(&model.SMStatusResponse{
+		Services: map[string]model.SMStatus{
+			serviceA: {Mode: "active", Status: "done", Health: "up"},
+		},
+		LongPoll: true,
+	}, serviceStatus, "status for serviceA is not desired")
+
+	// Check, that current status is returned after timeout, if service is not in expected mode
+	startTime = time.Now()
+	serviceStatus, err = crManager.WaitServiceStatus(context.Background(), &serviceA, "standby", 1)
+	assert.Nil(err, "Can't wait status for %s", serviceA)
+	assert.GreaterOrEqual(time.Since(startTime), time.Second, "service status should be returned after timeout")
+	assert.Equal("active", serviceStatus.Services[serviceA].Mode, "status for serviceA is not desired")
+
+	// Check, that not exist service is reported
+	notExistService := "not-exist"
+	_, err = crManager.WaitServiceStatus(context.Background(), &notExistService, "active", 1)
+	assert.Equal(&model.SMError{
+		Message: "Service doesn't exist",
+		Service: &notExistService,
+	}, err, "not exist service error should be returned")
+}
@@ -0,0 +1,349 @@
+"""Importable API to run DR procedures.
+Every DRSession keeps own run parameters, services results, workers and queues, so several procedures
+(e.g. for different site pairs) can be run in parallel threads of one process:
+
+    with DRSession(config="config.yaml") as session:
+        result = session.run("move", "k8s-2")
+    if not result.ok:
+        ...
+"""
+import argparse
+import contextvars
+import copy
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional, Dict
+
+from sm_client import history, processing, simulation
+from sm_client.data import settings
+from sm_client.data.structures import SMClusterState, NotValid
+from sm_client.initialization import sm_get_cluster_state, init_and_check_config, get_config_pairs
+from sm_client.prepare import make_ordered_services_to_process
+from sm_client.processing import run_status_procedure, run_dr_or_site_procedure, make_graph_cursor
+from sm_client.validation import validate_operation
+
+
+class ProcedureResult(NamedTuple):
+    """ Result of DR procedure run """
+    ok: bool                                # procedure is finished and there are no failed services
+    cmd: str
+    site: Optional[str]
+    message: str = ""                       # the reason, why procedure is not ok
+    services: tuple = ()                    # services, that were processed, in dependency order
+    done: tuple = ()                        # services, that were successfully done
+    failed: tuple = ()                      # services, that were failed and broke the procedure
+    warned: tuple = ()                      # services, that were failed, but didn't break the procedure
+    skipped: tuple = ()                     # services, that were skipped due to dependencies
+    ignored: tuple = ()                     # services, that were ignored by --run-services or --skip-services
+    sm_dict: Optional[SMClusterState] = None  # sites and services states
+    timing: Optional[dict] = None           # procedure timing for dry run, see processing.estimate_procedure_timing
+    simulation: Optional[dict] = None       # simulated timeline, see simulation.SimulatedTransport.report
+
+
+def make_result(ok: bool, cmd, site, message="", services=(), sm_dict: SMClusterState = None,
+                timing: dict = None) -> ProcedureResult:
+    """ Makes procedure result with services results of current run """
+    return ProcedureResult(ok, cmd, site, message, tuple(services), tuple(settings.current().done_services),
+                           tuple(settings.current().failed_services), tuple(settings.current().warned_services),
+                           tuple(settings.current().skipped_due_deps_services), tuple(dict.fromkeys(settings.current().ignored_services)),
+                           sm_dict, timing)
+
+
+def log_service_order(sm_dict: SMClusterState, cmd, site):
+    """ Show service list ordered by dependency in debug mode"""
+    if cmd == "status" or cmd == "list":
+        # status and list are collected in parallel for all services, there is no order
+        return
+
+    stage = 0
+    logging.debug("Service order by dependency:")
+    for elem in settings.current().module_flow:
+        flow, flow_cmds = list(elem.items())[0]
+        # if particular flow performs only particular cmds,
+        # which are not relevant for current cmd, then we skip this flow
+        if cmd in ['standby', 'disable', 'return'] and (flow_cmds and flow_cmds == ['active']):
+            continue
+        if cmd == 'active' and (flow_cmds and set(flow_cmds) == {'standby', 'disable'}):
+            continue
+
+        # we process all services in this flow in the services order.
+        # services order is controlled by cursor of services graph (ServiceGraph)
+        ts = make_graph_cursor(sm_dict.globals[flow]['ts'])
+        while ts and ts.is_active():
+            stage += 1
+            logging.debug(f"------ Stage {stage} -------")
+
+            # for each svc, print operations which are going to be performed for this svc
+            stage_services = ts.get_ready()
+            for svc in stage_services:
+                # svc operation looks like: "$svc: $cmd on $site", with optional " -> $opposite_cmd on $opposite_site"
+                # the actual look depends on current cmd (if it is DR cmd or per-site cmd), provided site and current flow_cmds
+                if cmd in settings.dr_processing_cmd:
+                    if flow_cmds:
+                        actual_site = site
+                        is_standby_during_move = flow_cmds[0] == "standby" and cmd == "move"
+                        is_active_during_stop = flow_cmds[0] == "active" and cmd == "stop"
+                        if is_standby_during_move or is_active_during_stop:
+                            actual_site = settings.current().sm_conf.get_opposite_site(site)
+                        logging.debug(f"{svc}: {flow_cmds[0]} on {actual_site}")
+                    else:
+                        site_cmd_seq = sm_dict.get_dr_operation_sequence(svc, cmd, site)
+                        operation = " -> ".join(map(lambda site_cmd: f"{site_cmd[1]} on {site_cmd[0]}", site_cmd_seq))
+                        logging.debug(f"{svc}: {operation}")
+                else:
+                    logging.debug(f"{svc}: {cmd} on {site}")
+
+                # mark svc as done, so next time graph cursor will give us next stage, if any left for this flow
+                ts.done(svc)
+    logging.debug("------ Done ------")
+
+
+def log_procedure_summary(part, sm_dict: SMClusterState, services_to_run: list, cmd="", site=""):
+    """Print summary info"""
+    if part in "top":
+        logging.info("---------------------------------------------------------------------")
+        logging.info(f"Procedure:     {cmd}")
+        logging.info(f"Active sites:  {settings.current().sm_conf.get_active_site(cmd, site)}")
+        logging.info(f"Standby sites: {settings.current().sm_conf.get_opposite_site(settings.current().sm_conf.get_active_site(cmd, site))}")
+        logging.info(f"Kubernetes services managed by site-manager: {sm_dict.get_services_list_for_ok_site()}")
+        logging.info(f"Kubernetes services that will be processed:  {services_to_run}")
+        logging.info("---------------------------------------------------------------------")
+    elif part in "tail":
+        logging.info("---------------------------------------------------------------------")
+        logging.info("Summary:")
+        logging.info(f"services that successfully done:          {settings.current().done_services}")
+        logging.info(f"services that failed:                     {settings.current().failed_services}")
+        logging.info(f"services that warned:                     {settings.current().warned_services}")
+        logging.info(f"services that skipped due to dependency:  {settings.current().skipped_due_deps_services}")
+        logging.info(f"services that ignored:                    {settings.current().ignored_services}")
+        logging.info("---------------------------------------------------------------------")
+
+
+def run_procedure(services: list = None, cmd="", site=None) -> ProcedureResult:
+    """ Business Logic - implements main flow for initialized run parameters (see init_and_check_config)
+    @param services: services to process, all services by default
+    @param cmd: procedure command
+    @param site: the site to run procedure for, all sites for status and list commands by default
+    @returns: procedure result
+    """
+
+    # init SMClusterState object ann get status for all sites in case DR procedure or specific site in case cmd
+    # failover can be started as soon as the site, that becomes active, answered
+    with settings.current().tracer.span("cluster state", "validation"):
+        sm_dict = sm_get_cluster_state(None, settings.current().sm_conf.get_opposite_site(site) if cmd == "stop" else None)
+
+    # assemble ordered service list to proceed, keeping in services specified in cli
+    site_to_order = site if cmd not in ["stop", "move"] else None
+
+    for mod_i in settings.current().sm_conf.get_modules():
+        service_dep_ordered, return_code, ts = make_ordered_services_to_process(
+            sm_dict, site_to_order, services_to_process = services, module=mod_i)
+        # if can't order all sites services for failover, run it for opposite site
+        if ts is None and cmd == "stop":
+            opposite_site = settings.current().sm_conf.get_opposite_site(site)
+            logging.warning(f"Module: {mod_i}, can't make services order for available site, "
+                            f"trying to make order for site {opposite_site}...")
+            service_dep_ordered, return_code, ts = make_ordered_services_to_process(sm_dict,
+                                                                                    opposite_site,
+                                                                                    services_to_process=services,
+                                                                                    module=mod_i)
+        if ts:
+            logging.info(f"Module: {mod_i}, Service order creation finished successfully")
+        elif return_code:
+            logging.info(f"Module: {mod_i}, Service order creation finished, no running services have desired module")
+        else:
+            logging.error(f"Module: {mod_i}, Service order creation failed")
+
+        sm_dict.globals[mod_i]['service_dep_ordered'] = service_dep_ordered
+        sm_dict.globals[mod_i]['ts'] = ts
+        sm_dict.globals[mod_i]['deps_issue'] = not return_code
+        logging.debug(f"Module:{mod_i} list:{sm_dict.globals[mod_i]['service_dep_ordered']} "
+                      f"deps_issue:{sm_dict.globals[mod_i]['deps_issue']}")
+
+    # validation to satisfy cmd and current site status
+    service_dep_ordered = []
+    try:
+        with settings.current().tracer.span("validation", "validation"):
+            for mod_i in settings.current().sm_conf.get_modules():
+                services_list = validate_operation(sm_dict, cmd, site, services, mod_i)
+                service_dep_ordered.extend(services_list)
+        logging.debug(f"Service order {service_dep_ordered}")
+    except NotValid:
+        return make_result(False, cmd, site, f"Procedure {cmd} is not valid for current cluster state",
+                           sm_dict=sm_dict)
+
+    log_service_order(sm_dict, cmd, site)
+
+    if settings.current().dry_run:  # Check if it's a dry run
+        timing = None
+        if cmd in settings.site_processing_cmd + settings.dr_processing_cmd:
+            timing = processing.estimate_procedure_timing(sm_dict, cmd, site)
+        logging.info("Dry run mode enabled. Operation will not be executed.")
+        return make_result(True, cmd, site, services=service_dep_ordered, sm_dict=sm_dict, timing=timing)
+
+    settings.current().ignored_services.extend(sm_dict.make_ignored_services(service_dep_ordered))
+
+    # main flow by command
+    if cmd in "status":
+        run_status_procedure(sm_dict, service_dep_ordered)
+    elif cmd in "list":
+        pass
+    elif cmd in settings.site_cmds + settings.dr_procedures:  # per site command or DR procedure
+        log_procedure_summary("top", sm_dict, service_dep_ordered, cmd, site)
+        # operations, that were done before procedure was interrupted, are verified and not repeated
+        settings.current().journal.completed = processing.verify_completed_steps(
+            sm_dict, settings.current().journal.get_completed_steps(cmd, site))
+        settings.current().journal.start(cmd, site, service_dep_ordered)
+        try:
+            run_dr_or_site_procedure(sm_dict, cmd, site)
+        finally:
+            settings.current().journal.close(not settings.current().failed_services)
+        log_procedure_summary("tail", sm_dict, service_dep_ordered, cmd, site)
+    else:
+        logging.error(f"Unknown combination of {cmd} {site} options")
+        return make_result(False, cmd, site, f"Unknown combination of {cmd} {site} options", sm_dict=sm_dict)
+
+    if len(settings.current().failed_services) != 0:
+        logging.fatal(f"Some services finished {cmd} with failed status")
+        return make_result(False, cmd, site, f"Some services finished {cmd} with failed status",
+                           service_dep_ordered, sm_dict)
+
+    return make_result(True, cmd, site, services=service_dep_ordered, sm_dict=sm_dict)
+
+
+def make_args(**options) -> argparse.Namespace:
+    """ Makes sm-client arguments with default values of command line options
+    @param options: options to override, the names are the same as in command line (e.g. run_services, dry_run)
+    """
+    args = argparse.Namespace(verbose=False, config="", force=False, insecure=False, output="",
+                              ignore_restrictions=False, run_services="", skip_services="", dry_run=False,
+                              dry_run_report="", engine=None, pipeline=False, pair=None, journal=None, resume=None,
+                              trace_out=None, metrics_out=None, command="", site=None)
+    unknown = set(options) - set(vars(args))
+    if unknown:
+        raise TypeError(f"Unknown sm-client options: {sorted(unknown)}")
+    vars(args).update(options)
+    return args
+
+
+class DRSession:
+    """
+    Context of DR procedures run: run parameters from configuration and options, services results, workers and
+    queues. Procedures of one session are run one by one, different sessions can run procedures in parallel.
+    @param argparse.Namespace args: sm-client arguments, by default they are made from options (see make_args)
+    """
+
+    def __init__(self, args: argparse.Namespace = None, **options):
+        self.args = args if args is not None else make_args(**options)
+        self.context = settings.RunContext()
+
+    def call(self, func, *args, **kwargs):
+        """ Calls func with session run parameters. Threads and coroutines, that are started by func, inherit them """
+        return contextvars.copy_context().run(self._call, func, args, kwargs)
+
+    def _call(self, func, args, kwargs):
+        settings.activate(self.context)
+        return func(*args, **kwargs)
+
+    def run(self, cmd, site=None) -> ProcedureResult:
+        """ Initializes session with configuration and runs the procedure
+        @param cmd: procedure command, see settings.site_cmds and settings.dr_procedures
+        @param site: the site to run procedure for
+        @returns: procedure result, procedure doesn't exit the process
+        """
+        return self.call(self._run, cmd, site)
+
+    def _run(self, cmd, site, args: argparse.Namespace = None) -> ProcedureResult:
+        args = copy.copy(args or self.args)
+        args.command, args.site = cmd, site
+        settings.current().dry_run = args.dry_run
+        settings.current().dry_run_report = args.dry_run_report
+        if not init_and_check_config(args):
+            return make_result(False, cmd, site, "Configuration is not valid")
+
+        settings.current().ignored_services.extend(settings.current().skip_services)
+        start_time = settings.current().clock.monotonic()
+        result = make_result(False, cmd, site, "Procedure is interrupted")
+        try:
+            with settings.current().tracer.span(f"{cmd} {site or ''}".strip(), "procedure") as span:
+                result = run_procedure([i for i in settings.current().run_services if i not in settings.current().skip_services],
+                                       cmd, site)
+                span["ok"] = result.ok
+            return result
+        finally:
+            history.save_history()
+            settings.current().tracer.export()
+            settings.current().metrics.export(result, settings.current().clock.monotonic() - start_time)
+
+    def simulate(self, cmd, site, model: simulation.SimulationModel) -> ProcedureResult:
+        """ Runs the procedure with asyncio engine in virtual time against simulated site-managers, scheduling and
+        polling settings are taken from configuration as usual
+        @param cmd: DR procedure or site command to simulate
+        @param site: the site to simulate procedure for
+        @param model: services and durations of their procedures
+        @returns: procedure result with simulated timeline in simulation field
+        """
+        return self.call(self._simulate, cmd, site, model)
+
+    def _simulate(self, cmd, site, model: simulation.SimulationModel) -> ProcedureResult:
+        args = copy.copy(self.args)
+        args.engine, args.dry_run, args.journal, args.resume = "asyncio", False, None, None
+        settings.current().clock = simulation.VirtualClock()
+        settings.current().transport = transport = simulation.SimulatedTransport(model, cmd, site)
+        random.seed(model.seed)  # polling delays jitter
+        cpu_time = time.process_time()
+        result = self._run(cmd, site, args)
+        report = transport.report(settings.current().clock.monotonic(), time.process_time() - cpu_time)
+        logging.info(f"Simulated procedure {cmd} for site {site} takes {report['duration']:.0f} seconds, "
+                     f"polling overhead: {report['polling_overhead']:.0f} seconds, requests: {report['requests']}, "
+                     f"CPU time: {report['cpu_time']:.1f} seconds")
+        return result._replace(simulation=report)
+
+    def close(self):
+        """ Stops session workers """
+        self.call(self._close)
+
+    @staticmethod
+    def _close():
+        settings.current().status_cache.report()
+        settings.current().service_scheduler.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def run_pairs(args: argparse.Namespace, cmd, site=None, pairs: list = None) -> Dict[str, ProcedureResult]:
+    """ Runs procedure for many independent pairs of sites from configuration in parallel, every pair is processed in
+    its own DR session, connections to site-managers are shared. It's intended for read-only procedures
+    (status, list and dry run)
+    @param args: sm-client arguments, pair is taken from pairs
+    @param cmd: procedure command
+    @param site: the site to run procedure for, it should exist in all pairs
+    @param pairs: names of pairs to process, all pairs from configuration by default
+    @returns: procedure results {pair: result} in order of pairs
+    """
+    pairs = pairs if pairs is not None else get_config_pairs(args)
+    sessions = {pair: DRSession(copy.copy(args)) for pair in pairs}
+    for pair, session in sessions.items():
+        session.args.pair = pair
+
+    def run_pair(pair) -> ProcedureResult:
+        start_time = time.monotonic()
+        try:
+            result = sessions[pair].run(cmd, site)
+        except Exception as e:
+            logging.exception(f"Pair {pair}: procedure {cmd} failed")
+            result = ProcedureResult(False, cmd, site, str(e))
+        finally:
+            sessions[pair].close()
+        logging.info(f"Pair {pair}: procedure {cmd} finished in {time.monotonic() - start_time:.1f} seconds, "
+                     f"ok: {result.ok}")
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(len(pairs), 1), thread_name_prefix="sm-client-pair") as executor:
+        return dict(zip(pairs, executor.map(run_pair, pairs)))
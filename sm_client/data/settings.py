@@ -1,5 +1,22 @@
-"""Module, that contains parameters for other modules"""
-from sm_client.data.structures import SMConf
+"""Module, that contains parameters for other modules.
+Parameters from config, results, command line parameters and workers are kept per run in RunContext: every DR session
+(sm_client.api) has own context in context variable, default context is used outside of sessions
+"""
+import contextvars
+from dataclasses import dataclass, field
+from queue import Queue
+from typing import TYPE_CHECKING, Optional
+
+from sm_client import utils
+from sm_client.data.structures import SMConf, ServiceResults, ServiceResultsView
+
+if TYPE_CHECKING:
+    from sm_client.history import History
+    from sm_client.journal import Journal
+    from sm_client.metrics import Metrics
+    from sm_client.processing import ServiceScheduler, StatusCache
+    from sm_client.simulation import Clock, HTTPTransport
+    from sm_client.trace import Tracer
 
 # consts
 default_module = 'stateful'
@@ -8,23 +25,124 @@ dr_processing_cmd = ("move", "stop")
 dr_procedures = dr_processing_cmd + readonly_cmd  # DR procedures: switchover, failover
 site_processing_cmd = ("active", "standby", "return", "disable")
 site_cmds = site_processing_cmd + readonly_cmd  # per site commands
+engines = ("threading", "asyncio")  # engines to process services
+
+
+# Factories of per run workers and collectors, modules are imported on demand to avoid circular imports
+def _make_service_scheduler() -> "ServiceScheduler":
+    from sm_client.processing import ServiceScheduler
+    return ServiceScheduler()
+
+
+def _make_status_cache() -> "StatusCache":
+    from sm_client.processing import StatusCache
+    return StatusCache()
+
+
+def _make_history() -> "History":
+    from sm_client.history import History
+    return History()
+
+
+def _make_journal() -> "Journal":
+    from sm_client.journal import Journal
+    return Journal()
+
+
+def _make_tracer() -> "Tracer":
+    from sm_client.trace import Tracer
+    return Tracer()
+
+
+def _make_metrics() -> "Metrics":
+    from sm_client.metrics import Metrics
+    return Metrics()
+
+
+def _make_clock() -> "Clock":
+    from sm_client.simulation import Clock
+    return Clock()
+
+
+def _make_transport() -> "HTTPTransport":
+    from sm_client.simulation import HTTPTransport
+    return HTTPTransport()
+
+
+@dataclass
+class RunContext:
+    """ Parameters from config and command line, services results, workers and queues of one run """
+    # Parameters from config
+    sm_conf: SMConf = field(default_factory=SMConf)
+    module_flow: list = field(default_factory=lambda: [{'stateful': None}])  # custom DR sequence per module
+    state_restrictions: dict = field(default_factory=dict)
+    FRONT_HTTP_AUTH: bool = False
+    SERVICE_DEFAULT_TIMEOUT: Optional[int] = None
+    ENGINE: str = "threading"       # engine to process services: thread per service or asyncio coroutines
+    ASYNC_HTTP_WORKERS: int = 20    # the number of workers for http requests in asyncio engine
+    PIPELINE: bool = False          # process DR procedure site operations of services as separate steps
+    POLLING_INITIAL_DELAY: float = 1  # the first delay between polling iterations in seconds
+    POLLING_MAX_DELAY: float = 15   # the max delay between polling iterations in seconds
+    POLLING_BACKOFF: float = 2      # the multiplier of delay between polling iterations
+    LONG_POLL_TIMEOUT: int = 20     # the max time in seconds, that site-manager waits in long-poll status request, 0 - disabled
+    STATUS_BATCH_SIZE: int = 0      # the max number of services in one status request to site-manager, 0 - all services
+    CLUSTER_STATE_TIMEOUT: float = 60  # the max time in seconds to get sites states at start
+    CLUSTER_STATE_GRACE: float = 3  # the time in seconds to wait for other sites, when required site answered
+    GET_REQUEST_TIMEOUT: float = utils.SM_GET_REQUEST_TIMEOUT    # timeout of GET requests to site-managers in seconds
+    POST_REQUEST_TIMEOUT: float = utils.SM_POST_REQUEST_TIMEOUT  # timeout of POST requests to site-managers in seconds
+
+    # Result filter
+    service_results: ServiceResults = field(default_factory=ServiceResults)  # Thread-safe registry with the single result state per service
+    done_services: ServiceResultsView = field(init=False)             # Services, that were successfully done
+    ignored_services: list = field(default_factory=list)             # Services, that were ignored because of --run-services or --skip-services option
+    failed_services: ServiceResultsView = field(init=False)           # Services, that were failed and broke the procedure
+    warned_services: ServiceResultsView = field(init=False)           # Services, that were failed, but didn't break the procedure (e.g. failed standby part for failover)
+    skipped_due_deps_services: ServiceResultsView = field(init=False)  # Services, that were skipped, because they depend on failed ones or not finished because of previous flow step failed
+
+    # Parameters from command line
+    run_services: list = field(default_factory=list)
+    skip_services: list = field(default_factory=list)
+    force: bool = False
+    dry_run: bool = False
+    dry_run_report: str = ""  # file to save dry run timing report, "-" for stdout
+
+    # Workers, queues and collectors
+    thread_result_queue: Queue = field(default_factory=Queue)  # results of services, that are processed in threads
+    service_scheduler: "ServiceScheduler" = field(default_factory=_make_service_scheduler)
+    status_cache: "StatusCache" = field(default_factory=_make_status_cache)
+    history: "History" = field(default_factory=_make_history)
+    journal: "Journal" = field(default_factory=_make_journal)
+    tracer: "Tracer" = field(default_factory=_make_tracer)
+    metrics: "Metrics" = field(default_factory=_make_metrics)
+    clock: "Clock" = field(default_factory=_make_clock)
+    transport: "HTTPTransport" = field(default_factory=_make_transport)
+    http_sessions: utils.HTTPSessionPool = field(default_factory=lambda: utils.http_sessions)  # persistent sessions
+    circuit_breaker: utils.CircuitBreaker = field(default_factory=lambda: utils.circuit_breaker)
+
+    def __post_init__(self):
+        self.done_services = self.service_results.view(ServiceResults.DONE)
+        self.failed_services = self.service_results.view(ServiceResults.FAILED)
+        self.warned_services = self.service_results.view(ServiceResults.WARNED)
+        self.skipped_due_deps_services = self.service_results.view(ServiceResults.SKIPPED)
+
+
+_default_context: Optional[RunContext] = None  # the context outside of DR sessions, it's created on first usage
+_run_context: contextvars.ContextVar = contextvars.ContextVar("sm_client_run_context")
+
+
+def current() -> RunContext:
+    """ Returns the context of current run: the context of DR session or default one outside of sessions """
+    global _default_context
+    context = _run_context.get(None)
+    if context is not None:
+        return context
+    if _default_context is None:
+        _default_context = RunContext()
+    return _default_context
+
 
-# Parameters from config
-sm_conf: SMConf
-module_flow = [{'stateful': None}]  # custom DR sequence per module
-state_restrictions: dict = {}
-FRONT_HTTP_AUTH = False
-SERVICE_DEFAULT_TIMEOUT = None
-
-# Result filter
-done_services: list = []              # Services, that were successfully done
-ignored_services: list = []           # Services, that were ignored because of --run-services or --skip-services option
-failed_services: list = []            # Services, that were failed and broke the procedure
-warned_services: list = []            # Services, that were failed, but didn't break the procedure (e.g. failed standby part for failover)
-skipped_due_deps_services: list = []  # Services, that were skipped, because they depend on failed ones or not finished because of previous flow step failed
-
-# Parameters from command line
-run_services: list = []
-skip_services: list = []
-force = False
-dry_run = False
+def activate(context: RunContext):
+    """ Makes context current in the current context of contextvars, should be called in the copy of context
+    (see contextvars.copy_context), that is used for the run
+    """
+    _run_context.set(context)
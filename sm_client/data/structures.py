@@ -1,5 +1,9 @@
 """Module, that contains differents classes and structures, that are used in other modules"""
-from graphlib import TopologicalSorter
+import threading
+from collections import deque
+from collections.abc import Sequence
+from enum import Enum
+from graphlib import TopologicalSorter, CycleError
 
 
 class SMConf(dict):  # global config.yaml and some RO config parameters and args, cmd manipulation
@@ -38,7 +42,7 @@ class SMConf(dict):  # global config.yaml and some RO config parameters and args
         from sm_client.data import settings
 
         mod_list = set()
-        for elem in settings.module_flow:
+        for elem in settings.current().module_flow:
             for module in elem.keys():
                 mod_list.add(module)
         return list(mod_list)
@@ -58,10 +62,10 @@ class SMClusterState:
             self.sm[site_name]["status"] = False  # ServiceDRStatus
 
         if not site or (site and isinstance(site, str)):  # @todo rework
-            if site and site not in settings.sm_conf.keys():
+            if site and site not in settings.current().sm_conf.keys():
                 raise ValueError("Unknown site name")
             self.sm = {}
-            for cur_site in [s for s in settings.sm_conf.keys() if site == s] if site else settings.sm_conf.keys():
+            for cur_site in [s for s in settings.current().sm_conf.keys() if site == s] if site else settings.current().sm_conf.keys():
                 init_default(cur_site)
         elif isinstance(site, dict):  # for dev/testing purposes
             self.sm = {}
@@ -70,9 +74,11 @@ class SMClusterState:
                 for k, v in site[key].items():
                     self.sm[key][k] = v
 
+        self._index = None
+
         # Init global service order and global ts
         self.globals = {}
-        for module in settings.sm_conf.get_modules():
+        for module in settings.current().sm_conf.get_modules():
             self.globals[module] = {}
             self.globals[module]["deps_issue"] = None
             self.globals[module]["service_dep_ordered"] = []
@@ -83,6 +89,37 @@ class SMClusterState:
 
     def __setitem__(self, key, item):
         self.sm[key] = item
+        self._index = None
+
+    def build_index(self) -> dict:
+        """ Builds services index: services of each site, services of each module on site and services of all sites.
+        Should be called after services of sites are changed, index is built on first usage otherwise
+        @returns: built index
+        """
+        site_services = {site: tuple(self.sm[site].get('services', {})) for site in self.sm.keys()}
+        module_services: dict = {}
+        for site in self.sm.keys():
+            for serv, serv_conf in self.sm[site].get('services', {}).items():
+                if serv_conf.get('module'):
+                    module_services.setdefault((site, serv_conf['module']), []).append(serv)
+        self._index = {
+            "site_services": {site: frozenset(services) for site, services in site_services.items()},
+            "module_services": module_services,
+            "all_services": tuple(dict.fromkeys(serv for services in site_services.values() for serv in services)),
+        }
+        return self._index
+
+    def _get_index(self) -> dict:
+        """ Returns services index, builds it, if it doesn't exist """
+        return self.build_index() if self._index is None else self._index
+
+    def invalidate_index(self):
+        """ Drops services index, it's rebuilt on next usage """
+        self._index = None
+
+    def has_service(self, site, serv) -> bool:
+        """ Checks if service exists on site """
+        return serv in self._get_index()["site_services"].get(site, ())
 
     def __str__(self):
         return str(self.sm)
@@ -101,7 +138,7 @@ class SMClusterState:
         @todo to rework when sm_dict[site|opposite]['services'][serv] serv is not present on one site
         """
         from sm_client.data import settings
-        opposite_site = settings.sm_conf.get_opposite_site(site)
+        opposite_site = settings.current().sm_conf.get_opposite_site(site)
         site_sequence = []
         if procedure == 'move':  # switchover
             mode, = self.sm[site]['services'][serv]['sequence'][0:1] or ['standby']
@@ -127,48 +164,83 @@ class SMClusterState:
 
     def get_services_list_for_ok_site(self) -> list:
         """Returns list of services for available sites"""
-        final_set: set = set()
-        for site in self.sm.values():
-            final_set = final_set.union(set(list(site['services'].keys())))
-        return list(final_set)
+        return list(self._get_index()["all_services"])
 
     def get_module_services(self, site, module) -> list:
         """Get services list for specified module on site"""
-        module_list = []
-        for serv in self.sm[site]['services'].keys():
-            if self.sm[site]['services'][serv].get('module') and module == self.sm[site]['services'][serv]['module']:
-                module_list.append(serv)
-        return module_list
+        return list(self._get_index()["module_services"].get((site, module), []))
 
     def make_ignored_services(self, service_dep_ordered: list) -> list:
         """ Make list of services which are not intended to run, ignored."""
         from sm_client.data import settings
-        ignored_list = []
-        for site in self.sm.keys():
-            for serv in self.sm[site]['services']:
-                if serv not in service_dep_ordered and serv not in settings.ignored_services:
-                    ignored_list.append(serv)
-        return list(set(ignored_list))
+        not_ignored = set(service_dep_ordered).union(settings.current().ignored_services)
+        return [serv for serv in self._get_index()["all_services"] if serv not in not_ignored]
+
+
+class _StrValueEnum(str, Enum):
+    """String enum, which members are formatted as their values (like enum.StrEnum of python 3.11)"""
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+    def __format__(self, format_spec: str) -> str:
+        return format(str(self.value), format_spec)
+
+
+class ServiceMode(_StrValueEnum):
+    """Service DR mode"""
+    ACTIVE = "active"
+    STANDBY = "standby"
+    DISABLE = "disable"
+    UNKNOWN = "--"
+
+
+class ServiceHealthz(_StrValueEnum):
+    """Service health"""
+    UP = "up"
+    DOWN = "down"
+    DEGRADED = "degraded"
+    UNKNOWN = "--"
+
+
+class ServiceStatus(_StrValueEnum):
+    """Service procedure status"""
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    QUEUE = "queue"
+    UNKNOWN = "--"
+
+
+def parse_enum(enum_class, value):
+    """ Returns enum member with given value or UNKNOWN member, if value isn't valid """
+    return enum_class._value2member_map_.get(value, enum_class.UNKNOWN) if isinstance(value, str) \
+        else enum_class.UNKNOWN
+
+
+FAILED_HEALTHZ = frozenset((ServiceHealthz.DOWN, ServiceHealthz.DEGRADED, ServiceHealthz.UNKNOWN))
 
 
 class ServiceDRStatus:
     """Service status"""
+    __slots__ = ("service", "mode", "nowait", "healthz", "status", "message", "service_status", "allow_failure")
+
     def __getitem__(self, key):
         return self.__getattribute__(key)
 
     def __init__(self, data: dict = None, smdict = None, site: str = None,
                  mode: str = None, force = False, allow_failure = False):  # {'services':{service_name:{}}}
         if data and data.get("services") and isinstance(data['services'], dict):
-            self.service = list(data['services'].keys())[0]
+            self.service = next(iter(data['services']))
         elif data and data.get("wrong-service") and isinstance(data['wrong-service'], str):
             self.service = data['wrong-service']
         else:
             raise ValueError("Missing service name")
         serv = data['services'][self.service] if data.get('services') else data
-        self.mode = serv['mode'] if serv.get("mode") in ["active", "standby", "disable"] else "--"
+        self.mode = parse_enum(ServiceMode, serv.get("mode"))
         self.nowait = serv["nowait"] if serv.get("nowait") else False
-        self.healthz = serv["healthz"] if serv.get("healthz") in ["up", "down", "degraded"] else "--"
-        self.status = serv["status"] if serv.get("status") in ["running", "done", "failed", "queue"] else "--"
+        self.healthz = parse_enum(ServiceHealthz, serv.get("healthz"))
+        self.status = parse_enum(ServiceStatus, serv.get("status"))
         self.message = serv["message"] if serv.get("message") else ""
 
         # https://github.com/Netcracker/DRNavigator/blob/b4161fb15271485974abf5862e7272abc386fbc8/modules/stateful.py#L16
@@ -176,13 +248,13 @@ class ServiceDRStatus:
         def set_service_status(smdict, site, mode, force):
             if self.message == "Service doesn't exist":
                 return True
-            failed_healthz = ['down', 'degraded', '--']
+            failed_healthz = FAILED_HEALTHZ
 
             if mode and mode in 'standby' and smdict[site]['services'][self.service].get('allowedStandbyStateList'):
-                failed_healthz = set(failed_healthz) - set(
+                failed_healthz = failed_healthz - set(
                     smdict[site]['services'][self.service].get('allowedStandbyStateList'))
 
-            return (self.healthz not in failed_healthz or force) and self.status not in ['failed']
+            return (self.healthz not in failed_healthz or force) and self.status is not ServiceStatus.FAILED
 
         # separate service status field, since healthz may be treated differently depending on running mode - allowedStandbyStateList
         self.service_status = set_service_status(smdict, site, mode, force)
@@ -194,25 +266,140 @@ class ServiceDRStatus:
         return self.service_status or self.allow_failure
 
     def sortout_service_results(self):
-        """ Put service name in appropriate list(failed or done) """
+        """ Put service name in appropriate results state(failed, warned or done) """
         from sm_client.data import settings
         if self.service_status:  # return Ok - done_service
-            if self.service not in settings.failed_services and self.service not in settings.warned_services \
-                    and self.service not in settings.done_services:
-                settings.done_services.append(self.service)
+            settings.current().service_results.set_done(self.service)
         elif self.allow_failure:
-            if self.service not in settings.failed_services:
-                if self.service not in settings.warned_services:
-                    settings.warned_services.append(self.service)
-                if self.service in settings.done_services:
-                    settings.done_services.remove(self.service)
+            settings.current().service_results.set_warned(self.service)
         else:
-            if self.service not in settings.failed_services:
-                settings.failed_services.append(self.service)
-            if self.service in settings.warned_services:
-                settings.warned_services.remove(self.service)
-            if self.service in settings.done_services:
-                settings.done_services.remove(self.service)
+            settings.current().service_results.set_failed(self.service)
+
+
+class ServiceResults:
+    """ Thread-safe registry of services results. Every service has the single state, the services of each state
+    are kept in order of transition into it
+    """
+    DONE = "done"
+    FAILED = "failed"
+    WARNED = "warned"
+    SKIPPED = "skipped_due_deps"
+    STATES = (DONE, FAILED, WARNED, SKIPPED)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: dict = {}  # {service: state}
+        self._services: dict = {state: {} for state in self.STATES}  # {state: {service: None}} as ordered sets
+
+    def _move(self, service: str, state: str):
+        """ Moves service to state, lock should be acquired """
+        previous = self._states.get(service)
+        if previous == state:
+            return
+        if previous is not None:
+            del self._services[previous][service]
+        self._states[service] = state
+        self._services[state][service] = None
+
+    def set_done(self, service: str) -> bool:
+        """ Marks service as done, if it doesn't have results yet
+        @returns: True, if service state was changed
+        """
+        with self._lock:
+            if service in self._states:
+                return False
+            self._move(service, self.DONE)
+            return True
+
+    def set_warned(self, service: str) -> bool:
+        """ Marks service as warned, if it's not failed or skipped due dependencies
+        @returns: True, if service state was changed
+        """
+        with self._lock:
+            if self._states.get(service) in (self.FAILED, self.SKIPPED, self.WARNED):
+                return False
+            self._move(service, self.WARNED)
+            return True
+
+    def set_failed(self, service: str) -> bool:
+        """ Marks service as failed, it overrides any other state
+        @returns: True, if service state was changed
+        """
+        with self._lock:
+            if self._states.get(service) == self.FAILED:
+                return False
+            self._move(service, self.FAILED)
+            return True
+
+    def set_skipped(self, service: str) -> bool:
+        """ Marks service as skipped due dependencies, if it's not failed
+        @returns: True, if service state was changed
+        """
+        with self._lock:
+            if self._states.get(service) in (self.FAILED, self.SKIPPED):
+                return False
+            self._move(service, self.SKIPPED)
+            return True
+
+    def get_state(self, service: str):
+        """ Returns the state of service or None, if service doesn't have results """
+        return self._states.get(service)
+
+    def has(self, state: str, service: str) -> bool:
+        """ Checks, that service is in specified state """
+        return self._states.get(service) == state
+
+    def get_services(self, state: str) -> list:
+        """ Returns the list of services in specified state """
+        with self._lock:
+            return list(self._services[state])
+
+    def count(self, state: str) -> int:
+        """ Returns the number of services in specified state """
+        return len(self._services[state])
+
+    def clear(self, state: str = None):
+        """ Removes results of services in specified state or all results, if state is not defined """
+        with self._lock:
+            for s in self.STATES if state is None else (state,):
+                for service in self._services[s]:
+                    del self._states[service]
+                self._services[s].clear()
+
+    def view(self, state: str) -> "ServiceResultsView":
+        """ Returns read-only list-like view of services in specified state """
+        return ServiceResultsView(self, state)
+
+
+class ServiceResultsView(Sequence):
+    """ Read-only list-like view of services in one state of ServiceResults """
+    def __init__(self, results: ServiceResults, state: str):
+        self.results = results
+        self.state = state
+
+    def __contains__(self, service):
+        return self.results.has(self.state, service)
+
+    def __len__(self):
+        return self.results.count(self.state)
+
+    def __iter__(self):
+        return iter(self.results.get_services(self.state))
+
+    def __getitem__(self, index):
+        return self.results.get_services(self.state)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (ServiceResultsView, list, tuple)):
+            return self.results.get_services(self.state) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.results.get_services(self.state))
+
+    def clear(self):
+        """ Removes results of services in the state """
+        self.results.clear(self.state)
 
 
 class NotValid(Exception):
@@ -220,11 +407,187 @@ class NotValid(Exception):
 
 
 class TopologicalSorter2(TopologicalSorter):
-    """ added method to get successors of specific node """
+    """ added methods to get successors of specific node """
+    _node2info: dict  # {node: node info with successors}, it's filled by TopologicalSorter
+
+    def get_nodes(self) -> list:
+        """Get all nodes in the order of adding"""
+        return list(self._node2info)
 
     def successors(self, node):
         """Get node successors"""
-        for i in self._node2info.values():
-            if i.node == node:
-                return i.successors
+        node_info = self._node2info.get(node)
+        return node_info.successors if node_info else None
+
+    def transitive_successors(self, node) -> list:
+        """Get all nodes, that depend on node directly or through other nodes, in breadth-first order"""
+        result = []
+        visited = {node}
+        queue = deque(self.successors(node) or [])
+        while queue:
+            successor = queue.popleft()
+            if successor in visited:
+                continue
+            visited.add(successor)
+            result.append(successor)
+            queue.extend(self._node2info[successor].successors)
+        return result
+
+
+class ServiceGraph:
+    """ Immutable services dependency graph. Nodes have integer ids, successors are kept as adjacency tuples and
+    the number of predecessors as in-degree vector, so cheap cursors can be spawned from one graph for every run
+    instead of deep copies of TopologicalSorter. Nodes are returned by cursors in the same order as TopologicalSorter
+    """
+    __slots__ = ("nodes", "node_ids", "adjacency", "in_degree")
+
+    def __init__(self, nodes, adjacency):
+        """
+        @param nodes: node names, index in the list is node id
+        @param adjacency: successors ids for each node id
+        @raises CycleError: in case nodes are in a cycle
+        """
+        self.nodes = tuple(nodes)
+        self.node_ids = {node: node_id for node_id, node in enumerate(self.nodes)}
+        self.adjacency = tuple(tuple(successors) for successors in adjacency)
+        in_degree = [0] * len(self.nodes)
+        for successors in self.adjacency:
+            for successor in successors:
+                in_degree[successor] += 1
+        self.in_degree = tuple(in_degree)
+        cycle = self._find_cycle()
+        if cycle:
+            raise CycleError("nodes are in a cycle", [self.nodes[node_id] for node_id in cycle])
+
+    @classmethod
+    def from_sorter(cls, ts: TopologicalSorter2) -> "ServiceGraph":
+        """ Makes graph with the same nodes and dependencies, as given TopologicalSorter2 has """
+        node_ids = {node: node_id for node_id, node in enumerate(ts.get_nodes())}
+        return cls(node_ids, ([node_ids[successor] for successor in ts.successors(node)] for node in node_ids))
+
+    def _find_cycle(self):
+        """ Returns the list of node ids, that are in a cycle, or None. Same search, as in TopologicalSorter """
+        stack: list = []
+        itstack: list = []
+        seen = set()
+        node2stacki: dict = {}
+
+        for node in range(len(self.nodes)):
+            if node in seen:
+                continue
+            while True:
+                if node in seen:
+                    if node in node2stacki:
+                        return stack[node2stacki[node]:] + [node]
+                else:
+                    seen.add(node)
+                    itstack.append(iter(self.adjacency[node]).__next__)
+                    node2stacki[node] = len(stack)
+                    stack.append(node)
+                while stack:
+                    try:
+                        node = itstack[-1]()
+                        break
+                    except StopIteration:
+                        del node2stacki[stack.pop()]
+                        itstack.pop()
+                else:
+                    break
         return None
+
+    def cursor(self) -> "ServiceGraphCursor":
+        """ Returns new cursor to walk the graph in dependency order """
+        return ServiceGraphCursor(self)
+
+    def static_order(self):
+        """ Returns an iterable of nodes in a topological order """
+        cursor = self.cursor()
+        while cursor.is_active():
+            node_group = cursor.get_ready()
+            yield from node_group
+            cursor.done(*node_group)
+
+    def critical_path_lengths(self, weights: dict) -> dict:
+        """ Returns the length of the longest path from each node to the end of the graph including node itself
+        @param weights: node weights (e.g. expected durations), missing nodes have zero weight
+        """
+        lengths = [0.0] * len(self.nodes)
+        for node in reversed(list(self.static_order())):
+            node_id = self.node_ids[node]
+            lengths[node_id] = weights.get(node, 0) + max((lengths[successor] for successor in self.adjacency[node_id]),
+                                                          default=0)
+        return dict(zip(self.nodes, lengths))
+
+    def successors(self, node):
+        """Get node successors"""
+        node_id = self.node_ids.get(node)
+        return None if node_id is None else [self.nodes[successor] for successor in self.adjacency[node_id]]
+
+    def transitive_successors(self, node) -> list:
+        """Get all nodes, that depend on node directly or through other nodes, in breadth-first order"""
+        node_id = self.node_ids.get(node)
+        if node_id is None:
+            return []
+        visited = {node_id}
+        queue = deque(self.adjacency[node_id])
+        result = []
+        while queue:
+            successor = queue.popleft()
+            if successor in visited:
+                continue
+            visited.add(successor)
+            result.append(self.nodes[successor])
+            queue.extend(self.adjacency[successor])
+        return result
+
+
+class ServiceGraphCursor:
+    """ Processing state of ServiceGraph with TopologicalSorter interface: get_ready, done, is_active """
+    _NODE_OUT = -1
+    _NODE_DONE = -2
+
+    def __init__(self, graph: ServiceGraph):
+        self.graph = graph
+        self._npredecessors = list(graph.in_degree)
+        self._ready_nodes = [node_id for node_id, degree in enumerate(self._npredecessors) if degree == 0]
+        self._npassedout = 0
+        self._nfinished = 0
+
+    def get_ready(self) -> tuple:
+        """ Returns a tuple of all the nodes, that are ready, and marks them as passed out """
+        result = tuple(self.graph.nodes[node_id] for node_id in self._ready_nodes)
+        for node_id in self._ready_nodes:
+            self._npredecessors[node_id] = self._NODE_OUT
+        self._npassedout += len(self._ready_nodes)
+        self._ready_nodes = []
+        return result
+
+    def is_active(self) -> bool:
+        """ Returns True, if more progress can be made """
+        return self._nfinished < self._npassedout or bool(self._ready_nodes)
+
+    def done(self, *nodes):
+        """ Marks a set of nodes returned by get_ready as processed, unblocks their successors """
+        for node in nodes:
+            node_id = self.graph.node_ids.get(node)
+            if node_id is None:
+                raise ValueError(f"node {node!r} was not added using add()")
+            stat = self._npredecessors[node_id]
+            if stat == self._NODE_DONE:
+                raise ValueError(f"node {node!r} was already marked done")
+            if stat != self._NODE_OUT:
+                raise ValueError(f"node {node!r} was not passed out (still not ready)")
+            self._npredecessors[node_id] = self._NODE_DONE
+            for successor in self.graph.adjacency[node_id]:
+                self._npredecessors[successor] -= 1
+                if self._npredecessors[successor] == 0:
+                    self._ready_nodes.append(successor)
+            self._nfinished += 1
+
+    def successors(self, node):
+        """Get node successors"""
+        return self.graph.successors(node)
+
+    def transitive_successors(self, node) -> list:
+        """Get all nodes, that depend on node directly or through other nodes"""
+        return self.graph.transitive_successors(node)
@@ -0,0 +1,83 @@
+"""Module, that keeps durations of services DR procedures from previous runs.
+Durations are used to plan polling: the first status request is sent near to expected completion time.
+Every run has own history (see settings.RunContext), module functions work with the history of current run
+"""
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+from sm_client.data import settings
+
+HISTORY_WEIGHT = 0.3  # weight of the last duration in moving average
+
+
+class History:
+    """
+    Durations of services procedures {service: {mode: seconds}}, that are loaded from history file and are updated
+    with durations of current run
+    @param str path: the path to history file, history is disabled, if it's not defined
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.path.expanduser(path) if path else None
+        self.durations: dict = {}  # {service: {mode: seconds}}
+        self._lock = threading.Lock()
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path) as file:
+                data = json.load(file)
+            self.durations.update({service: {mode: float(duration) for mode, duration in modes.items()}
+                                   for service, modes in data.items() if isinstance(modes, dict)})
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning(f"Can't load services history from {self.path}: {e}")
+
+    def get_expected_duration(self, service: str, mode: str) -> Optional[float]:
+        """ Returns expected duration of the service procedure in seconds or None, if it's unknown """
+        with self._lock:
+            return self.durations.get(service, {}).get(mode)
+
+    def record_duration(self, service: str, mode: str, duration: float):
+        """ Records duration of successfully done service procedure as moving average with previous runs """
+        if not self.path:
+            return
+        with self._lock:
+            previous = self.durations.setdefault(service, {}).get(mode)
+            self.durations[service][mode] = round(duration if previous is None else
+                                                  HISTORY_WEIGHT * duration + (1 - HISTORY_WEIGHT) * previous, 1)
+
+    def save(self):
+        """ Saves durations to history file, if history is enabled """
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._lock, open(self.path, "w") as file:
+                json.dump(self.durations, file, indent=2, sort_keys=True)
+        except OSError as e:
+            logging.warning(f"Can't save services history to {self.path}: {e}")
+
+
+def load_history(path: Optional[str]):
+    """ Loads durations of current run from history file. History is disabled, if path is not defined
+    @param path: the path to history file
+    """
+    settings.current().history = History(path)
+
+
+def get_expected_duration(service: str, mode: str) -> Optional[float]:
+    """ Returns expected duration of the service procedure in seconds or None, if it's unknown """
+    return settings.current().history.get_expected_duration(service, mode)
+
+
+def record_duration(service: str, mode: str, duration: float):
+    """ Records duration of successfully done service procedure, durations of simulated runs are not recorded """
+    if not settings.current().clock.virtual:
+        settings.current().history.record_duration(service, mode, duration)
+
+
+def save_history():
+    """ Saves durations of current run to history file, if history is enabled """
+    settings.current().history.save()
@@ -1,15 +1,20 @@
 """Functions that are used for initialization process"""
+import contextvars
 import logging
 import os
 import pathlib
 import sys
+import threading
+import time
+from queue import Queue, Empty
+from typing import Optional
 
 import yaml
 
-from sm_client import utils
+from sm_client import history, journal, metrics, trace, utils
 from sm_client.data import settings
 from sm_client.data.structures import SMClusterState, SMConf
-from sm_client.processing import sm_process_service
+from sm_client.processing import sm_process_service, init_service_scheduler, init_status_cache
 
 
 def init_and_check_config(args) -> bool:
@@ -40,6 +45,9 @@ def init_and_check_config(args) -> bool:
 
         if not log_output:
             logging.critical(f"Cannot write to {args.output} file. Printing stdout ...")
+        elif any(isinstance(handler, logging.FileHandler) and handler.baseFilename == os.path.abspath(log_output)
+                 for handler in logger.handlers):
+            pass  # the file is already used by DR session, that runs in parallel
         else:
             file_handler = logging.FileHandler(log_output)
             file_handler.setLevel(logging.DEBUG)
@@ -51,53 +59,108 @@ def init_and_check_config(args) -> bool:
     logging.debug(f"Script arguments: {args}")
 
     # Define, check and load configuration file
-    conf_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../config.yaml") if args.config == "" else args.config
-    if not os.path.isfile(conf_file):
-        logging.fatal("You should define configuration file for site-manager or copy it to config.yaml in site-manager main directory")
-        sys.exit(1)
-
-    with open(conf_file) as file:
-        try:
-            conf_parsed = yaml.safe_load(file)
-        except:
-            logging.fatal("Can not parse configuration file!")
-            return False
+    conf_parsed = load_config(args)
+    if conf_parsed is None:
+        return False
 
     logging.debug(f"Parsed config: {conf_parsed}")
 
-    settings.FRONT_HTTP_AUTH = conf_parsed.get("sm-client", {}).get("http_auth", False)
-    settings.SERVICE_DEFAULT_TIMEOUT = conf_parsed.get("sm-client", {}).get("service_default_timeout", 200)
+    settings.current().FRONT_HTTP_AUTH = conf_parsed.get("sm-client", {}).get("http_auth", False)
+    settings.current().SERVICE_DEFAULT_TIMEOUT = conf_parsed.get("sm-client", {}).get("service_default_timeout", 200)
+
+    settings.current().ENGINE = args.engine or conf_parsed.get("sm-client", {}).get("engine", "threading")
+    if settings.current().ENGINE not in settings.engines:
+        logging.fatal(f"Invalid engine '{settings.current().ENGINE}'. Valid engines are {list(settings.engines)}.")
+        return False
+    settings.current().ASYNC_HTTP_WORKERS = conf_parsed.get("sm-client", {}).get("async_http_workers", 20)
+    settings.current().PIPELINE = args.pipeline or conf_parsed.get("sm-client", {}).get("pipeline", False)
+    if not isinstance(settings.current().PIPELINE, bool):
+        logging.fatal("Check configuration file. pipeline should be boolean")
+        return False
+    settings.current().STATUS_BATCH_SIZE = conf_parsed.get("sm-client", {}).get("status_batch_size", 0)
+    if not isinstance(settings.current().STATUS_BATCH_SIZE, int) or settings.current().STATUS_BATCH_SIZE < 0:
+        logging.fatal("Check configuration file. status_batch_size should be non-negative integer")
+        return False
+
+    # Polling parameters: exponential backoff between polling iterations, seeded from history of previous runs
+    settings.current().POLLING_INITIAL_DELAY = conf_parsed.get("sm-client", {}).get("polling_initial_delay", 1)
+    settings.current().POLLING_MAX_DELAY = conf_parsed.get("sm-client", {}).get("polling_max_delay", 15)
+    settings.current().POLLING_BACKOFF = conf_parsed.get("sm-client", {}).get("polling_backoff", 2)
+    if not all(isinstance(value, (int, float)) and value > 0 for value in
+               [settings.current().POLLING_INITIAL_DELAY, settings.current().POLLING_MAX_DELAY]) or \
+            not isinstance(settings.current().POLLING_BACKOFF, (int, float)) or settings.current().POLLING_BACKOFF < 1:
+        logging.fatal("Check configuration file. polling_initial_delay and polling_max_delay should be positive "
+                      "numbers, polling_backoff should be not less than 1")
+        return False
+    history.load_history(conf_parsed.get("sm-client", {}).get("history_file"))
+    if args.resume and not os.path.isfile(os.path.expanduser(args.resume)):
+        logging.fatal(f"Journal {args.resume} to resume procedure doesn't exist")
+        return False
+    journal.init_journal(args.resume or args.journal or conf_parsed.get("sm-client", {}).get("journal_file"),
+                         bool(args.resume))
+    trace.init_tracer(args.trace_out)
+    metrics.init_metrics(args.metrics_out or conf_parsed.get("sm-client", {}).get("metrics_file"))
+
+    settings.current().GET_REQUEST_TIMEOUT = conf_parsed.get("sm-client", {}).get("get_request_timeout",
+                                                                                  utils.SM_GET_REQUEST_TIMEOUT)
+    settings.current().POST_REQUEST_TIMEOUT = conf_parsed.get("sm-client", {}).get("post_request_timeout",
+                                                                                   utils.SM_POST_REQUEST_TIMEOUT)
+    settings.current().circuit_breaker = utils.init_circuit_breaker(
+        conf_parsed.get("sm-client", {}).get("circuit_breaker_threshold", utils.SM_CIRCUIT_BREAKER_THRESHOLD),
+        conf_parsed.get("sm-client", {}).get("circuit_breaker_cooldown", utils.SM_CIRCUIT_BREAKER_COOLDOWN))
+    if settings.current().circuit_breaker.threshold < 0 or settings.current().circuit_breaker.cooldown < 0:
+        logging.fatal("Check configuration file. circuit_breaker_threshold and circuit_breaker_cooldown should be "
+                      "non-negative numbers")
+        return False
+    status_cache_ttl = conf_parsed.get("sm-client", {}).get("status_cache_ttl", 5)
+    status_cache_size = conf_parsed.get("sm-client", {}).get("status_cache_size", 1000)
+    if not isinstance(status_cache_ttl, (int, float)) or status_cache_ttl < 0 or \
+            not isinstance(status_cache_size, int) or status_cache_size < 1:
+        logging.fatal("Check configuration file. status_cache_ttl should be non-negative number, "
+                      "status_cache_size should be positive integer")
+        return False
+    init_status_cache(status_cache_ttl, status_cache_size)
+    settings.current().CLUSTER_STATE_TIMEOUT = conf_parsed.get("sm-client", {}).get("cluster_state_timeout", 60)
+    settings.current().CLUSTER_STATE_GRACE = conf_parsed.get("sm-client", {}).get("cluster_state_grace", 3)
+    if not all(isinstance(value, (int, float)) and value >= 0
+               for value in (settings.current().CLUSTER_STATE_TIMEOUT, settings.current().CLUSTER_STATE_GRACE)):
+        logging.fatal("Check configuration file. cluster_state_timeout and cluster_state_grace should be "
+                      "non-negative numbers")
+        return False
 
-    utils.SM_GET_REQUEST_TIMEOUT = conf_parsed.get("sm-client", {}).get("get_request_timeout", 10)
-    utils.SM_POST_REQUEST_TIMEOUT = conf_parsed.get("sm-client", {}).get("post_request_timeout", 30)
+    # Long-poll status requests: site-manager answers, when service procedure is finished
+    settings.current().LONG_POLL_TIMEOUT = conf_parsed.get("sm-client", {}).get("long_poll_timeout", 20)
+    if not isinstance(settings.current().LONG_POLL_TIMEOUT, int) or \
+            not 0 <= settings.current().LONG_POLL_TIMEOUT < settings.current().POST_REQUEST_TIMEOUT:
+        logging.fatal("Check configuration file. long_poll_timeout should be non-negative integer, "
+                      "that is less than post_request_timeout")
+        return False
 
-    settings.ignored_services.clear()
+    settings.current().ignored_services.clear()
 
     # Check services for running
     if args.run_services != '':
-        settings.run_services = args.run_services.replace(',', ' ').replace('  ', ' ').split(' ')
+        settings.current().run_services = args.run_services.replace(',', ' ').replace('  ', ' ').split(' ')
     else:
-        settings.run_services.clear()
+        settings.current().run_services.clear()
 
     if args.skip_services != '':
-        settings.skip_services = args.skip_services.replace(',', ' ').replace('  ', ' ').split(' ')
+        settings.current().skip_services = args.skip_services.replace(',', ' ').replace('  ', ' ').split(' ')
     else:
-        settings.skip_services.clear()
+        settings.current().skip_services.clear()
 
-    settings.failed_services.clear()
-    settings.done_services.clear()
-    settings.skipped_due_deps_services.clear()
+    settings.current().service_results.clear()
 
-    settings.force = args.force
+    settings.current().force = args.force
 
-    settings.state_restrictions = conf_parsed.get("restrictions", {}) if not args.ignore_restrictions else {}
+    settings.current().state_restrictions = conf_parsed.get("restrictions", {}) if not args.ignore_restrictions else {}
 
-    settings.module_flow = conf_parsed.get("flow", [{'stateful': None}])
+    settings.current().module_flow = conf_parsed.get("flow", [{'stateful': None}])
     # Define valid states for validation
     valid_states = [['standby', 'disable'], ['active']]
 
     # Validate procedures in the flow
-    for module in settings.module_flow:
+    for module in settings.current().module_flow:
         for mod_name, mod_states in module.items():
             if mod_states is not None:
                 if not isinstance(mod_states, list):
@@ -107,21 +170,31 @@ def init_and_check_config(args) -> bool:
                     logging.fatal(f"Invalid states '{mod_states}' for module '{mod_name}'. Valid states are {valid_states}.")
                     return False
                     
-    site_names = [i["name"] for i in conf_parsed["sites"]]
+    # Configuration can contain many independent pairs of sites, procedure is run for one of them
+    sites_conf = conf_parsed.get("sites", [])
+    if "pairs" in conf_parsed:
+        pairs = {pair.get("name"): pair.get("sites", []) for pair in conf_parsed["pairs"]}
+        if getattr(args, "pair", None) not in pairs:
+            logging.fatal(f"Pair '{getattr(args, 'pair', None)}' is not specified in the provided sm-client config. "
+                          f"Available pairs are {list(pairs)}")
+            return False
+        sites_conf = pairs[args.pair]
+
+    site_names = [i["name"] for i in sites_conf]
     
     if args.site and args.site not in site_names:
         logging.error(f"Site '{args.site}' is not specified in the provided sm-client config, the command can't be executed.")
         return False
     
-    settings.sm_conf = SMConf()
+    settings.current().sm_conf = SMConf()
     for site in site_names:
         try:
-            site_url = [ i["site-manager"] for i in conf_parsed["sites"] if i ["name"] == site ][0]
+            site_url = [ i["site-manager"] for i in sites_conf if i ["name"] == site ][0]
         except KeyError:
             logging.error("Check configuration file. Some of sites does not have 'site-manager' parameter")
             return False
 
-        for i in conf_parsed["sites"]:
+        for i in sites_conf:
             if i["name"] != site:
                 continue
             if isinstance(i.get("token", ""), dict):
@@ -136,32 +209,118 @@ def init_and_check_config(args) -> bool:
                     return False
             else:
                 site_token = i.get("token", "")
-        site_cacert = [ i.get("cacert", True) for i in conf_parsed["sites"] if i ["name"] == site ][0]
+        site_cacert = [ i.get("cacert", True) for i in sites_conf if i ["name"] == site ][0]
 
         if site_cacert is not True and not os.path.isfile(site_cacert):
             logging.fatal(f"You should define correct path to CA certificate for site {site}")
             return False
-        settings.sm_conf[site] = {}
-        settings.sm_conf[site]["url"] = site_url
-        settings.sm_conf[site]["token"] = site_token
-        settings.sm_conf[site]["cacert"] = False if args.insecure else site_cacert
+        settings.current().sm_conf[site] = {}
+        settings.current().sm_conf[site]["url"] = site_url
+        settings.current().sm_conf[site]["token"] = site_token
+        settings.current().sm_conf[site]["cacert"] = False if args.insecure else site_cacert
+
+    # Define concurrency limits: global and per site
+    max_workers = conf_parsed.get("sm-client", {}).get("max_workers", 50)
+    site_max_workers = conf_parsed.get("sm-client", {}).get("site_max_workers", 0)
+    if not isinstance(site_max_workers, dict):
+        site_max_workers = {site: site_max_workers for site in settings.current().sm_conf}
+    if not all(isinstance(limit, int) and limit >= 0 for limit in [max_workers] + list(site_max_workers.values())):
+        logging.fatal("Check configuration file. max_workers and site_max_workers should be non-negative integers")
+        return False
+    init_service_scheduler(max_workers, site_max_workers)
+
+    # Open persistent http sessions for sites, they are reused by all threads during procedure.
+    # By default, pool is sized to the maximum number of simultaneous requests to one site
+    pool_maxsize = max([limit for limit in site_max_workers.values() if limit] or [max_workers]) or \
+        utils.SM_HTTP_POOL_MAXSIZE
+    if settings.current().ENGINE == "asyncio":
+        pool_maxsize = min(pool_maxsize, settings.current().ASYNC_HTTP_WORKERS)
+    settings.current().http_sessions = utils.init_http_sessions(
+        settings.current().sm_conf, conf_parsed.get("sm-client", {}).get("http_pool_maxsize", pool_maxsize))
 
     # Check state restrictions
-    for restrictions_list in settings.state_restrictions.values():
-        if any(state_str.count('-') + 1 != len(settings.sm_conf) for state_str in restrictions_list):
+    for restrictions_list in settings.current().state_restrictions.values():
+        if any(state_str.count('-') + 1 != len(settings.current().sm_conf) for state_str in restrictions_list):
             logging.error("Check configuration file. Some state restrictions don't suitable for the current number of sites")
             return False
 
     return True
 
 
-def sm_get_cluster_state(site=None) -> SMClusterState:
-    """ Get cluster status or per specific site and init sm_dict object
+def get_config_file(args) -> str:
+    """ Returns the path to configuration file, that is defined in args, or config.yaml in sm-client directory """
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "../config.yaml") if args.config == "" else args.config
+
+
+def load_config(args) -> Optional[dict]:
+    """ Loads configuration file
+    @returns: parsed configuration or None, if it can't be loaded
+    """
+    conf_file = get_config_file(args)
+    if not os.path.isfile(conf_file):
+        logging.fatal("You should define configuration file for site-manager or copy it to config.yaml in site-manager main directory")
+        return None
+
+    with open(conf_file) as file:
+        try:
+            return yaml.safe_load(file)
+        except yaml.YAMLError:
+            logging.fatal("Can not parse configuration file!")
+            return None
+
+
+def get_config_pairs(args) -> list:
+    """ Returns names of sites pairs from configuration file
+    @returns: the list of pairs or empty list, if configuration contains single pair of sites in "sites" section
+    """
+    if not os.path.isfile(get_config_file(args)):
+        return []
+    with open(get_config_file(args)) as file:
+        try:
+            conf_parsed = yaml.safe_load(file) or {}
+        except yaml.YAMLError:
+            return []
+    return [pair.get("name") for pair in conf_parsed.get("pairs", [])]
+
+
+def sm_get_cluster_state(site=None, required_site=None) -> SMClusterState:
+    """ Get cluster status or per specific site and init sm_dict object.
+    Sites are requested in parallel, sites, that didn't answer in settings.current().CLUSTER_STATE_TIMEOUT seconds, are marked
+    as unavailable. Response time of each site is saved in "response_time" field (None, if site didn't answer)
+    @param required_site: the site, that is enough to run procedure (e.g. site, that becomes active during failover).
+     Other sites are waited at most settings.current().CLUSTER_STATE_GRACE seconds after required site answered
     """
     sm_dict = SMClusterState(site)
-    for site_name in sm_dict.keys():
+    responses: Queue = Queue()
+
+    def request_site_state(site_name):
+        start_time = time.monotonic()
         response, ret, code = sm_process_service(site_name, "site-manager", "status")
+        responses.put((site_name, response, ret, code, time.monotonic() - start_time))
+
+    for site_name in sm_dict.keys():
+        sm_dict[site_name]["response_time"] = None
+        # daemon threads don't block exit, if site-manager hangs
+        threading.Thread(target=contextvars.copy_context().run, args=(request_site_state, site_name),
+                         name=f"sm-client-state-{site_name}", daemon=True).start()
+
+    pending = set(sm_dict.keys())
+    deadline = time.monotonic() + settings.current().CLUSTER_STATE_TIMEOUT
+    while pending:
+        try:
+            site_name, response, ret, code, response_time = responses.get(timeout=max(deadline - time.monotonic(), 0))
+        except Empty:
+            break
+        pending.discard(site_name)
+        logging.debug(f"Site-manager on site {site_name} answered in {response_time:.2f} seconds")
         sm_dict[site_name]["return_code"] = code  # HTTP or SSL
         sm_dict[site_name]["status"] = ret
+        sm_dict[site_name]["response_time"] = round(response_time, 3)
         sm_dict[site_name].update(response)
+        if ret and site_name == required_site:
+            deadline = min(deadline, time.monotonic() + settings.current().CLUSTER_STATE_GRACE)
+
+    for site_name in pending:
+        logging.warning(f"Site-manager on site {site_name} didn't answer in time, site is considered unavailable")
+    sm_dict.build_index()
     return sm_dict
@@ -0,0 +1,105 @@
+"""Module, that keeps the journal of DR procedure: every finished site operation of the service is appended to
+journal file, so the procedure, that was interrupted, can be resumed without repeating already done operations
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, TextIO, Tuple
+
+from sm_client.data import settings
+
+
+class Journal:
+    """
+    Append-only journal of DR procedure in JSON lines format. The procedure starts with "start" record, every finished
+    site operation of the service is written as "step" record and procedure ends with "end" record.
+    Each record is flushed to disk before the next operation
+    @param str path: the path to journal file, journal is disabled, if it's not defined
+    @param bool resume: continue procedure from the journal
+    """
+
+    def __init__(self, path: Optional[str] = None, resume=False):
+        self.path = os.path.expanduser(path) if path else None
+        self.resume = resume
+        self.completed: set = set()  # verified operations (service, site, mode), that are not repeated on resume
+        self._file: Optional[TextIO] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def read(path: str) -> Tuple[Optional[dict], list]:
+        """ Reads the last procedure from journal file
+        @returns: "start" record of procedure (None, if journal doesn't have it) and list of its "step" records
+        """
+        start: Optional[dict] = None
+        steps: list = []
+        with open(os.path.expanduser(path)) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:  # the last record can be broken, if sm-client was killed during writing
+                    continue
+                if record.get("event") == "start":
+                    start, steps = record, []
+                elif record.get("event") == "step":
+                    steps.append(record)
+        return start, steps
+
+    def get_completed_steps(self, cmd, site) -> set:
+        """ Returns operations (service, site, mode), that were successfully done by the same procedure in journal """
+        if not self.resume or not self.path or not os.path.isfile(self.path):
+            return set()
+        start, steps = self.read(self.path)
+        if start is None or (start.get("cmd"), start.get("site")) != (cmd, site):
+            logging.warning(f"Journal {self.path} doesn't contain procedure {cmd} for site {site}, "
+                            f"procedure is started from the beginning")
+            return set()
+        return {(step["service"], step["site"], step["mode"]) for step in steps if step.get("ok")}
+
+    def start(self, cmd, site, services: list):
+        """ Opens journal file and writes "start" record, resumed procedure continues the last one """
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock:
+            self._file = open(self.path, "a" if self.resume else "w")
+        if self.resume and self.completed:
+            self._write({"event": "resume", "completed": len(self.completed)})
+        else:
+            self._write({"event": "start", "cmd": cmd, "site": site, "services": services})
+
+    def record_step(self, service, site, mode, ok: bool, status):
+        """ Writes "step" record for finished site operation of the service """
+        self._write({"event": "step", "service": service, "site": site, "mode": mode, "ok": ok, "status": status})
+
+    def is_completed(self, service, site, mode) -> bool:
+        """ Checks, that operation was done in resumed procedure """
+        return (service, site, mode) in self.completed
+
+    def close(self, ok: bool):
+        """ Writes "end" record and closes journal file """
+        if self._file is None:
+            return
+        self._write({"event": "end", "ok": ok})
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: dict):
+        """ Appends record to journal file and flushes it to disk """
+        with self._lock:
+            if self._file is None:
+                return
+            record["time"] = round(time.time(), 3)
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+
+def init_journal(path: Optional[str] = None, resume=False):
+    """ Creates new journal of current run
+    @param path: the path to journal file, journal is disabled, if it's not defined
+    @param resume: continue procedure from the journal
+    """
+    settings.current().journal = Journal(path, resume)
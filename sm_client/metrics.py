@@ -0,0 +1,150 @@
+"""Module, that collects metrics of sm-client run and saves them at the end of the procedure in Prometheus text format,
+so the file can be exported by node_exporter textfile collector and RTO of DR procedures can be tracked across runs
+"""
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from sm_client.data import settings
+
+HTTP_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # upper bounds of HTTP latency buckets, seconds
+
+
+def format_labels(**labels) -> str:
+    """ Returns labels in Prometheus text format: {name="value",...} """
+    if not labels:
+        return ""
+    escaped = {name: str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for name, value in labels.items()}
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped.items()) + "}"
+
+
+class Metrics:
+    """
+    Collects durations of site operations of services, polling iterations, HTTP requests latency and retries of
+    one run. Metrics snapshot is written to file, when procedure is finished
+    @param str path: the path to metrics file, metrics are not collected, if it's not defined
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = os.path.expanduser(path) if path else None
+        self.service_durations: dict = {}  # {(service, site, mode): (seconds, ok)}
+        self.polls: dict = {}  # {(service, site, mode): count}
+        self.http_requests: dict = {}  # {(site, endpoint): [count per bucket..., count, sum]}
+        self.http_retries: dict = {}  # {site: count}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """ Returns True, if metrics are collected """
+        return self.path is not None
+
+    def observe_service(self, service, site, mode, duration: float, ok: bool):
+        """ Records duration of finished site operation of the service """
+        if self.enabled:
+            with self._lock:
+                self.service_durations[(service, site, mode)] = (duration, ok)
+
+    def inc_polls(self, service, site, mode):
+        """ Counts polling iteration of the service """
+        if self.enabled:
+            with self._lock:
+                self.polls[(service, site, mode)] = self.polls.get((service, site, mode), 0) + 1
+
+    def observe_http(self, site, endpoint, duration: float, retries=0):
+        """ Records HTTP request to site-manager
+        @param site: the site name
+        @param endpoint: site-manager endpoint: list, status, wait (long-poll status) or DR procedure
+        @param duration: request duration in seconds
+        @param retries: the number of retries, that were done by HTTP client
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.http_requests.setdefault((site, endpoint), [0] * (len(HTTP_DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(HTTP_DURATION_BUCKETS):
+                if duration <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += duration
+            if retries:
+                self.http_retries[site] = self.http_retries.get(site, 0) + retries
+
+    def render(self, result, duration: float) -> str:
+        """ Returns metrics snapshot in Prometheus text format
+        @param ProcedureResult result: the result of procedure
+        @param duration: procedure duration in seconds
+        """
+        lines = []
+
+        def add(name, metric_type, help_text, samples):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"])
+            lines.extend(f"{name}{labels} {round(value, 3) if isinstance(value, float) else value}"
+                         for labels, value in samples)
+
+        procedure = format_labels(cmd=result.cmd, site=result.site or "")
+        add("sm_client_procedure_success", "gauge", "Result of the last procedure: 1 - success, 0 - failure",
+            [(procedure, int(result.ok))])
+        add("sm_client_procedure_duration_seconds", "gauge", "Duration of the last procedure",
+            [(procedure, float(duration))])
+        add("sm_client_procedure_timestamp_seconds", "gauge", "The time, when the last procedure was finished",
+            [(procedure, float(time.time()))])
+        add("sm_client_services", "gauge", "The number of services by final state of the last procedure",
+            [(format_labels(state=state), len(services)) for state, services in
+             [("done", result.done), ("failed", result.failed), ("warned", result.warned),
+              ("skipped", result.skipped), ("ignored", result.ignored)]])
+
+        with self._lock:
+            add("sm_client_service_duration_seconds", "gauge", "Duration of site operation of the service",
+                [(format_labels(service=service, site=site, mode=mode, status="ok" if ok else "failed"),
+                  float(seconds)) for (service, site, mode), (seconds, ok) in self.service_durations.items()])
+            add("sm_client_service_polls_total", "counter", "The number of polling iterations of the service",
+                [(format_labels(service=service, site=site, mode=mode), count)
+                 for (service, site, mode), count in self.polls.items()])
+            lines.extend(["# HELP sm_client_http_request_duration_seconds Latency of HTTP requests to site-managers",
+                          "# TYPE sm_client_http_request_duration_seconds histogram"])
+            for (site, endpoint), histogram in self.http_requests.items():
+                for bound, count in zip([str(bound) for bound in HTTP_DURATION_BUCKETS] + ["+Inf"],
+                                        histogram[:-2] + [histogram[-2]]):
+                    lines.append(f"sm_client_http_request_duration_seconds_bucket"
+                                 f"{format_labels(site=site, endpoint=endpoint, le=bound)} {count}")
+                labels = format_labels(site=site, endpoint=endpoint)
+                lines.append(f"sm_client_http_request_duration_seconds_sum{labels} {round(histogram[-1], 3)}")
+                lines.append(f"sm_client_http_request_duration_seconds_count{labels} {histogram[-2]}")
+            add("sm_client_http_retries_total", "counter", "The number of retries of HTTP requests to site-managers",
+                [(format_labels(site=site), count) for site, count in self.http_retries.items()])
+
+        connections = settings.current().http_sessions.stats()
+        requests_count = connections["opened"] + connections["reused"]
+        add("sm_client_http_connections", "gauge", "The number of opened and reused connections to site-managers",
+            [(format_labels(state=state), count) for state, count in connections.items()])
+        add("sm_client_http_connection_reuse_ratio", "gauge", "The part of HTTP requests, that reused connections",
+            [("", float(connections["reused"] / requests_count if requests_count else 0))])
+        add("sm_client_workers_peak", "gauge", "The maximum number of worker threads and asyncio tasks",
+            [(format_labels(kind="threads"), settings.current().service_scheduler.peak_workers),
+             (format_labels(kind="tasks"), settings.current().service_scheduler.max_tasks)])
+        return "\n".join(lines) + "\n"
+
+    def export(self, result, duration: float):
+        """ Saves metrics snapshot to metrics file, if metrics are enabled. File is replaced atomically, so textfile
+        collector doesn't read partially written metrics
+        """
+        if self.path is None:  # metrics are disabled
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(f"{self.path}.tmp", "w") as file:
+                file.write(self.render(result, duration))
+            os.replace(f"{self.path}.tmp", self.path)
+            logging.info(f"Procedure metrics are saved to {self.path}")
+        except OSError as e:
+            logging.warning(f"Can't save procedure metrics to {self.path}: {e}")
+
+
+def init_metrics(path: Optional[str] = None):
+    """ Creates new metrics collector of current run
+    @param path: the path to metrics file, metrics are not collected, if it's not defined
+    """
+    settings.current().metrics = Metrics(path)
@@ -4,14 +4,14 @@ from graphlib import CycleError
 from typing import Tuple, Optional
 
 from sm_client.data import settings
-from sm_client.data.structures import TopologicalSorter2, SMClusterState
+from sm_client.data.structures import TopologicalSorter2, ServiceGraph, SMClusterState
 
 
 def make_ordered_services_to_process(sm_dict: SMClusterState, site: str = None, services_to_process: list = None,
-                                     module = settings.default_module ) -> Tuple[list, bool, Optional[TopologicalSorter2]]:
+                                     module = settings.default_module ) -> Tuple[list, bool, Optional[ServiceGraph]]:
     """ Make ordered and validated services list from all sites in sm_dict
     @returns: ordered list or empty if not possible to assemble(integrity issue), True or False  in case minor issue
-        TopologicalSorter object in case success
+        ServiceGraph object in case success
     @todo[3]: cross site validation
     """
     def build_after_before_graph(dep_list: dict) -> TopologicalSorter2:
@@ -61,7 +61,7 @@ def make_ordered_services_to_process(sm_dict: SMClusterState, site: str = None,
             # leave only services listed in service_to_process, not skipped/ignored and belong to module
             if serv_conf.get('module', "") not in module or \
                     services_to_process and serv not in services_to_process or \
-                    settings.ignored_services and serv in settings.ignored_services:
+                    settings.current().ignored_services and serv in settings.current().ignored_services:
                 continue
             if serv not in services_with_deps:
                 services_with_deps[serv] = {'before': [], 'after': []}
@@ -71,10 +71,11 @@ def make_ordered_services_to_process(sm_dict: SMClusterState, site: str = None,
             services_with_deps[serv]['after'] += \
                 [dep for dep in serv_conf['after'] if dep not in services_with_deps[serv]['after']]
 
-    # collect sorted ordered service list
+    # collect sorted ordered service list, graph is built once and reused by all procedure steps
     service_lists = []
     try:
-        service_lists = list(build_after_before_graph(services_with_deps).static_order())
+        graph = ServiceGraph.from_sorter(build_after_before_graph(services_with_deps))
+        service_lists = list(graph.static_order())
         for service, depends in after_before_check(services_with_deps).items():  # check deps
             for depend in depends:
                 logging.warning(f"Sites: {used_sites}. Service: {service} has nonexistent "
@@ -87,7 +88,4 @@ def make_ordered_services_to_process(sm_dict: SMClusterState, site: str = None,
     if integrity_error:
         return [], False, None # return error, integrity issue
 
-    # check services equality on all sites
-    ts = build_after_before_graph(services_with_deps)
-    ts.prepare()
-    return service_lists, ret, ts
+    return service_lists, ret, graph
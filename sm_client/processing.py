@@ -1,120 +1,557 @@
 """Functions that are used for procedure processing"""
+import asyncio
+import contextlib
+import contextvars
 import copy
+import functools
+import heapq
+import itertools
 import logging
+import math
+import random
 import threading
-from queue import Queue
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+from queue import PriorityQueue
 import time
 from http import HTTPStatus
-from typing import Tuple, Dict
+from typing import Tuple, Dict, NamedTuple, Iterator, Optional
 
-from sm_client import utils
+from sm_client import history, trace
 from sm_client.data import settings
-from sm_client.data.structures import TopologicalSorter2, ServiceDRStatus, SMClusterState
+from sm_client.data.structures import ServiceGraph, ServiceGraphCursor, ServiceDRStatus, SMClusterState
+
+class ServiceScheduler:
+    """
+    ThreadPoolExecutor-like scheduler for services processing. Runs submitted jobs in at most max_workers threads,
+    excess jobs wait in the queue in submission order. Additionally, limits the number of jobs, that work with the
+    same site at the same time, using site_slot.
+    @param int max_workers: the maximum number of worker threads, 0 means unlimited
+    @param dict site_max_workers: the maximum number of jobs per site {site: limit}, 0 means unlimited
+    """
+
+    def __init__(self, max_workers=0, site_max_workers: dict = None):
+        self.max_workers = max_workers
+        self.site_max_workers = {site: limit for site, limit in (site_max_workers or {}).items() if limit}
+        self._site_semaphores = {site: threading.BoundedSemaphore(limit)
+                                 for site, limit in self.site_max_workers.items()}
+        self._async_site_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._queue: PriorityQueue = PriorityQueue()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._workers: list = []
+        self._pending = 0
+        self._idle = 0
+        self.max_queue_depth = 0
+        self.max_tasks = 0  # the maximum number of running asyncio tasks
+        self.wait_times: Dict[str, float] = {}  # job name -> time in seconds spent in queues
+
+    @property
+    def peak_workers(self) -> int:
+        """ Returns the number of started worker threads, they are kept till shutdown """
+        return len(self._workers)
+
+    def record_tasks(self, count: int):
+        """ Records the number of running asyncio tasks """
+        self.max_tasks = max(self.max_tasks, count)
+
+    def submit(self, func, *args, name=None, priority=0) -> Future:
+        """ Schedules func(*args) to be executed, returns Future with the result
+        @param name: job name, that is used for reporting
+        @param priority: jobs with lower priority are started first, jobs with equal priority start in FIFO order
+        """
+        future: Future = Future()
+        with self._lock:
+            # job is run in the context of caller to keep run parameters of its DR session
+            self._queue.put((priority, next(self._counter), name, time.monotonic(), future,
+                             functools.partial(contextvars.copy_context().run, func), args))
+            self._pending += 1
+            queue_depth = max(self._pending - self._idle, 0)
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+            if self._pending > self._idle and (not self.max_workers or len(self._workers) < self.max_workers):
+                worker = threading.Thread(target=self._work, name=f"sm-client-worker-{len(self._workers)}",
+                                          daemon=True)
+                self._workers.append(worker)
+                self._idle += 1
+                worker.start()
+            elif queue_depth:
+                logging.debug(f"Job {name} is queued, queue depth: {queue_depth}")
+        return future
+
+    def _work(self):
+        """ Worker thread loop """
+        while True:
+            _, _, name, enqueue_time, future, func, args = self._queue.get()
+            with self._lock:
+                self._pending -= 1
+                self._idle -= 1
+            if future is None:  # shutdown
+                return
+            self.record_wait(name, time.monotonic() - enqueue_time)
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    logging.exception(f"Job {name} failed")
+                    future.set_exception(e)
+            with self._lock:
+                self._idle += 1
+
+    def record_wait(self, name, wait_time: float):
+        """ Adds time, that job spent in queues """
+        if name is None:
+            return
+        with self._lock:
+            self.wait_times[name] = self.wait_times.get(name, 0) + wait_time
+        if wait_time >= 1:
+            logging.debug(f"Job {name} waited {wait_time:.1f} seconds in queue")
+
+    @contextlib.contextmanager
+    def site_slot(self, site, name=None):
+        """ Context manager, that holds one of site_max_workers slots for site during the block """
+        semaphore = self._site_semaphores.get(site)
+        if semaphore is None:
+            yield
+            return
+        start_time = time.monotonic()
+        with semaphore:
+            self.record_wait(name, time.monotonic() - start_time)
+            yield
+
+    @contextlib.asynccontextmanager
+    async def async_site_slot(self, site, name=None):
+        """ Asyncio version of site_slot, should be used from one event loop only """
+        if site not in self.site_max_workers:
+            yield
+            return
+        semaphore = self._async_site_semaphores.setdefault(site, asyncio.Semaphore(self.site_max_workers[site]))
+        start_time = time.monotonic()
+        async with semaphore:
+            self.record_wait(name, time.monotonic() - start_time)
+            yield
+
+    def reset_async_slots(self):
+        """ Drops asyncio semaphores, should be called before new event loop usage"""
+        self._async_site_semaphores.clear()
+
+    def report(self):
+        """ Logs queues statistic """
+        waited = {name: round(wait_time, 1) for name, wait_time in self.wait_times.items() if wait_time >= 0.1}
+        logging.debug(f"Scheduler statistic: workers: {len(self._workers)}, max tasks: {self.max_tasks}, "
+                      f"max queue depth: {self.max_queue_depth}, wait time per service: {waited}")
+
+    def shutdown(self):
+        """ Stops worker threads, after all submitted jobs are finished """
+        with self._lock:
+            for _ in self._workers:
+                self._queue.put((float("inf"), next(self._counter), None, 0, None, None, None))
+                self._pending += 1
+            self._workers = []
+
+
+def init_service_scheduler(max_workers=0, site_max_workers: dict = None):
+    """ Creates new service scheduler of current run with defined limits, previous one is stopped
+    @param max_workers: the maximum number of worker threads, 0 means unlimited
+    @param site_max_workers: the maximum number of jobs per site {site: limit}
+    """
+    settings.current().service_scheduler.shutdown()
+    settings.current().service_scheduler = ServiceScheduler(max_workers, site_max_workers)
 
-thread_pool: list = []
-thread_result_queue: Queue = Queue(maxsize=-1)
 
+def run_status_procedure(sm_dict: SMClusterState, service_dep_ordered: list, sites: list = None):
+    """ Runs status procedure for defined services.
+    Statuses are requested with one request per site (or per chunk of settings.current().STATUS_BATCH_SIZE services),
+    site-manager collects them in parallel. Per service requests are used, if bulk request failed
+    (e.g. site-manager doesn't support services list) or it doesn't contain some services.
+    Only services, that exist on the site, are requested from it, others get failed status
+    @param sites: sites to get statuses from, all available sites by default
+    """
 
-def run_status_procedure(sm_dict: SMClusterState, service_dep_ordered: list):
-    """ Runs status procedure for defined services"""
+    def set_status(site, serv, sm_dict, response, ok):
+        if not sm_dict[site]['services'].get(serv):
+            sm_dict[site]['services'][serv] = {}
+            sm_dict.invalidate_index()
+        sm_dict[site]['services'][serv]['status'] = ServiceDRStatus(response) if ok else False
 
-    for serv in service_dep_ordered:
-        def run_in_thread(site, serv, sm_dict):  # to run each status service in parallel
+    def run_status(site, serv, sm_dict):  # to run each status service in parallel
+        with settings.current().service_scheduler.site_slot(site, f"{serv} on {site}"):
             response, _, return_code = sm_process_service(site, serv, "status")
-            if not sm_dict[site]['services'].get(serv):
-                sm_dict[site]['services'][serv] = {}
-            sm_dict[site]['services'][serv]['status'] = ServiceDRStatus(response) if return_code else False
+        set_status(site, serv, sm_dict, response, return_code)
+
+    def run_bulk_status(site, services, sm_dict):  # to run status for chunk of services in parallel
+        with settings.current().service_scheduler.site_slot(site, f"{len(services)} services on {site}"):
+            response, ok, _ = sm_process_services_status(site, services)
+        statuses = response.get("services") if ok and isinstance(response.get("services"), dict) else {}
+        missed_services = [serv for serv in services if not isinstance(statuses.get(serv), dict)]
+        if missed_services:
+            logging.debug(f"Bulk status request on site {site} didn't return services {missed_services}, "
+                          f"requesting them one by one")
+        for serv in services:
+            if serv not in missed_services:
+                set_status(site, serv, sm_dict, {"services": {serv: statuses[serv]}}, True)
+        return [settings.current().service_scheduler.submit(run_status, site, serv, sm_dict, name=f"{serv} on {site}")
+                for serv in missed_services]
 
-        for site_i in sm_dict.get_available_sites():
-            thread = threading.Thread(target=run_in_thread, args=(site_i, serv, sm_dict))
-            thread.name = f"Thread: {serv}"
-            thread.start()
-            thread_pool.append(thread)
-    for thread in thread_pool:
-        thread.join()
+    futures = []
+    for site_i in (sites or sm_dict.get_available_sites()):
+        # site-manager rejects the whole request, if some of services don't exist on the site
+        site_services = [serv for serv in service_dep_ordered if sm_dict.has_service(site_i, serv)]
+        for serv in service_dep_ordered:
+            if serv not in site_services:
+                set_status(site_i, serv, sm_dict, {}, False)
+        chunk_size = settings.current().STATUS_BATCH_SIZE or len(site_services) or 1
+        futures += [settings.current().service_scheduler.submit(run_bulk_status, site_i, site_services[i:i + chunk_size],
+                                                                sm_dict, name=f"status chunk on {site_i}")
+                    for i in range(0, len(site_services), chunk_size)]
+    wait(futures)
+    fallback_futures = [future for bulk_future in futures for future in bulk_future.result()]
+    wait(fallback_futures)
+    settings.current().service_scheduler.report()
+
+
+def get_procedure_modules(cmd: str) -> Iterator[Tuple[str, Optional[list]]]:
+    """ Yields (module, states) from module flow, that are processed by dr or site procedure cmd """
+    for elem in settings.current().module_flow:
+        module, states = list(elem.items())[0]
+        if cmd in ['standby', 'disable', 'return'] and (states and states == ['active']):
+            return
+        if cmd in 'active' and (states and set(states) == {'standby', 'disable'}):
+            continue
+        yield module, states
 
 
 def run_dr_or_site_procedure(sm_dict: SMClusterState, cmd: str, site: str):
     """ Runs dr or site procedure"""
     dr_status = True
-    for elem in settings.module_flow:
-        module, states = list(elem.items())[0]
+    for module, states in get_procedure_modules(cmd):
         if not dr_status:  # fail rest of services in case failed before
             for i in sm_dict.get_module_services(sm_dict.get_available_sites()[0], module):
                 skip_service_due_deps(i)
             continue
-        if cmd in ['standby', 'disable', 'return'] and (states and states == ['active']):
-            break
-        if cmd in 'active' and (states and set(states) == {'standby', 'disable'}):
-            continue
         process_module_services(module, states, cmd, site, sm_dict)
-        if settings.failed_services:
-            logging.debug(f"Module {module} failed. Failed services {settings.failed_services}")
+        if settings.current().failed_services:
+            logging.debug(f"Module {module} failed. Failed services {settings.current().failed_services}")
             logging.error(f"Module {module} failed, skipping rest of services, exiting")
             dr_status = False
 
 
+def verify_completed_steps(sm_dict: SMClusterState, steps: set) -> set:
+    """ Checks, that services are still in modes, that were done by interrupted procedure. Statuses are requested
+    with one bulk status pass per site
+    @param steps: operations (service, site, mode) from journal
+    @returns: operations, that don't need to be repeated
+    """
+    if not steps:
+        return set()
+    verified = set()
+    for site in sorted({site for _, site, _ in steps}):
+        site_steps = sorted(step for step in steps if step[1] == site)
+        if site not in sm_dict.keys() or not sm_dict[site]['status']:
+            continue
+        services = [service for service in dict.fromkeys(step[0] for step in site_steps)
+                    if service in sm_dict[site]['services']]
+        run_status_procedure(sm_dict, services, [site])
+        for service, _, mode in site_steps:
+            status = sm_dict[site]['services'].get(service, {}).get('status')
+            if status and is_step_state_reached(site, service, mode, sm_dict, status):
+                verified.add((service, site, mode))
+            else:
+                logging.info(f"Service {service} is not in {mode} mode on site {site}, operation will be repeated")
+    logging.info(f"Resumed procedure: {len(verified)} of {len(steps)} done operations are verified")
+    return verified
+
+
+def is_step_state_reached(site, service, mode, sm_dict, status: ServiceDRStatus) -> bool:
+    """ Checks, that service status matches the expected state, which is polled after the operation in <mode>
+    @param status: current service status on <site>
+    @returns: True, if status, mode and healthz of the service are expected ones
+    """
+    expected_state, _ = get_polling_states(site, service, mode, sm_dict)
+    actual_state = {"status": status.status, "mode": status.mode, "healthz": status.healthz}
+    return all(str(actual_state[key]) in values for key, values in expected_state.items())
+
+
 def skip_service_due_deps(service: str):
     """
     If service was skipped due dependencies or flow problems, it should be marked as not skipped due dependency
     """
-    if service in settings.failed_services:
-        return
-    if service not in settings.skipped_due_deps_services:
-        settings.skipped_due_deps_services.append(service)
-    if service in settings.done_services:
-        settings.done_services.remove(service)
-    if service in settings.warned_services:
-        settings.warned_services.remove(service)
+    settings.current().service_results.set_skipped(service)
+
+
+def as_service_graph(graph) -> Optional[ServiceGraph]:
+    """ Returns ServiceGraph for ServiceGraph or TopologicalSorter2 with services dependencies """
+    if graph is None or isinstance(graph, ServiceGraph):
+        return graph
+    return ServiceGraph.from_sorter(graph)
+
+
+def make_graph_cursor(graph) -> Optional[ServiceGraphCursor]:
+    """ Returns new cursor to process services in dependency order
+    @param graph: ServiceGraph or TopologicalSorter2 with services dependencies
+    """
+    graph = as_service_graph(graph)
+    return graph.cursor() if graph else None
+
+
+def get_service_operations_timing(service, site, cmd, sm_dict) -> list:
+    """ Returns expected and worst-case durations of the service procedure operations in seconds.
+    Expected duration is taken from history of previous runs, polling timeout is used for operations without history.
+    Worst-case duration is polling timeout of the service on the operation site
+    @return: [{"site": site, "mode": mode, "expected": seconds, "worst": seconds, "history": bool}]
+    """
+    if cmd in settings.site_cmds:
+        operations = [(site, settings.current().sm_conf.convert_sitecmd_to_dr_mode(cmd))]
+    else:
+        try:
+            operations = sm_dict.get_dr_operation_sequence(service, cmd, site)
+        except KeyError:  # service is absent on one of sites
+            operations = []
+    timing = []
+    for operation_site, mode in operations:
+        timeout = get_polling_timeout(operation_site, service, sm_dict)
+        expected = history.get_expected_duration(service, mode)
+        timing.append({"site": operation_site, "mode": mode, "expected": timeout if expected is None else expected,
+                       "worst": timeout, "history": expected is not None})
+    return timing
+
+
+def get_service_duration(service, site, cmd, sm_dict) -> float:
+    """ Returns expected duration of the service procedure in seconds: sum of expected durations of its operations """
+    return sum(operation["expected"] for operation in get_service_operations_timing(service, site, cmd, sm_dict))
+
+
+def get_critical_path_priorities(graph, site, cmd, sm_dict) -> Dict[str, float]:
+    """ Returns scheduler priorities for services: services on the longest remaining dependency chain
+    (weighted by expected durations) have lower priority value and are started first
+    """
+    graph = as_service_graph(graph)
+    if graph is None:
+        return {}
+    durations = {service: get_service_duration(service, site, cmd, sm_dict) for service in graph.nodes}
+    return {service: -length for service, length in graph.critical_path_lengths(durations).items()}
+
+
+def predict_makespan(graph, durations: dict, max_workers=0) -> float:
+    """ Predicts duration of services graph processing with critical path scheduling and max_workers limit
+    @param graph: ServiceGraph or TopologicalSorter2 with services dependencies
+    @param durations: expected durations of services
+    @param max_workers: the maximum number of services, that are processed at the same time, 0 means unlimited
+    """
+    graph = as_service_graph(graph)
+    if graph is None:
+        return 0
+    remaining = graph.critical_path_lengths(durations)
+    cursor = graph.cursor()
+    counter = itertools.count()
+    ready: list = []
+    running: list = []
+    now = 0.0
+    while True:
+        for service in cursor.get_ready():
+            heapq.heappush(ready, (-remaining[service], next(counter), service))
+        while ready and (not max_workers or len(running) < max_workers):
+            _, _, service = heapq.heappop(ready)
+            heapq.heappush(running, (now + durations.get(service, 0), next(counter), service))
+        if not running:
+            return now
+        now, _, service = heapq.heappop(running)
+        cursor.done(service)
+
+
+class AsyncPrioritySlots:
+    """ Asyncio semaphore, that wakes up waiters with lower priority value first (FIFO for equal priorities)
+    @param limit: the number of slots
+    """
+
+    def __init__(self, limit):
+        self._free = limit
+        self._waiters: list = []
+        self._counter = itertools.count()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority=0):
+        """ Holds one slot during the block """
+        if self._free and not self._waiters:
+            self._free -= 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+            try:
+                await waiter  # slot is passed by releasing coroutine
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()  # slot was passed right before cancellation
+                else:
+                    self._waiters = [entry for entry in self._waiters if entry[2] is not waiter]
+                    heapq.heapify(self._waiters)
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        """ Passes the slot to the first waiter, which is still waiting, or frees it """
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)[2]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._free += 1
+
+
+def handle_service_response(ts: ServiceGraphCursor, service_response: ServiceDRStatus, failed_successors: set):
+    """ Marks processed service as done in ts object and all its successors as failed, if service is failed
+    @param ts: ServiceGraphCursor that is processed
+    @param service_response: ServiceDRStatus result of processed service
+    @param failed_successors: set of services, that should be skipped due to dependencies
+    """
+    if not service_response.is_ok() and service_response.service not in failed_successors:
+        # mark failed and skip successors of serv_done, successors of skipped services are already marked
+        for s in ts.transitive_successors(service_response.service):
+            if s not in failed_successors:
+                logging.debug(f"Found successor {s} for failed {service_response.service} ")
+                failed_successors.add(s)
+    ts.done(service_response.service)
+    if service_response.service not in settings.current().skipped_due_deps_services:
+        service_response.sortout_service_results()
+
+
+def get_ready_by_priority(ts: ServiceGraphCursor, priorities: dict = None) -> list:
+    """ Returns ready services sorted by priority, services with equal priority keep dependency order """
+    ready = ts.get_ready()
+    return sorted(ready, key=lambda serv: priorities.get(serv, 0)) if priorities else list(ready)
+
+
+class ServiceGraphRun:
+    """ Processing state of services graph, that is shared by engines: engine starts services, that are returned by
+    get_ready, adds results of finished services to responses and passes them to the graph with handle_response.
+    Services, that depend on failed ones, are not returned by get_ready, their results are added to responses
+    @param graph: ServiceGraph (or TopologicalSorter2) with services dependencies
+    @param priorities: scheduler priorities of services, ready services with lower value are started first
+    """
+
+    def __init__(self, graph, priorities: dict = None):
+        # Spawn new cursor for graph to process modules by flow on different sites separately
+        self.cursor = make_graph_cursor(graph)
+        self.priorities = priorities or {}
+        self.responses: deque = deque()  # results of finished services, that are not passed to the graph yet
+        self._failed_successors: set = set()
+
+    def is_active(self) -> bool:
+        """ Returns True, if there are services, that are not processed yet """
+        return self.cursor is not None and self.cursor.is_active()
+
+    def get_ready(self) -> list:
+        """ Returns services, that are ready to be started, in priority order """
+        if self.cursor is None:
+            return []
+        ready = []
+        for serv in get_ready_by_priority(self.cursor, self.priorities):
+            if serv in self._failed_successors:
+                logging.info(f"Service {serv} marked as failed due to dependencies")
+                skip_service_due_deps(serv)
+                self.responses.append(ServiceDRStatus({'services': {serv: {}}}))
+                continue
+            ready.append(serv)
+        return ready
 
+    def handle_response(self):
+        """ Passes the first of finished services results to the graph """
+        if self.cursor is not None:
+            handle_service_response(self.cursor, self.responses.popleft(), self._failed_successors)
 
-def process_ts_services(ts: TopologicalSorter2, process_func, *run_args) -> None:
+
+def process_ts_services(ts: ServiceGraph, process_func, *run_args, priorities: dict = None) -> None:
     """ Runs services in ts object one-by-one on both sites using process_func method.
     process_func have to put  ServiceDRStatus result in thread_result_queue  queue
-    @param ts: TopologicalSorter2
+    @param ts: ServiceGraph (or TopologicalSorter2) with services dependencies
     @param process_func: method with 1 mandatory param - service name from ts
     @param run_args: list of additional params  passed to process_func
+    @param priorities: scheduler priorities of services, ready services with lower value are started first
     """
-    failed_successors = []
-    serv_thread_pool = []
-    # global thread_result_queue
+    graph_run = ServiceGraphRun(ts, priorities)
+    serv_futures = []
+    while graph_run.is_active():  # process all services one by one  in  sorted by dependency
+        for serv in graph_run.get_ready():
+            # ready services are queued by priority, if all scheduler workers are busy
+            serv_futures.append(settings.current().service_scheduler.submit(process_func, serv, *run_args, name=serv,
+                                                                            priority=graph_run.priorities.get(serv, 0)))
+        if not graph_run.responses:
+            graph_run.responses.append(settings.current().thread_result_queue.get())
+        graph_run.handle_response()
+    wait(serv_futures)
+    settings.current().service_scheduler.report()
 
-    # Make deep copy for ts to process modules by flow on different sites separately
-    ts = copy.deepcopy(ts)
 
-    while ts and ts.is_active():  # process all services one by one  in  sorted by dependency
-        for serv in ts.get_ready():
-            if serv in failed_successors:
-                logging.info(f"Service {serv} marked as failed due to dependencies")
-                skip_service_due_deps(serv)
-                thread_result_queue.put(ServiceDRStatus({'services': {serv: {}}}))
-                continue
-            thread = threading.Thread(target=process_func,
-                                      args=(serv,) + run_args)
-            thread.name = f"Thread: {serv}"
-            serv_thread_pool.append(thread)
-            thread.start()
-        service_response = thread_result_queue.get()
-
-        if not service_response.is_ok():  # mark failed and skip successors of serv_done
-            for s in ts.successors(service_response.service):
-                logging.debug(f"Found successor {s} for failed {service_response.service} ")
-                failed_successors.append(s)
-        ts.done(service_response.service)
-        if service_response.service not in settings.skipped_due_deps_services:
-            service_response.sortout_service_results()
-    for thread in serv_thread_pool:
-        thread.join()
+class AsyncWorkers:
+    """ Limit of service scheduler max_workers for coroutines of asyncio engine, coroutines with lower priority value
+    are started first
+    """
 
+    def __init__(self):
+        max_workers = settings.current().service_scheduler.max_workers
+        self._slots = AsyncPrioritySlots(max_workers) if max_workers else None
 
-def process_module_services(module, states, cmd, site, sm_dict):
-    """ Process services for specific module and states"""
+    async def run(self, name, priority, coro):
+        """ Runs coroutine, when one of max_workers slots is free """
+        start_time = time.monotonic()
+        async with self._slots.slot(priority) if self._slots else contextlib.nullcontext():
+            settings.current().service_scheduler.record_wait(name, time.monotonic() - start_time)
+            return await coro
+
+
+def run_async_engine(coro):
+    """ Runs coroutine of asyncio engine in new event loop of the run clock, blocking http requests are executed by
+    bounded pool of settings.current().ASYNC_HTTP_WORKERS workers
+    """
+    async def run_with_http_workers():
+        with ThreadPoolExecutor(max_workers=settings.current().ASYNC_HTTP_WORKERS,
+                                thread_name_prefix="sm-client-http") as executor:
+            asyncio.get_running_loop().set_default_executor(executor)
+            settings.current().service_scheduler.reset_async_slots()
+            await coro
+        settings.current().service_scheduler.report()
+
+    settings.current().clock.run(run_with_http_workers())
+
+
+def process_ts_services_async(ts: ServiceGraph, process_coro, *run_args, priorities: dict = None) -> None:
+    """ Asyncio engine for process_ts_services. Runs services in ts object as coroutines in one event loop
+    @param ts: ServiceGraph (or TopologicalSorter2) with services dependencies
+    @param process_coro: coroutine function with 1 mandatory param - service name from ts,
+     that returns ServiceDRStatus result
+    @param run_args: list of additional params  passed to process_coro
+    @param priorities: priorities of services, ready services with lower value are started first
+    """
+    run_async_engine(_process_ts_services_async(ServiceGraphRun(ts, priorities), process_coro, *run_args))
+
+
+async def _process_ts_services_async(graph_run: ServiceGraphRun, process_coro, *run_args) -> None:
+    """ Event loop part of process_ts_services_async """
+    workers = AsyncWorkers()
+    tasks: list = []
+    while graph_run.is_active():  # process all services one by one  in  sorted by dependency
+        tasks.extend(asyncio.create_task(workers.run(serv, graph_run.priorities.get(serv, 0),
+                                                     process_coro(serv, *run_args)), name=f"Task: {serv}")
+                     for serv in graph_run.get_ready())
+        settings.current().service_scheduler.record_tasks(len(tasks))
+        if not graph_run.responses:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            # keep start order for services, that were finished simultaneously
+            graph_run.responses.extend(task.result() for task in tasks if task in done)
+            tasks = [task for task in tasks if task not in done]
+        graph_run.handle_response()
+
+
+def get_module_site_and_cmd(states, cmd, site) -> Tuple[str, str]:
+    """ Returns target site and site cmd to process module with specific states by procedure cmd """
     def get_cmd():
         """get site cmd for module"""
         if states:  #  [standby,disable] or ['active']
             if cmd in ['move', 'stop']:
                 return states[0]
-            return settings.sm_conf.convert_sitecmd_to_dr_mode(cmd)
+            return settings.current().sm_conf.convert_sitecmd_to_dr_mode(cmd)
         return cmd
 
     def get_site():
@@ -122,142 +559,459 @@ def process_module_services(module, states, cmd, site, sm_dict):
         if states and \
                 (get_cmd() in 'active' and cmd in 'stop' or
                  get_cmd() not in 'active' and cmd in 'move'):
-            return settings.sm_conf.get_opposite_site(site)
+            return settings.current().sm_conf.get_opposite_site(site)
         return site
 
-    logging.info(f"Processing {module} module by cmd: {get_cmd()} on site: {get_site()}")
+    return get_site(), get_cmd()
+
+
+def process_module_services(module, states, cmd, site, sm_dict):
+    """ Process services for specific module and states"""
+    module_site, module_cmd = get_module_site_and_cmd(states, cmd, site)
+    with settings.current().tracer.span(f"module {module}: {module_cmd} on {module_site}", "module"):
+        _process_module_services(module, module_site, module_cmd, cmd, sm_dict)
 
-    process_ts_services(sm_dict.globals[module]["ts"],
-                        sm_process_service_with_polling,
-                        get_site(), get_cmd(), sm_dict, cmd == "stop")
 
+def _process_module_services(module, module_site, module_cmd, cmd, sm_dict):
+    """ Process services for specific module on module site by module cmd """
+    logging.info(f"Processing {module} module by cmd: {module_cmd} on site: {module_site}")
 
-def sm_process_service_with_polling(service, site, cmd, sm_dict, is_failover=False) -> None:
-    """ Processes the service with specific site cmd with polling """
-    #global thread_result_queue
+    graph = as_service_graph(sm_dict.globals[module]["ts"])
+    if settings.current().PIPELINE and graph and module_cmd in settings.dr_processing_cmd:
+        pipeline = ServicePipeline(graph, module_site, module_cmd, sm_dict, cmd == "stop")
+        priorities = {step: -length for step, length in
+                      pipeline.step_graph.critical_path_lengths(pipeline.get_durations()).items()}
+        if settings.current().ENGINE == "asyncio":
+            process_pipeline_services_async(pipeline, priorities)
+        else:
+            process_pipeline_services(pipeline, priorities)
+        return
 
-    service_response = ServiceDRStatus({'services': {service: {}}})
+    # services on the longest remaining dependency chain are started first
+    priorities = get_critical_path_priorities(graph, module_site, module_cmd, sm_dict)
+    if settings.current().ENGINE == "asyncio":
+        process_ts_services_async(graph,
+                                  sm_process_service_with_polling_async,
+                                  module_site, module_cmd, sm_dict, cmd == "stop", priorities=priorities)
+    else:
+        process_ts_services(graph,
+                            sm_process_service_with_polling,
+                            module_site, module_cmd, sm_dict, cmd == "stop", priorities=priorities)
 
-    logging.info(f"Processing {service} in thread start...")
+
+def predict_procedure_makespan(sm_dict: SMClusterState, cmd: str, site: str) -> float:
+    """ Predicts duration of dr or site procedure in seconds: modules are processed one by one by module flow,
+    services inside module are scheduled by critical path with max_workers limit
+    """
+    makespan = 0.0
+    for module, states in get_procedure_modules(cmd):
+        graph = as_service_graph(sm_dict.globals[module]["ts"])
+        if graph is None:
+            continue
+        module_site, module_cmd = get_module_site_and_cmd(states, cmd, site)
+        if settings.current().PIPELINE and module_cmd in settings.dr_processing_cmd:
+            pipeline = ServicePipeline(graph, module_site, module_cmd, sm_dict, cmd == "stop")
+            makespan += predict_makespan(pipeline.step_graph, pipeline.get_durations(), settings.current().service_scheduler.max_workers)
+            continue
+        durations = {service: get_service_duration(service, module_site, module_cmd, sm_dict)
+                     for service in graph.nodes}
+        makespan += predict_makespan(graph, durations, settings.current().service_scheduler.max_workers)
+    return makespan
+
+
+def estimate_procedure_timing(sm_dict: SMClusterState, cmd: str, site: str) -> dict:
+    """ Estimates expected and worst-case durations of dr or site procedure per stage.
+    Stage is the set of services, that are ready to be processed after previous stage is done, its duration is
+    the duration of the longest service. Predicted duration takes into account critical path scheduling and
+    max_workers limit, so it can be less than sum of stages
+    @return: {"procedure": cmd, "site": site, "expected": seconds, "worst": seconds, "predicted": seconds,
+     "stages": [{"stage": number, "module": module, "site": site, "cmd": cmd, "expected": seconds, "worst": seconds,
+     "services": [{"service": service, "expected": seconds, "worst": seconds, "operations": [...]}]}]}
+    """
+    stages: list = []
+    for module, states in get_procedure_modules(cmd):
+        module_site, module_cmd = get_module_site_and_cmd(states, cmd, site)
+        cursor = make_graph_cursor(sm_dict.globals[module]["ts"])
+        while cursor and cursor.is_active():
+            services = []
+            for service in cursor.get_ready():
+                operations = get_service_operations_timing(service, module_site, module_cmd, sm_dict)
+                services.append({"service": service,
+                                 "expected": sum(operation["expected"] for operation in operations),
+                                 "worst": sum(operation["worst"] for operation in operations),
+                                 "operations": operations})
+                cursor.done(service)
+            stages.append({"stage": len(stages) + 1, "module": module, "site": module_site, "cmd": module_cmd,
+                           "expected": max(service["expected"] for service in services),
+                           "worst": max(service["worst"] for service in services),
+                           "services": services})
+    return {"procedure": cmd, "site": site,
+            "expected": sum(stage["expected"] for stage in stages),
+            "worst": sum(stage["worst"] for stage in stages),
+            "predicted": predict_procedure_makespan(sm_dict, cmd, site),
+            "stages": stages}
+
+
+class ServiceStep(NamedTuple):
+    """ One site operation of the service during procedure processing.
+    If skip_response is defined, operation is not performed and skip_response is used as result
+    """
+    site: str
+    mode: str
+    force: bool = False
+    allow_failure: bool = False
+    no_wait: bool = True
+    result_site: Optional[str] = None  # site to calculate result status, if operation wasn't started
+    skip_response: Optional[ServiceDRStatus] = None
+
+
+def get_service_steps(service, site, cmd, sm_dict, is_failover=False) -> list:
+    """ Returns the list of ServiceStep to process the service with specific site cmd or DR procedure """
+    def get_force_options(mode, is_failover_mode):
+        if is_failover_mode and mode == "standby":
+            logging.info(f"Force key enabled for procedure 'stop' for service {service} on passivated site")
+            return True, True
+        return settings.current().force, False
+
+    def get_resumed_status(site_to_process, mode, force, allow_failure) -> Optional[ServiceDRStatus]:
+        if not settings.current().journal.is_completed(service, site_to_process, mode):
+            return None
+        logging.info(f"Service {service} is already in {mode} mode on site {site_to_process}, skip it on resume")
+        status = sm_dict[site_to_process]['services'][service]['status']
+        return ServiceDRStatus({'services': {service: {"mode": status.mode, "status": status.status,
+                                                       "healthz": status.healthz, "message": status.message}}},
+                               sm_dict, site_to_process, mode, force, allow_failure)
+
+    steps = []
     if cmd in settings.site_cmds:
         if service in sm_dict[site]['services']:
-            mode = settings.sm_conf.convert_sitecmd_to_dr_mode(cmd)
-            data, ok, status_code = sm_process_service(site, service, mode)
-            if is_failover and mode == "standby":
-                force = True
-                allow_failure = True
-                logging.info(f"Force key enabled for procedure 'stop' for service {service} on passivated site")
-            else:
-                allow_failure = False
-                force = settings.force
-            if not ok:
-                logging.error(f"Failed changing status for service {service}, returned status code {status_code}")
-                if not data:
-                    data = {'services':{service:{"message": "Service didn't reply"}}}
-                service_response = ServiceDRStatus(data, sm_dict, site, mode, force, allow_failure)
-            else:
-                service_response = sm_poll_service_required_status(site, service, mode, sm_dict, force, allow_failure)
-                if service_response.service not in settings.skipped_due_deps_services:
-                    service_response.sortout_service_results()
+            mode = settings.current().sm_conf.convert_sitecmd_to_dr_mode(cmd)
+            force, allow_failure = get_force_options(mode, is_failover)
+            steps.append(ServiceStep(site, mode, force, allow_failure,
+                                     skip_response=get_resumed_status(site, mode, force, allow_failure)))
         else:
             logging.warning(f"Skip procedure {cmd} for service {service} on site {site}")
-            service_response = ServiceDRStatus({'services': {service: {"message": "Service doesn't exist"}}})
+            steps.append(ServiceStep(site, cmd, skip_response=ServiceDRStatus(
+                {'services': {service: {"message": "Service doesn't exist"}}})))
     elif cmd in settings.dr_procedures:
         for site_to_process, mode in sm_dict.get_dr_operation_sequence(service, cmd, site):
-            if cmd == "stop" and mode == "standby":
-                force = True
-                allow_failure = True
-                logging.info(f"Force key enabled for procedure 'stop' for service {service} on passivated site")
-            else:
-                allow_failure = False
-                force = settings.force
-
+            force, allow_failure = get_force_options(mode, cmd == "stop")
             if service not in sm_dict[site_to_process].get("services", []):
                 logging.warning(f"Skip procedure {cmd} for service {service} on site {site_to_process}")
-                service_response = ServiceDRStatus({'services': {service: {"message": "Service doesn't exist"}}})
+                steps.append(ServiceStep(site_to_process, mode, skip_response=ServiceDRStatus(
+                    {'services': {service: {"message": "Service doesn't exist"}}})))
             elif sm_dict[site_to_process]['status']:  # to process only available sites
-                data, ok, status_code = sm_process_service(site_to_process, service, mode, 'move' not in cmd)
-                if not ok:
-                    logging.error(f"Failed changing status for service {service}, returned status code {status_code}")
-                    if not data:
-                        data = {'services':{service:{"message": "Service didn't reply"}}}
-                    service_response = ServiceDRStatus(data, sm_dict, site, mode, force, allow_failure)
-                else:
-                    service_response = sm_poll_service_required_status(site_to_process, service, mode, sm_dict, force, allow_failure)
-                    if service_response.service not in settings.skipped_due_deps_services:
-                        service_response.sortout_service_results()
-                if not service_response.is_ok():
-                    logging.info(f"Service {service} failed on {site_to_process}, skipping it on another site...")
-                    break
+                steps.append(ServiceStep(site_to_process, mode, force, allow_failure, 'move' not in cmd, site,
+                                         get_resumed_status(site_to_process, mode, force, allow_failure)))
     else:
         logging.error(f"Invalid command '{cmd}' for service '{service}'. No processing performed.")
+    return steps
+
+
+def make_request_failed_status(service, step: ServiceStep, data, status_code, sm_dict) -> ServiceDRStatus:
+    """ Makes ServiceDRStatus for the service, if procedure request for step failed """
+    logging.error(f"Failed changing status for service {service}, returned status code {status_code}")
+    if not data:
+        data = {'services':{service:{"message": "Service didn't reply"}}}
+    return ServiceDRStatus(data, sm_dict, step.result_site or step.site, step.mode, step.force, step.allow_failure)
+
+
+@contextlib.contextmanager
+def track_service_step(service, step: ServiceStep) -> Iterator[dict]:
+    """ Records the site operation of the service as trace span and in metrics. The block sets ServiceDRStatus result
+    of the operation to "response" of yielded dict
+    """
+    result: dict = {}
+    with trace.lane(service), \
+            settings.current().tracer.span(f"{service} {step.mode} on {step.site}", "service", site=step.site) as span:
+        start_time = settings.current().clock.monotonic()
+        yield result
+        span["ok"] = result["response"].is_ok()
+        settings.current().metrics.observe_service(service, step.site, step.mode,
+                                                   settings.current().clock.monotonic() - start_time, span["ok"])
+
+
+def finish_service_step(service, step: ServiceStep, service_response: ServiceDRStatus, started: bool) \
+        -> ServiceDRStatus:
+    """ Records result of the site operation of the service in journal and in services results
+    @param started: True, if site-manager accepted procedure request
+    """
+    settings.current().journal.record_step(service, step.site, step.mode, service_response.service_status,
+                                           service_response.status)
+    if started and service_response.service not in settings.current().skipped_due_deps_services:
+        service_response.sortout_service_results()
+    return service_response
+
+
+def sm_process_service_step(service, step: ServiceStep, sm_dict) -> ServiceDRStatus:
+    """ Performs one site operation of the service and polls its status until the end """
+    if step.skip_response:
+        return step.skip_response
+    with settings.current().service_scheduler.site_slot(step.site, service), track_service_step(service, step) as result:
+        data, ok, status_code = sm_process_service(step.site, service, step.mode, step.no_wait)
+        result["response"] = make_request_failed_status(service, step, data, status_code, sm_dict) if not ok else \
+            sm_poll_service_required_status(step.site, service, step.mode, sm_dict, step.force, step.allow_failure)
+    return finish_service_step(service, step, result["response"], ok)
+
+
+async def sm_process_service_step_async(service, step: ServiceStep, sm_dict) -> ServiceDRStatus:
+    """ Asyncio version of sm_process_service_step """
+    if step.skip_response:
+        return step.skip_response
+    async with settings.current().service_scheduler.async_site_slot(step.site, service):
+        with track_service_step(service, step) as result:
+            data, ok, status_code = await asyncio.to_thread(sm_process_service, step.site, service, step.mode,
+                                                            step.no_wait)
+            result["response"] = make_request_failed_status(service, step, data, status_code, sm_dict) if not ok \
+                else await sm_poll_service_required_status_async(step.site, service, step.mode, sm_dict, step.force,
+                                                                 step.allow_failure)
+    return finish_service_step(service, step, result["response"], ok)
 
-    thread_result_queue.put(service_response)
+
+class ServiceSteps:
+    """ Site operations of the service, that are performed one by one: the rest of operations of DR procedure is
+    skipped, if the service failed on the site. Engine sets result of every performed operation to response
+    """
+
+    def __init__(self, service, site, cmd, sm_dict, is_failover=False):
+        self.service = service
+        self.cmd = cmd
+        self.steps = get_service_steps(service, site, cmd, sm_dict, is_failover)
+        self.response = ServiceDRStatus({'services': {service: {}}})
+
+    def __iter__(self) -> Iterator[ServiceStep]:
+        for step in self.steps:
+            yield step
+            if self.cmd in settings.dr_procedures and not self.response.is_ok():
+                logging.info(f"Service {self.service} failed on {step.site}, skipping it on another site...")
+                return
+
+
+def sm_process_service_with_polling(service, site, cmd, sm_dict, is_failover=False) -> None:
+    """ Processes the service with specific site cmd with polling """
+    logging.info(f"Processing {service} in thread start...")
+    service_steps = ServiceSteps(service, site, cmd, sm_dict, is_failover)
+    for step in service_steps:
+        service_steps.response = sm_process_service_step(service, step, sm_dict)
+
+    settings.current().thread_result_queue.put(service_steps.response)
 
     logging.info(f"Processing {service} in thread finished")
 
 
-def sm_poll_service_required_status(site, service, mode, sm_dict, force: bool = settings.force, allow_failure=False) -> ServiceDRStatus:
-    """ Polls service status command till desired mode is reached
-        @param force: True/False --force mode to ignore healthz
+async def sm_process_service_with_polling_async(service, site, cmd, sm_dict, is_failover=False) -> ServiceDRStatus:
+    """ Processes the service with specific site cmd with polling as coroutine, returns ServiceDRStatus"""
+    logging.info(f"Processing {service} in task start...")
+    service_steps = ServiceSteps(service, site, cmd, sm_dict, is_failover)
+    for step in service_steps:
+        service_steps.response = await sm_process_service_step_async(service, step, sm_dict)
+
+    logging.info(f"Processing {service} in task finished")
+    return service_steps.response
+
+
+class ServicePipeline:
+    """ Services graph, that is expanded to the graph of services steps (site operations) for pipeline processing of
+    DR procedure. Step of the service depends on the previous step of the same service and on the step of each
+    predecessor service on the same site (or on the last step of predecessor, if it isn't processed on this site),
+    so the service can be switched on one site, while its predecessors are still processed on another one
     """
 
-    def service_status_polling(site, service, expected_state: dict, error_states: list, delay=5) -> Dict:
-        """  Polls "site-manager status" <service> command till <expected_state> dict or
-        error_state dict returns during <timeout> period with <delay>
-        @param expected_state:  expected dict state from site-manager service status command. {"status": ["up"]}
-        @param error_states:  error states in case return immediately. [{"status": ["failed"]}]
+    def __init__(self, graph, site, cmd, sm_dict, is_failover=False):
+        """
+        @param graph: ServiceGraph or TopologicalSorter2 with services dependencies
+        @param site: site of DR procedure
+        @param cmd: DR procedure
         """
-        timeout = sm_dict[site]["services"][service]["timeout"] if sm_dict[site]["services"].get(service, {}) \
-                                                                       .get("timeout", None) is not None else \
-            settings.SERVICE_DEFAULT_TIMEOUT
-
-        init_time = int(time.time())
-        count = 0
-        data: dict = {'services': {service: {}}}
-        while int(time.time()) <= init_time + int(timeout):
-            count += 1
-
-            logging.info(f"Service: {service}. Site: {site}. Polling procedure {expected_state} Iteration {count}")
-            logging.info(
-                f"Service: {service}. Site: {site}. {int(timeout) - (int(time.time()) - init_time)} seconds left until timeout")
-
-            data, ret, _ = sm_process_service(site, service, "status")
-            data = {'services': {service: {}}} if not data else data
-
-            logging.info(f"Service: {service}. Site: {site}. Received data: {data}. Return code: {ret}")
-
-            def check_state():
-                for error_state in error_states:
-                    if all(data["services"][service][key] in val for key, val in expected_state.items()):
-                        logging.info(f"Service: {service}. Site: {site}. Expected state {expected_state} occurred.")
-                        return True
-                    if all(data["services"][service][key] in val for key, val in error_state.items()):
-                        logging.info(f"Service: {service}. Site: {site}. Error state {error_state} occurred.")
-                        return True
-                return False
-
-            if ret and check_state():
-                return data
-            time.sleep(delay)
+        self.graph = as_service_graph(graph)
+        self.cmd = cmd
+        self.sm_dict = sm_dict
+        # service without steps is processed as one empty step to get the same result as in usual processing
+        self.steps = {service: get_service_steps(service, site, cmd, sm_dict, is_failover) or [None]
+                      for service in self.graph.nodes}
+        nodes = [(service, index) for service in self.graph.nodes for index in range(len(self.steps[service]))]
+        node_ids = {node: node_id for node_id, node in enumerate(nodes)}
+        adjacency: list = [[] for _ in nodes]
+        for service, steps in self.steps.items():
+            for index in range(1, len(steps)):
+                adjacency[node_ids[(service, index - 1)]].append(node_ids[(service, index)])
+            for successor in self.graph.successors(service):
+                for index, step in enumerate(self.steps[successor]):
+                    adjacency[node_ids[(service, self._get_site_step_index(service, step))]] \
+                        .append(node_ids[(successor, index)])
+        self.step_graph = ServiceGraph(nodes, adjacency)
+        self._cursor = self.step_graph.cursor()
+        self._failed: set = set()  # failed services and services, that are skipped due to dependencies
+        self._finished: set = set()
 
+    def _get_site_step_index(self, service, step: Optional[ServiceStep]) -> int:
+        """ Returns index of the service step on the same site as given step or index of the last service step """
+        steps = self.steps[service]
+        if step is not None:
+            for index, service_step in enumerate(steps):
+                if service_step is not None and service_step.site == step.site:
+                    return index
+        return len(steps) - 1
+
+    def get_durations(self) -> dict:
+        """ Returns expected durations of steps from history, polling timeout is used for steps without history """
+        return {(service, index): 0 if step is None or step.skip_response else
+                history.get_expected_duration(service, step.mode) or
+                get_polling_timeout(step.site, service, self.sm_dict)
+                for service, index, step in ((node[0], node[1], self.steps[node[0]][node[1]])
+                                             for node in self.step_graph.nodes)}
+
+    def is_active(self) -> bool:
+        """ Returns True, if there are steps, that are not processed yet """
+        return self._cursor.is_active()
+
+    def get_ready(self) -> list:
+        """ Returns steps [(service, index, step)], that are ready to be processed.
+        Steps of failed services and services, that are skipped due to dependencies, are marked as done.
+        Empty steps of services without operations are done with empty result
+        """
+        ready: list = []
+        while self._cursor.is_active():
+            nodes = self._cursor.get_ready()
+            skipped = [node for node in nodes if node[0] in self._failed]
+            empty = [node for node in nodes if node[0] not in self._failed and self.steps[node[0]][node[1]] is None]
+            ready.extend((service, index, self.steps[service][index]) for service, index in nodes
+                         if service not in self._failed and self.steps[service][index] is not None)
+            if not skipped and not empty:
+                break
+            self._cursor.done(*skipped)
+            for service, index in empty:
+                self.done(service, index, ServiceDRStatus({'services': {service: {}}}))
+        return ready
+
+    def get_ready_by_priority(self, priorities: dict = None) -> list:
+        """ Returns ready steps sorted by priority, steps with equal priority keep dependency order """
+        ready = self.get_ready()
+        return sorted(ready, key=lambda step: priorities.get(step[:2], 0)) if priorities else ready
+
+    def done(self, service, index, service_response: ServiceDRStatus) -> list:
+        """ Marks step of the service as processed
+        @return: list of ServiceDRStatus results for services, that are finished after this step
+        """
+        self._cursor.done((service, index))
+        if service in self._finished:  # the rest of service steps is skipped due to dependencies
+            return []
+        if service_response.is_ok() and index < len(self.steps[service]) - 1:
+            return []
+        self._finished.add(service)
+        if service_response.service not in settings.current().skipped_due_deps_services:
+            service_response.sortout_service_results()
+        results = [service_response]
+        if not service_response.is_ok():
+            if index < len(self.steps[service]) - 1:
+                logging.info(f"Service {service} failed on {self.steps[service][index].site}, "
+                             f"skipping it on another site...")
+            self._failed.add(service)
+            for successor in self.graph.transitive_successors(service):
+                if successor not in self._failed and successor not in self._finished:
+                    logging.info(f"Service {successor} marked as failed due to dependencies")
+                    skip_service_due_deps(successor)
+                    self._failed.add(successor)
+                    self._finished.add(successor)
+                    results.append(ServiceDRStatus({'services': {successor: {}}}))
+        return results
+
+
+def handle_finished_steps(pipeline: ServicePipeline, running: dict, finished) -> None:
+    """ Passes results of finished steps to pipeline in start order
+    @param running: futures or asyncio tasks of running steps {future: (service, index)}
+    @param finished: finished futures or tasks
+    """
+    for future in [future for future in running if future in finished]:
+        service, index = running.pop(future)
+        pipeline.done(service, index, future.result())
+
+
+def process_pipeline_services(pipeline: ServicePipeline, priorities: dict = None) -> None:
+    """ Runs steps of services from pipeline, each step is started as soon as steps, that it depends on, are done
+    @param pipeline: ServicePipeline with services steps
+    @param priorities: scheduler priorities of steps {(service, index): priority}, lower value is started first
+    """
+    priorities = priorities or {}
+    running: Dict[Future, tuple] = {}
+    while True:
+        for service, index, step in pipeline.get_ready_by_priority(priorities):
+            future = settings.current().service_scheduler.submit(sm_process_service_step, service, step,
+                                                                 pipeline.sm_dict, name=service,
+                                                                 priority=priorities.get((service, index), 0))
+            running[future] = (service, index)
+        if not running:
+            break
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        handle_finished_steps(pipeline, running, done)
+    settings.current().service_scheduler.report()
+
+
+def process_pipeline_services_async(pipeline: ServicePipeline, priorities: dict = None) -> None:
+    """ Asyncio engine for process_pipeline_services """
+    run_async_engine(_process_pipeline_services_async(pipeline, priorities or {}))
+
+
+async def _process_pipeline_services_async(pipeline: ServicePipeline, priorities: dict) -> None:
+    """ Event loop part of process_pipeline_services_async """
+    workers = AsyncWorkers()
+    running: Dict[asyncio.Task, tuple] = {}
+    while True:
+        for service, index, step in pipeline.get_ready_by_priority(priorities):
+            running[asyncio.create_task(workers.run(service, priorities.get((service, index), 0),
+                                                    sm_process_service_step_async(service, step, pipeline.sm_dict)),
+                                        name=f"Task: {service}")] = (service, index)
+        settings.current().service_scheduler.record_tasks(len(running))
+        if not running:
+            break
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        handle_finished_steps(pipeline, running, done)
+
+
+def get_polling_states(site, service, mode, sm_dict) -> Tuple[dict, list]:
+    """ Returns expected state and error states for polling the service in required mode """
+    if mode == "standby":
+        return {"status": ["done"], "mode": [mode], "healthz":
+                    sm_dict[site]["services"][service]["allowedStandbyStateList"]}, \
+               [{'status': ['done'], 'healthz': ['down', 'degraded']},
+                {'status': ['failed']}]
+    # active and rest commands
+    return {"status": ["done"], "mode": [mode], "healthz": ["up"]}, \
+           [{'status': ['done'], 'healthz': ['down', 'degraded']},
+            {'status': ['failed']}]
+
+
+def get_polling_timeout(site, service, sm_dict) -> int:
+    """ Returns polling timeout for the service: specific for the service or default one """
+    timeout = sm_dict[site]["services"][service]["timeout"] if sm_dict[site]["services"].get(service, {}) \
+                                                                   .get("timeout", None) is not None else \
+        settings.current().SERVICE_DEFAULT_TIMEOUT
+    return int(timeout)
+
+
+def check_polling_state(site, service, data, expected_state: dict, error_states: list) -> bool:
+    """ Checks if polled service data reached <expected_state> dict or one of <error_states>
+    @param expected_state:  expected dict state from site-manager service status command. {"status": ["up"]}
+    @param error_states:  error states in case return immediately. [{"status": ["failed"]}]
+    """
+    for error_state in error_states:
+        if all(data["services"][service][key] in val for key, val in expected_state.items()):
+            logging.info(f"Service: {service}. Site: {site}. Expected state {expected_state} occurred.")
+            return True
+        if all(data["services"][service][key] in val for key, val in error_state.items()):
+            logging.info(f"Service: {service}. Site: {site}. Error state {error_state} occurred.")
+            return True
+    return False
+
+
+def make_polling_result(site, service, mode, sm_dict, data, force, allow_failure, timeout_expired) \
+        -> ServiceDRStatus:
+    """ Makes ServiceDRStatus for polled service data """
+    if timeout_expired:
         logging.info(f"Service: {service}. Site: {site}. Timeout expired.")
         # healthz = "--" is needed to understand, that status is not ok
         if 'services' in data and service in data['services']:
             data['services'][service]['healthz'] = "--"
-        return data
-
-    if mode == "standby":
-        data = service_status_polling(site, service,
-                                      {"status": ["done"], "mode": [mode], "healthz":
-                                          sm_dict[site]["services"][service]["allowedStandbyStateList"]},
-                                      [{'status': ['done'], 'healthz': ['down', 'degraded']},
-                                       {'status': ['failed']}])
-    else:  # active and rest commands
-        data = service_status_polling(site, service,
-                                      {"status": ["done"], "mode": [mode], "healthz": ["up"]},
-                                      [{'status': ['done'], 'healthz': ['down', 'degraded']},
-                                       {'status': ['failed']}])
 
     if force:
         logging.warning(f"Service: {service}. Force mode enabled. Service healthz ignored")
@@ -265,17 +1019,293 @@ def sm_poll_service_required_status(site, service, mode, sm_dict, force: bool =
     return ServiceDRStatus(data, sm_dict, site, mode, force, allow_failure)
 
 
+def get_polling_delays(site, service, mode, sm_dict) -> Iterator[float]:
+    """ Yields delays between polling iterations: exponential backoff with jitter from initial delay up to max delay.
+    Delays can be specified for the service in CR, otherwise values from sm-client configuration are used.
+    If expected duration of the procedure is known from previous runs, the first delay is close to it
+    """
+    service_conf = sm_dict[site]["services"].get(service, {})
+    delay = service_conf.get("pollingInitialDelay") or settings.current().POLLING_INITIAL_DELAY
+    max_delay = max(service_conf.get("pollingMaxDelay") or settings.current().POLLING_MAX_DELAY, delay)
+
+    expected_duration = history.get_expected_duration(service, mode)
+    if expected_duration and expected_duration > delay:
+        yield expected_duration * random.uniform(0.8, 0.9)
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * settings.current().POLLING_BACKOFF, max_delay)
+
+
+def is_long_poll_supported(site, sm_dict) -> bool:
+    """ Checks, if long-poll status requests are enabled and supported by site-manager on the site """
+    return bool(settings.current().LONG_POLL_TIMEOUT) and "long-poll" in (sm_dict[site].get("features") or [])
+
+
+def is_site_unreachable(site) -> bool:
+    """ Checks, if site-manager on the site is considered unreachable by circuit breaker """
+    return settings.current().circuit_breaker.is_open(settings.current().sm_conf[site]["url"])
+
+
+def get_polling_status(site, service, mode, seconds_left, long_poll) -> Tuple[Dict, bool, bool]:
+    """ Gets service status for polling iteration. In long-poll mode site-manager answers, when service procedure
+    is finished or wait timeout expired. If site-manager ignored long-poll request, polling falls back to usual status
+    requests
+    @returns: data, True/False in case of success, True/False if long-poll should be used for next iterations
+    """
+    if long_poll:
+        data, ret, _ = sm_wait_service_status(site, service, mode,
+                                              max(min(settings.current().LONG_POLL_TIMEOUT, math.ceil(seconds_left)), 1))
+        if ret and not data.get("long-poll"):
+            logging.debug(f"Site-manager on site {site} doesn't support long-poll, usual polling is used")
+            long_poll = False
+    else:
+        settings.current().status_cache.invalidate(site, service)  # polling waits for status change, so actual status is requested
+        data, ret, _ = sm_process_service(site, service, "status")
+    return {'services': {service: {}}} if not data else data, ret, long_poll
+
+
+def is_procedure_finished(service, mode, data) -> bool:
+    """ Checks, if service procedure is done in required mode or failed. Site-manager answers long-poll request
+    without waiting in this case, even if service healthz isn't expected yet
+    """
+    service_data = data.get("services", {}).get(service)
+    if not isinstance(service_data, dict):
+        return False
+    return service_data.get("status") == "failed" or \
+        (service_data.get("status") == "done" and service_data.get("mode") == mode)
+
+
+def log_polling_iteration(site, service, expected_state, count, seconds_left):
+    """ Logs the start of polling iteration """
+    logging.info(f"Service: {service}. Site: {site}. Polling procedure {expected_state} Iteration {count}. "
+                 f"{math.ceil(seconds_left)} seconds left until timeout")
+
+
+class ServicePolling:
+    """ Polling state of the service, that is shared by engines: engine requests the service status with
+    request_status (blocking http call), passes it to handle_status and sleeps for returned delay till result is ready
+    @param force: True/False --force mode to ignore healthz
+    """
+
+    def __init__(self, site, service, mode, sm_dict, force: bool = False, allow_failure=False):
+        self.site = site
+        self.service = service
+        self.mode = mode
+        self.sm_dict = sm_dict
+        self.force = force
+        self.allow_failure = allow_failure
+        self.expected_state, self.error_states = get_polling_states(site, service, mode, sm_dict)
+        self.timeout = get_polling_timeout(site, service, sm_dict)
+        self.delays = get_polling_delays(site, service, mode, sm_dict)
+        self.long_poll = is_long_poll_supported(site, sm_dict)
+        self.init_time = settings.current().clock.monotonic()
+        self.count = 0
+
+    def get_seconds_left(self) -> float:
+        """ Returns the time in seconds till polling timeout """
+        return self.timeout - (settings.current().clock.monotonic() - self.init_time)
+
+    def request_status(self) -> Tuple[Dict, bool]:
+        """ Performs polling iteration: requests the service status from site-manager
+        @returns: data, True/False in case of success
+        """
+        self.count += 1
+        seconds_left = self.get_seconds_left()
+        log_polling_iteration(self.site, self.service, self.expected_state, self.count, seconds_left)
+
+        settings.current().metrics.inc_polls(self.service, self.site, self.mode)
+        with settings.current().tracer.span(f"poll {self.count}", "poll", site=self.site, service=self.service) as span:
+            data, ret, self.long_poll = get_polling_status(self.site, self.service, self.mode, seconds_left,
+                                                           self.long_poll)
+            span["long_poll"] = self.long_poll
+
+        logging.info(f"Service: {self.service}. Site: {self.site}. Received data: {data}. Return code: {ret}")
+        return data, ret
+
+    def handle_status(self, data, ret) -> Tuple[Optional[ServiceDRStatus], float]:
+        """ Checks polled service status
+        @returns: ServiceDRStatus result, if polling is finished, otherwise None and delay in seconds before next
+         iteration
+        """
+        if ret and check_polling_state(self.site, self.service, data, self.expected_state, self.error_states):
+            result = self.make_result(data, False)
+            if result.is_ok():
+                history.record_duration(self.service, self.mode, settings.current().clock.monotonic() - self.init_time)
+            return result, 0
+        if not ret and self.allow_failure and is_site_unreachable(self.site):
+            logging.warning(f"Service: {self.service}. Site: {self.site}. Site is unreachable, polling is stopped")
+            return self.make_result(data, False), 0
+        seconds_left = self.get_seconds_left()
+        if seconds_left <= 0:
+            return self.make_result(data, True), 0
+        if self.long_poll and ret and not is_procedure_finished(self.service, self.mode, data):
+            return None, 0  # site-manager has already waited in long-poll request
+        return None, min(next(self.delays), seconds_left)
+
+    def make_result(self, data, timeout_expired) -> ServiceDRStatus:
+        """ Makes ServiceDRStatus for polled service data """
+        return make_polling_result(self.site, self.service, self.mode, self.sm_dict, data, self.force,
+                                   self.allow_failure, timeout_expired)
+
+
+def sm_poll_service_required_status(site, service, mode, sm_dict, force: bool = False, allow_failure=False) -> ServiceDRStatus:
+    """ Polls service status command till desired mode is reached
+        @param force: True/False --force mode to ignore healthz
+    """
+    polling = ServicePolling(site, service, mode, sm_dict, force, allow_failure)
+    while True:
+        result, delay = polling.handle_status(*polling.request_status())
+        if result is not None:
+            return result
+        if delay:
+            settings.current().clock.sleep(delay)
+
+
+async def sm_poll_service_required_status_async(site, service, mode, sm_dict, force: bool = False,
+                                                allow_failure=False) -> ServiceDRStatus:
+    """ Polls service status command till desired mode is reached as coroutine, event loop is not blocked
+    between polling iterations
+        @param force: True/False --force mode to ignore healthz
+    """
+    polling = ServicePolling(site, service, mode, sm_dict, force, allow_failure)
+    while True:
+        result, delay = polling.handle_status(*await asyncio.to_thread(polling.request_status))
+        if result is not None:
+            return result
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class StatusCache:
+    """ Short-lived cache of services statuses {(site, service): response}, that is shared by validation, status
+    procedure and polling. Only finished statuses (done or failed) are kept, because they are changed by procedure
+    requests only, that invalidate the service. Entries expire after ttl seconds of the run clock, the least recently
+    used entries are evicted, when cache is full
+    @param ttl: the time in seconds, that status is kept, 0 disables cache
+    @param maxsize: the maximum number of kept statuses
+    """
+    FINISHED_STATUSES = ("done", "failed")
+
+    def __init__(self, ttl=0, maxsize=1000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()  # (site, service) -> (expiration time, response)
+        self._lock = threading.Lock()
+
+    def get(self, site, service) -> Optional[dict]:
+        """ Returns copy of cached status response or None """
+        if not self.ttl:
+            return None
+        with self._lock:
+            expiration_time, response = self._data.get((site, service), (0, None))
+            if response is None or expiration_time <= settings.current().clock.monotonic():
+                self._data.pop((site, service), None)
+                self.misses += 1
+                return None
+            self._data.move_to_end((site, service))
+            self.hits += 1
+            return copy.deepcopy(response)
+
+    def put(self, site, service, response: dict):
+        """ Caches status response of the service, if service procedure is finished """
+        service_status = (response or {}).get("services", {}).get(service)
+        if not self.ttl or not isinstance(service_status, dict) or \
+                service_status.get("status") not in self.FINISHED_STATUSES:
+            return
+        with self._lock:
+            self._data[(site, service)] = (settings.current().clock.monotonic() + self.ttl,
+                                           {"services": {service: copy.deepcopy(service_status)}})
+            self._data.move_to_end((site, service))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, site, service):
+        """ Drops cached status of the service on the site """
+        with self._lock:
+            self._data.pop((site, service), None)
+
+    def report(self):
+        """ Logs cache statistic """
+        if self.ttl:
+            logging.debug(f"Status cache statistic: hits: {self.hits}, misses: {self.misses}, "
+                          f"kept statuses: {len(self._data)}")
+
+
+def init_status_cache(ttl=0, maxsize=1000):
+    """ Creates new empty status cache of current run
+    @param ttl: the time in seconds, that status is kept, 0 disables cache
+    @param maxsize: the maximum number of kept statuses
+    """
+    settings.current().status_cache = StatusCache(ttl, maxsize)
+
+
+def sm_wait_service_status(site, service, mode, wait_timeout: int) -> Tuple[Dict, bool, int]:
+    """ Gets the service status with long-poll request: site-manager answers, when service is done in required mode
+    or failed, or wait timeout expired
+    """
+    body = {"procedure": "status", "run-service": service, "wait-timeout": wait_timeout, "wait-mode": mode}
+    response, return_code = sm_request(site, body)
+    if return_code == HTTPStatus.OK:
+        settings.current().status_cache.put(site, service, response)
+    return response, return_code == HTTPStatus.OK, return_code
+
+
+def sm_request(site, body: dict) -> Tuple[Dict, int]:
+    """ Sends request to site-manager on site, request is recorded as http span of procedure trace and in metrics
+    @returns: response and HTTP return code
+    """
+    endpoint = "list" if not body else "wait" if "wait-timeout" in body else body["procedure"]
+    stats: dict = {}
+    start_time = settings.current().clock.monotonic()
+    with settings.current().tracer.span(f"{body.get('procedure', 'site-manager status')} on {site}", "http",
+                              site=site, service=body.get("run-service")) as span:
+        _, response, return_code = settings.current().transport(settings.current().sm_conf[site]["url"],
+                                                      settings.current().sm_conf[site]["token"],
+                                                      settings.current().sm_conf[site]["cacert"],
+                                                      body,
+                                                      use_auth=settings.current().FRONT_HTTP_AUTH,
+                                                      stats=stats)
+        span["return_code"] = return_code
+    settings.current().metrics.observe_http(site, endpoint, settings.current().clock.monotonic() - start_time,
+                                            stats.get("retries", 0))
+    return response, return_code
+
+
+def sm_process_services_status(site, services: list) -> Tuple[Dict, bool, int]:
+    """ Gets statuses for the list of services with one request to site-manager, cached statuses are not requested """
+    cached = {service: settings.current().status_cache.get(site, service) for service in services}
+    cached = {service: response["services"][service] for service, response in cached.items() if response}
+    services_to_request = [service for service in services if service not in cached]
+    if not services_to_request:
+        return {"services": cached}, True, HTTPStatus.OK
+
+    response, return_code = sm_request(site, {"procedure": "status", "run-service": services_to_request})
+    if return_code == HTTPStatus.OK and isinstance(response.get("services"), dict):
+        for service in services_to_request:
+            settings.current().status_cache.put(site, service, {"services": {service: response["services"].get(service)}})
+        response["services"].update(cached)
+    return response, return_code == HTTPStatus.OK, return_code
+
+
 def sm_process_service(site, service, site_cmd: str, no_wait=True, force=False) -> Tuple[Dict, bool, int]:
-    """ Processes the service with specific site cmd """
+    """ Processes the service with specific site cmd.
+    Finished statuses are taken from status_cache, procedure requests invalidate cached status of the service
+    """
     if site_cmd in ["status", "list"]:  # RO operations
         body = {} if service == "site-manager" else {"procedure": "status", "run-service": service}
+        cached_response = settings.current().status_cache.get(site, service) if body else None
+        if cached_response:
+            return cached_response, True, HTTPStatus.OK
     else:
-        body = {"procedure": settings.sm_conf.convert_sitecmd_to_dr_mode(site_cmd), "run-service": service,
+        body = {"procedure": settings.current().sm_conf.convert_sitecmd_to_dr_mode(site_cmd), "run-service": service,
                 "no-wait": no_wait, "force": force}
+        settings.current().status_cache.invalidate(site, service)
 
-    _, response, return_code = utils.io_make_http_json_request(settings.sm_conf[site]["url"],
-                                                               settings.sm_conf[site]["token"],
-                                                               settings.sm_conf[site]["cacert"],
-                                                               body,
-                                                               use_auth=settings.FRONT_HTTP_AUTH)
+    response, return_code = sm_request(site, body)
+    if body.get("procedure") == "status" and return_code == HTTPStatus.OK:
+        settings.current().status_cache.put(site, service, response)
+    elif body:
+        settings.current().status_cache.invalidate(site, service)  # status could be cached by parallel request during procedure request
     return response, return_code == HTTPStatus.OK, return_code
@@ -0,0 +1,311 @@
+"""Clock and transport of sm-client run and their simulated versions.
+Polling and engines get time from the clock of the run and send requests to site-managers with the transport of the run
+(see settings.RunContext).
+In simulation mode (see api.DRSession.simulate) they are replaced with VirtualClock, that moves time forward, when
+event loop has nothing to do, and SimulatedTransport, that emulates site-managers with recorded or synthetic durations
+of services procedures, so DR procedure for thousands of services is simulated in seconds
+"""
+import asyncio
+import logging
+import os
+import random
+import selectors
+import threading
+import time
+from typing import NamedTuple, Optional, Tuple, Dict
+
+import yaml
+
+from sm_client import history, utils
+from sm_client.data import settings
+
+SIMULATION_DEFAULT_DURATION = 30  # duration in seconds of services procedures, that are not defined in model and history
+SIMULATION_DEFAULT_TIMEOUT = 600  # polling timeout in seconds of synthetic services
+
+
+class Clock:
+    """ Real time clock """
+    virtual = False
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def run(self, coro):
+        """ Runs coroutine in new event loop """
+        return asyncio.run(coro)
+
+
+class VirtualClock(Clock):
+    """
+    Virtual time clock, that starts from 0. Time is moved forward by sleep and by event loop of run, when all
+    coroutines wait for timers. Blocking calls in executor threads take no virtual time
+    """
+    virtual = True
+
+    def __init__(self):
+        self.now = 0.0
+        self._lock = threading.Lock()
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        """ Moves time forward """
+        with self._lock:
+            self.now += max(seconds, 0)
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def run(self, coro):
+        """ Runs coroutine in new event loop with virtual time """
+        loop = VirtualTimeLoop(self)
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            try:
+                loop.run_until_complete(loop.shutdown_default_executor())
+            finally:
+                loop.close()
+
+
+class _VirtualTimeSelector(selectors.BaseSelector):
+    """ Selector, that doesn't wait for timers: if there are no ready events and executor jobs, virtual time is moved
+    to the nearest timer
+    """
+
+    def __init__(self, loop: "VirtualTimeLoop"):
+        self._selector = selectors.DefaultSelector()
+        self._loop = loop
+
+    def register(self, fileobj, events, data=None) -> selectors.SelectorKey:
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj) -> selectors.SelectorKey:
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None) -> selectors.SelectorKey:
+        return self._selector.modify(fileobj, events, data)
+
+    def select(self, timeout=None):
+        if timeout == 0 or self._loop.executor_jobs:
+            return self._selector.select(timeout)
+        events = self._selector.select(0)
+        if events or timeout is None:
+            return events or self._selector.select(None)
+        self._loop.clock.advance(timeout)
+        return []
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """ Event loop, that uses VirtualClock time for timers (asyncio.sleep, wait_for) """
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.executor_jobs = 0
+        super().__init__(_VirtualTimeSelector(self))
+
+    def time(self) -> float:
+        return self.clock.monotonic()
+
+    def run_in_executor(self, executor, func, *args):
+        self.executor_jobs += 1
+        future = super().run_in_executor(executor, func, *args)
+        future.add_done_callback(self._executor_job_done)
+        return future
+
+    def _executor_job_done(self, _):
+        self.executor_jobs -= 1
+
+
+class HTTPTransport:
+    """ Sends requests to site-managers over HTTP with request timeouts of the run, has the same parameters as
+    utils.io_make_http_json_request
+    """
+
+    def __call__(self, url, token, verify, http_body: dict = None, use_auth=True,
+                 stats: dict = None) -> Tuple[bool, Dict, int]:
+        timeout = settings.current().POST_REQUEST_TIMEOUT if http_body else settings.current().GET_REQUEST_TIMEOUT
+        return utils.io_make_http_json_request(url, token, verify, http_body, use_auth=use_auth, stats=stats,
+                                               timeout=timeout, sessions=settings.current().http_sessions,
+                                               breaker=settings.current().circuit_breaker)
+
+
+class SimulationModel(NamedTuple):
+    """ Services and durations of their procedures for simulation """
+    services: Optional[dict] = None   # services dictionary in site-manager format, it's requested from sites, if None
+    durations: Optional[dict] = None  # {service: {mode: seconds}}, history of previous runs is used for missed ones
+    default_duration: float = SIMULATION_DEFAULT_DURATION
+    failure_rate: float = 0.0         # the probability, that service procedure fails
+    modes: Optional[dict] = None      # initial modes of services {site: mode}, by default they are valid for procedure
+    seed: int = 0
+
+
+def make_synthetic_services(count: int, seed=0, module="stateful", timeout=SIMULATION_DEFAULT_TIMEOUT) -> dict:
+    """ Makes services dictionary in site-manager format: services are split to 10 layers, every service depends on
+    1-3 random services from previous layer
+    """
+    rnd = random.Random(seed)
+    layer_size = max(count // 10, 1)
+    services = {}
+    for i in range(count):
+        after: list = []
+        if i >= layer_size:
+            layer_start = (i // layer_size - 1) * layer_size
+            after = sorted({f"serv{rnd.randrange(layer_start, layer_start + layer_size)}"
+                            for _ in range(rnd.randint(1, 3))})
+        services[f"serv{i}"] = {"name": f"serv{i}", "module": module, "after": after, "before": [],
+                                "sequence": ["standby", "active"], "allowedStandbyStateList": ["up"],
+                                "timeout": timeout}
+    return services
+
+
+def load_model(path: Optional[str] = None, services_number=0) -> Optional[SimulationModel]:
+    """ Loads simulation model from YAML or JSON file
+    @param path: the path to model file with services, durations, default_duration, failure_rate, modes and seed
+     keys, all of them are optional
+    @param services_number: the number of synthetic services, that are used, if model doesn't define services
+    @returns: SimulationModel or None, if model is not valid
+    """
+    model: dict = {}
+    if path:
+        try:
+            with open(os.path.expanduser(path)) as file:
+                model = yaml.safe_load(file) or {}
+        except (OSError, yaml.YAMLError) as e:
+            logging.fatal(f"Can't load simulation model from {path}: {e}")
+            return None
+        if not isinstance(model, dict) or set(model) - set(SimulationModel._fields):
+            logging.fatal(f"Check simulation model {path}. Supported keys: {list(SimulationModel._fields)}")
+            return None
+    if not model.get("services") and services_number:
+        model["services"] = make_synthetic_services(services_number, model.get("seed", 0))
+    try:
+        return SimulationModel(services=model.get("services"), durations=model.get("durations"),
+                               default_duration=float(model.get("default_duration", SIMULATION_DEFAULT_DURATION)),
+                               failure_rate=float(model.get("failure_rate", 0)), modes=model.get("modes"),
+                               seed=int(model.get("seed", 0)))
+    except (TypeError, ValueError) as e:
+        logging.fatal(f"Check simulation model {path}: {e}")
+        return None
+
+
+def get_initial_modes(cmd, site, sites: list) -> dict:
+    """ Returns modes of services on sites {site: mode}, from which procedure cmd for site can be started """
+    opposite = "standby" if cmd in ("stop", "standby") else "active"
+    initial = {"move": "standby", "stop": "active", "return": "disable", "disable": "standby", "active": "standby",
+               "standby": "active"}.get(cmd, "standby")
+    return {site_name: initial if site_name == site else opposite for site_name in sites}
+
+
+class SimulatedTransport(HTTPTransport):
+    """
+    Emulates site-managers of all configured sites: services procedures are finished after duration from simulation
+    model or history in virtual time. Services dictionary is taken from model or requested from site-managers
+    (read-only request). Operations timeline is collected for the report
+    @param SimulationModel model: simulation model
+    @param str cmd: simulated procedure, it's used to define initial modes of services
+    @param str site: the site of simulated procedure
+    """
+
+    def __init__(self, model: SimulationModel, cmd, site):
+        self.model = model
+        self.cmd = cmd
+        self.site = site
+        self.requests = 0
+        self.operations: list = []  # [{"service", "site", "mode", "start", "done", "observed"}]
+        self._random = random.Random(model.seed)
+        self._services: Dict[str, dict] = {}  # {site: services dictionary}
+        self._states: Dict[tuple, dict] = {}  # {(site, service): state}
+        self._lock = threading.Lock()
+
+    def __call__(self, url, token, verify, http_body: dict = None, use_auth=True,
+                 stats: dict = None) -> Tuple[bool, Dict, int]:
+        site = next((name for name, conf in settings.current().sm_conf.items() if conf["url"] == url), None)
+        with self._lock:
+            self.requests += 1
+        if site is None:
+            return False, {}, False
+        if not http_body:
+            return self.get_services(site, url, token, verify, use_auth)
+        services = http_body.get("run-service")
+        if http_body.get("procedure") == "status":
+            services = services if isinstance(services, list) else [services]
+            return True, {"services": {service: self.get_status(site, service) for service in services
+                                       if service in self._services.get(site, {})}}, 200
+        if services not in self._services.get(site, {}):
+            return True, {"message": f"Service {services} doesn't exist"}, 400
+        self.start_procedure(site, services, http_body["procedure"])
+        return True, {"message": "Procedure is started", "run-service": services,
+                      "procedure": http_body["procedure"]}, 200
+
+    def get_services(self, site, url, token, verify, use_auth) -> Tuple[bool, Dict, int]:
+        """ Returns services dictionary of the site, long-poll isn't supported by simulated site-manager """
+        if site not in self._services:
+            services = self.model.services
+            if services is None:
+                ret, response, code = super().__call__(url, token, verify, use_auth=use_auth)
+                if not ret or code != 200:
+                    return ret, response, code
+                services = response.get("services", {})
+            modes = {**get_initial_modes(self.cmd, self.site, list(settings.current().sm_conf.keys())),
+                     **(self.model.modes or {})}
+            with self._lock:
+                self._services[site] = services
+                self._states.update({(site, service): {"mode": modes.get(site, "standby"), "status": "done",
+                                                       "failed": False, "operation": None}
+                                     for service in services})
+        return True, {"services": self._services[site], "features": ["services-list"]}, 200
+
+    def get_duration(self, service, mode) -> float:
+        """ Returns duration of service procedure from model, history or default one """
+        duration = (self.model.durations or {}).get(service, {}).get(mode)
+        if duration is None:
+            duration = history.get_expected_duration(service, mode)
+        return float(duration if duration is not None else self.model.default_duration)
+
+    def start_procedure(self, site, service, mode):
+        now = settings.current().clock.monotonic()
+        operation = {"service": service, "site": site, "mode": mode, "start": now,
+                     "done": now + self.get_duration(service, mode), "observed": None}
+        with self._lock:
+            self.operations.append(operation)
+            self._states[(site, service)] = {"mode": mode, "status": "running", "operation": operation,
+                                             "failed": self._random.random() < self.model.failure_rate}
+
+    def get_status(self, site, service) -> dict:
+        now = settings.current().clock.monotonic()
+        with self._lock:
+            state = self._states[(site, service)]
+            operation = state["operation"]
+            if state["status"] == "running" and now >= operation["done"]:
+                state["status"] = "failed" if state["failed"] else "done"
+                operation["observed"] = now
+            return {"mode": state["mode"], "status": state["status"],
+                    "healthz": "down" if state["status"] == "failed" else "up", "message": ""}
+
+    def report(self, duration: float, cpu_time: float) -> dict:
+        """ Returns simulated timeline of procedure
+        @param duration: virtual duration of procedure in seconds
+        @param cpu_time: CPU time in seconds, that was spent for simulation
+        @returns: {"procedure": cmd, "site": site, "duration": seconds, "cpu_time": seconds, "requests": number,
+         "polling_overhead": seconds, "operations": [{"service", "site", "mode", "start", "done", "observed"}]}
+        """
+        with self._lock:
+            operations = sorted(({key: round(value, 3) if isinstance(value, float) else value
+                                  for key, value in operation.items()} for operation in self.operations),
+                                key=lambda operation: (operation["start"], operation["service"]))
+        return {"procedure": self.cmd, "site": self.site, "duration": round(duration, 3),
+                "cpu_time": round(cpu_time, 3), "requests": self.requests,
+                "polling_overhead": round(sum(operation["observed"] - operation["done"] for operation in operations
+                                              if operation["observed"] is not None), 3),
+                "operations": operations}
@@ -0,0 +1,97 @@
+"""Module, that records timing trace of DR procedure: HTTP requests, polling iterations, site operations of services,
+modules and validation are recorded as spans and exported in Chrome trace format (chrome://tracing, Perfetto)
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+from sm_client import simulation
+from sm_client.data import settings
+
+# the name of timeline row for spans: service name, while service is processed, thread name otherwise
+_lane: contextvars.ContextVar = contextvars.ContextVar("sm_client_trace_lane", default=None)
+
+
+class Tracer:
+    """
+    Collects spans of procedure processing in memory and saves them to file in Chrome trace event format.
+    Spans of one service are shown in one row, so nested spans don't overlap also in asyncio engine.
+    Time is taken from the clock of the run, so simulated procedure is traced in virtual time
+    @param str path: the path to trace file, tracing is disabled, if it's not defined
+    @param Clock clock: the clock of the run, real time clock by default
+    """
+
+    def __init__(self, path: Optional[str] = None, clock: Optional[simulation.Clock] = None):
+        self.path = os.path.expanduser(path) if path else None
+        self._clock = clock or simulation.Clock()
+        self._start_time = self._clock.monotonic()
+        self._events: list = []
+        self._lanes: dict = {}  # {lane name: tid}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """ Returns True, if spans are recorded """
+        return self.path is not None
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **args):
+        """ Context manager, that records the block as span
+        @param name: span name
+        @param category: span category: procedure, module, validation, service, poll, http
+        @param args: additional span attributes, they are returned by context manager, so the block can add results
+        """
+        if not self.enabled:
+            yield args
+            return
+        start_time = self._clock.monotonic()
+        try:
+            yield args
+        finally:
+            self._add_event(name, category, start_time, self._clock.monotonic() - start_time, args)
+
+    def _add_event(self, name, category, start_time: float, duration: float, args: dict):
+        lane = _lane.get() or threading.current_thread().name
+        with self._lock:
+            tid = self._lanes.setdefault(lane, len(self._lanes) + 1)
+            self._events.append({"name": name, "cat": category, "ph": "X", "pid": 1, "tid": tid,
+                                 "ts": round((start_time - self._start_time) * 1e6),
+                                 "dur": round(duration * 1e6), "args": args})
+
+    def export(self):
+        """ Saves recorded spans to trace file, if tracing is enabled """
+        if not self.enabled:
+            return
+        with self._lock:
+            metadata = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": lane}}
+                        for lane, tid in self._lanes.items()]
+            trace = {"traceEvents": metadata + sorted(self._events, key=lambda event: event["ts"]),
+                     "displayTimeUnit": "ms"}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "w") as file:
+                json.dump(trace, file)
+            logging.info(f"Procedure trace is saved to {self.path}")
+        except OSError as e:
+            logging.warning(f"Can't save procedure trace to {self.path}: {e}")
+
+
+@contextlib.contextmanager
+def lane(name: str):
+    """ Context manager, that shows spans of the block in the timeline row with defined name """
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def init_tracer(path: Optional[str] = None):
+    """ Creates new tracer of current run
+    @param path: the path to trace file, tracing is disabled, if it's not defined
+    """
+    settings.current().tracer = Tracer(path, settings.current().clock)
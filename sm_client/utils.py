@@ -2,7 +2,10 @@
 import logging
 import ssl
 import os
-from typing import Tuple, Dict
+import threading
+import time
+from typing import Tuple, Dict, Optional
+from urllib.parse import urlsplit
 
 import requests.packages
 
@@ -13,6 +16,9 @@ from urllib3.exceptions import InsecureRequestWarning
 
 SM_GET_REQUEST_TIMEOUT = int(os.environ.get("SM_GET_REQUEST_TIMEOUT", 10))
 SM_POST_REQUEST_TIMEOUT = int(os.environ.get("SM_POST_REQUEST_TIMEOUT", 30))
+SM_HTTP_POOL_MAXSIZE = int(os.environ.get("SM_HTTP_POOL_MAXSIZE", 50))
+SM_CIRCUIT_BREAKER_THRESHOLD = int(os.environ.get("SM_CIRCUIT_BREAKER_THRESHOLD", 3))
+SM_CIRCUIT_BREAKER_COOLDOWN = int(os.environ.get("SM_CIRCUIT_BREAKER_COOLDOWN", 30))
 
 
 class ProcedureException(Exception):
@@ -26,19 +32,220 @@ class ProcedureException(Exception):
         self.output = output
 
 
-def io_make_http_json_request(url="", token=None, verify=True, http_body:dict=None, retry=3, use_auth=True) -> Tuple[bool, Dict, int]:
+class HTTPSessionPool:
+    """
+    Keeps one persistent requests.Session per site-manager endpoint, so keep-alive connections (and TLS sessions)
+    are reused by all threads, that work with the same site
+    @param int maxsize: the maximum number of kept connections per endpoint
+    @param int retry: the number of retries
+    """
+
+    def __init__(self, maxsize=SM_HTTP_POOL_MAXSIZE, retry=3):
+        self.maxsize = maxsize
+        self.retry = retry
+        self._sessions: Dict[tuple, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(url, verify, token) -> tuple:
+        """Returns pool key for site-manager endpoint"""
+        return url, str(verify), token
+
+    def open(self, url, verify, token) -> requests.Session:
+        """ Returns session for endpoint, creates it if it doesn't exist yet"""
+        key = self.make_key(url, verify, token)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                for prefix in ('https://', 'http://'):
+                    session.mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=self.maxsize,
+                                                      max_retries=Retry(total=self.retry)))
+                self._sessions[key] = session
+                logging.debug(f"HTTP session for {url} is created, pool size: {self.maxsize}")
+            return session
+
+    def get(self, url, verify, token) -> Optional[requests.Session]:
+        """ Returns session for endpoint or None, if it wasn't opened"""
+        return self._sessions.get(self.make_key(url, verify, token))
+
+    def stats(self) -> Dict[str, int]:
+        """ Returns counters of opened and reused connections for all sessions"""
+        opened = requests_count = 0
+        with self._lock:
+            for session in self._sessions.values():
+                for adapter in set(session.adapters.values()):
+                    if not isinstance(adapter, HTTPAdapter):
+                        continue
+                    for pool_key in adapter.poolmanager.pools.keys():
+                        conn_pool = adapter.poolmanager.pools.get(pool_key)
+                        if conn_pool is None:
+                            continue
+                        opened += conn_pool.num_connections
+                        requests_count += conn_pool.num_requests
+        return {"opened": opened, "reused": max(requests_count - opened, 0)}
+
+    def close(self):
+        """ Closes all sessions and their connections"""
+        stats = self.stats()
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            if self._sessions:
+                logging.debug(f"HTTP sessions are closed. Connections opened: {stats['opened']}, "
+                              f"reused: {stats['reused']}")
+            self._sessions.clear()
+
+
+http_sessions = HTTPSessionPool()  # default pool, that is used, if pool isn't defined for request
+_http_session_pools: Dict[int, HTTPSessionPool] = {SM_HTTP_POOL_MAXSIZE: http_sessions}  # {maxsize: pool}
+_http_session_pools_lock = threading.Lock()
+
+
+def init_http_sessions(sites_conf: dict, maxsize=SM_HTTP_POOL_MAXSIZE) -> HTTPSessionPool:
+    """ Creates persistent sessions for all configured sites in the pool with defined maxsize. Pools are kept per
+    maxsize and are never closed here, so DR sessions, that run in parallel with the same or different configuration,
+    don't affect each other's connections
+    @param sites_conf: sites configuration {site: {"url":..., "token":..., "cacert":...}}
+    @param maxsize: the maximum number of kept connections per site
+    @returns: the pool with sessions for sites
+    """
+    with _http_session_pools_lock:
+        pool = _http_session_pools.setdefault(maxsize, HTTPSessionPool(maxsize))
+
+    if not os.getenv("DEBUG"):
+        # Disable warnings about self-signed certificates from requests library
+        urllib3.disable_warnings(InsecureRequestWarning)
+    logging.getLogger("urllib3").setLevel(logging.CRITICAL)
+
+    for site_conf in sites_conf.values():
+        pool.open(site_conf["url"], site_conf["cacert"], site_conf["token"])
+    return pool
+
+
+def close_http_sessions():
+    """ Closes all persistent sessions of all pools, should be called, when there are no running DR sessions """
+    with _http_session_pools_lock:
+        pools = list(_http_session_pools.values())
+    for pool in pools:
+        pool.close()
+
+
+class CircuitBreaker:
+    """
+    Per endpoint circuit breaker: after threshold consecutive connection failures endpoint is considered unreachable
+    and requests to it fail immediately during cooldown. After cooldown one probe request is allowed,
+    the circuit is closed, if endpoint answered
+    @param int threshold: the number of consecutive connection failures to open the circuit, 0 disables breaker
+    @param float cooldown: the time in seconds, that circuit stays open
+    """
+
+    def __init__(self, threshold=SM_CIRCUIT_BREAKER_THRESHOLD, cooldown=SM_CIRCUIT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: Dict[str, int] = {}
+        self._open_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(url) -> str:
+        """Returns breaker key for endpoint url"""
+        return urlsplit(url).netloc or url
+
+    def allow(self, url) -> bool:
+        """ Returns True, if request to endpoint can be sent """
+        key = self.make_key(url)
+        with self._lock:
+            open_until = self._open_until.get(key)
+            if open_until is None:
+                return True
+            if time.monotonic() < open_until:
+                return False
+            # only one probe request is sent after cooldown, the next one is allowed after next cooldown
+            self._open_until[key] = time.monotonic() + self.cooldown
+            return True
+
+    def is_open(self, url) -> bool:
+        """ Returns True, if endpoint is considered unreachable """
+        with self._lock:
+            return self.make_key(url) in self._open_until
+
+    def record_success(self, url):
+        """ Closes the circuit for endpoint, that answered """
+        key = self.make_key(url)
+        with self._lock:
+            self._failures.pop(key, None)
+            if self._open_until.pop(key, None) is not None:
+                logging.info(f"Endpoint {key} is reachable again")
+
+    def record_failure(self, url):
+        """ Counts connection failure for endpoint, opens the circuit after threshold consecutive failures """
+        if not self.threshold:
+            return
+        key = self.make_key(url)
+        with self._lock:
+            self._failures[key] = self._failures.get(key, 0) + 1
+            if self._failures[key] >= self.threshold:
+                if key not in self._open_until:
+                    logging.warning(f"Endpoint {key} is unreachable after {self._failures[key]} connection failures, "
+                                    f"requests to it are skipped for {self.cooldown} seconds")
+                self._open_until[key] = time.monotonic() + self.cooldown
+
+
+circuit_breaker = CircuitBreaker()  # default breaker, that is used, if breaker isn't defined for request
+# {(threshold, cooldown): breaker}
+_circuit_breakers: Dict[tuple, CircuitBreaker] = {(SM_CIRCUIT_BREAKER_THRESHOLD, SM_CIRCUIT_BREAKER_COOLDOWN):
+                                                  circuit_breaker}
+_circuit_breakers_lock = threading.Lock()
+
+
+def init_circuit_breaker(threshold=SM_CIRCUIT_BREAKER_THRESHOLD, cooldown=SM_CIRCUIT_BREAKER_COOLDOWN) \
+        -> CircuitBreaker:
+    """ Returns circuit breaker with defined limits. Breakers are kept per limits, so endpoints state is shared by
+    DR sessions with the same limits, that run in parallel, and isn't dropped by sessions with other limits
+    @param threshold: the number of consecutive connection failures to open the circuit, 0 disables breaker
+    @param cooldown: the time in seconds, that circuit stays open
+    """
+    with _circuit_breakers_lock:
+        return _circuit_breakers.setdefault((threshold, cooldown), CircuitBreaker(threshold, cooldown))
+
+
+def io_make_http_json_request(url="", token=None, verify=True, http_body:dict=None, retry=3, use_auth=True,
+                              stats: dict = None, timeout: float = None, sessions: HTTPSessionPool = None,
+                              breaker: CircuitBreaker = None) -> Tuple[bool, Dict, int]:
     """ Sends GET/POST request to service
+    Persistent session from sessions pool is used, if it was opened for this url, verify and token.
+    Requests to endpoint, that is considered unreachable by breaker, fail immediately
     @param string url: the URL to service operator
     @param token: Bearer token
     @param verify: Server side SSL verification
     @param retry: the number of retries
     @param http_body: the dictionary with procedure and list of services
+    @param stats: the dictionary, where the number of done retries is returned as "retries", if it's defined
+    @param timeout: request timeout in seconds, SM_POST_REQUEST_TIMEOUT or SM_GET_REQUEST_TIMEOUT by default
+    @param sessions: the pool of persistent sessions, http_sessions by default
+    @param breaker: the circuit breaker of endpoints, circuit_breaker by default
     @returns: True/False, Dict with not empty json body in case Ok/{}, HTTP_CODE/
     IO SSL codes: ssl.SSLErrorNumber.SSL_ERROR_SSL/SSLErrorNumber.SSL_ERROR_EOF
     """
-    if not os.getenv("DEBUG"):
-        # Disable warnings about self-signed certificates from requests library
-        urllib3.disable_warnings(InsecureRequestWarning)
+    sessions = sessions or http_sessions
+    breaker = breaker or circuit_breaker
+    if not breaker.allow(url):
+        logging.error(f"Endpoint {url} is unreachable, request is skipped")
+        return False, {}, False
+
+    session = sessions.get(url, verify, token) if retry == sessions.retry else None
+    if session is None:
+        if not os.getenv("DEBUG"):
+            # Disable warnings about self-signed certificates from requests library
+            urllib3.disable_warnings(InsecureRequestWarning)
+
+        session = requests.Session()
+        retries = Retry(total=retry)
+        session.mount('https://', HTTPAdapter(max_retries=retries))
+        session.mount('http://', HTTPAdapter(max_retries=retries))
+
+        logging.getLogger("urllib3").setLevel(logging.CRITICAL)
 
     if token and use_auth:
         headers = {"Authorization": f"Bearer {token}"}
@@ -49,18 +256,16 @@ def io_make_http_json_request(url="", token=None, verify=True, http_body:dict=No
     logging.debug(f"REST url: {url}")
     logging.debug(f"REST data: {http_body}")
 
-    session = requests.Session()
-    retries = Retry(total=retry)
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-    session.mount('http://', HTTPAdapter(max_retries=retries))
-
-    logging.getLogger("urllib3").setLevel(logging.CRITICAL)
-
     try:
         if any(http_body):
-            resp = session.post(url, json=http_body, timeout=SM_POST_REQUEST_TIMEOUT, headers=headers, verify=verify)
+            resp = session.post(url, json=http_body, timeout=timeout or SM_POST_REQUEST_TIMEOUT, headers=headers,
+                                verify=verify)
         else:
-            resp = session.get(url, timeout=SM_GET_REQUEST_TIMEOUT, headers=headers, verify=verify)
+            resp = session.get(url, timeout=timeout or SM_GET_REQUEST_TIMEOUT, headers=headers, verify=verify)
+        breaker.record_success(url)
+        if stats is not None:
+            resp_retries = getattr(resp.raw, "retries", None)
+            stats["retries"] = len(resp_retries.history) if isinstance(resp_retries, Retry) else 0
         logging.debug(f"Status code: {resp.status_code}")
         logging.debug(f"REST response: {resp.text}")
         return True, resp.json() if resp.json() else {}, resp.status_code # return ANY content with HTTP code
@@ -77,6 +282,10 @@ def io_make_http_json_request(url="", token=None, verify=True, http_body:dict=No
         logging.error("Wrong JSON data received %s", e)
     except requests.exceptions.RequestException as e:
         logging.error("General request error %s", e)
+        if isinstance(e, requests.exceptions.ConnectionError):
+            breaker.record_failure(url)
+            if stats is not None:  # all retries are done
+                stats["retries"] = retry
     except Exception as e:
         logging.error("General error %s",e)
 
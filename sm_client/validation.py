@@ -1,10 +1,11 @@
 """Functions that are used for validation"""
 import logging
 import ssl
+from typing import Dict, Set
 
 from sm_client.data import settings
 from sm_client.data.structures import SMClusterState, ServiceDRStatus, NotValid
-from sm_client.processing import sm_process_service
+from sm_client.processing import run_status_procedure
 
 
 def check_site_ssl_available(checked_site: str, sm_dict: SMClusterState):
@@ -33,7 +34,7 @@ def check_services_on_sites(services: list, sites: list, sm_dict: SMClusterState
     ret = True
     for site in sites:
         for s in services:
-            if s not in sm_dict[site]["services"].keys():  # need to rework to support modules, run-services as well
+            if not sm_dict.has_service(site, s):  # need to rework to support modules, run-services as well
                 logging.warning(f"Service '{s}' does not exist on '{site}' site")
                 ret = False
     return ret
@@ -57,45 +58,67 @@ def check_dep_issue(sm_dict: SMClusterState, cmd: str, module: str):
     return True
 
 
-def check_state_restrictions(services: list, site: str, cmd: str):
+def compile_state_restrictions(state_restrictions: dict, sites: list) -> Dict[str, Set[tuple]]:
+    """ Converts restricted states strings to sets of states tuples for fast lookup
+    @param state_restrictions: restrictions from config {service: ["active-standby", ...]}
+    @param sites: sites names in the order of states in restriction string
+    @returns: {service: {("active", "standby"), ...}}
+    """
+    return {service: {tuple(state_str.split("-")) for state_str in states if state_str.count("-") + 1 == len(sites)}
+            for service, states in state_restrictions.items()}
+
+
+def check_state_restrictions(services: list, site: str, cmd: str, sm_dict: SMClusterState = None):
     """ Check if services final state is not restricted in config
     @param services: services list to process
     @param site: site to process
     @param  cmd:  called cmd command
+    @param sm_dict: populated sm_dict, services statuses, that are already received, are reused
     @returns: Returns true, if final state is permitted for all defined services
     """
 
     state_is_valid = True
     # Get services, that should be predicted
-    services_to_predict = services if "*" in settings.state_restrictions else \
-        [service for service in services if service in settings.state_restrictions.keys()]
+    services_to_predict = services if "*" in settings.current().state_restrictions else \
+        [service for service in services if service in settings.current().state_restrictions.keys()]
     logging.debug(f"Services to predict {services_to_predict}")
+    if not services_to_predict:
+        return True
+
+    sites = list(settings.current().sm_conf.keys())
+    restricted_states = compile_state_restrictions(settings.current().state_restrictions, sites)
+    common_restricted_states = restricted_states.get("*", set())
+
+    # Get states on opposite site: received statuses are reused, the rest are requested in parallel
+    opposite_site = settings.current().sm_conf.get_opposite_site(site)
+    known_services = sm_dict[opposite_site]["services"] if sm_dict else {service: {} for service in services_to_predict}
+    opposite_state = SMClusterState({opposite_site: {"status": True, "services": {
+        service: {"status": known_services[service]["status"]}
+        if isinstance(known_services[service].get("status"), ServiceDRStatus) else {}
+        for service in services_to_predict if service in known_services}}})
+    services_to_request = [service for service in services_to_predict
+                           if not opposite_state[opposite_site]["services"].get(service, {}).get("status")]
+    if services_to_request:
+        run_status_procedure(opposite_state, services_to_request, [opposite_site])
+
     # Predict state for services and compare with restrictions
+    site_mode = settings.current().sm_conf.convert_sitecmd_to_dr_mode(cmd)
     for service in services_to_predict:
-        # Convert restricted states
-        restricted_states_list = []
-        for restricted_state_str in settings.state_restrictions.get(service, []) + settings.state_restrictions.get("*",
-                                                                                                                   []):
-            restricted_states_list.append(dict(zip(settings.sm_conf.keys(), restricted_state_str.split("-"))))
-        logging.debug(f"Restricted states for service {service}: {restricted_states_list}")
-
-        # Get state on opposite site
-        opposite_site = settings.sm_conf.get_opposite_site(site)
-        response, ret, _ = sm_process_service(opposite_site, service, "status")
-        if not ret:
+        serviceDRstatus = opposite_state[opposite_site]["services"].get(service, {}).get("status")
+        if not serviceDRstatus:
             logging.error(f"Can't get service {service} on site {opposite_site}")
             state_is_valid = False
             continue
-        serviceDRstatus = ServiceDRStatus(response)
         if serviceDRstatus.mode == '---':
             logging.error(f"Can't recognize current mode for service {service} on site {opposite_site}")
             state_is_valid = False
             continue
 
         # Predicted state
-        state = {site: settings.sm_conf.convert_sitecmd_to_dr_mode(cmd), opposite_site: serviceDRstatus.mode}
+        state = {site: site_mode, opposite_site: serviceDRstatus.mode}
         logging.debug(f"Predicted state for service {service}: {state}")
-        if state in restricted_states_list:
+        state_tuple = tuple(state[site_name] for site_name in sites)
+        if state_tuple in common_restricted_states or state_tuple in restricted_states.get(service, ()):
             logging.error(f"Final state {state} for service {service} is restricted")
             state_is_valid = False
     if not state_is_valid:
@@ -198,10 +221,10 @@ def validate_stop_operation(sm_dict: SMClusterState, cmd, site=None, service_dep
     check_deps_consistency(sm_dict, service_dep_ordered, sm_dict.get_available_sites())
     check_sequence_consistency(sm_dict, service_dep_ordered, sm_dict.get_available_sites())
 
-    if not check_site_ssl_available(settings.sm_conf.get_opposite_site(site), sm_dict) or \
+    if not check_site_ssl_available(settings.current().sm_conf.get_opposite_site(site), sm_dict) or \
             not check_dep_issue(sm_dict, cmd, module):
         raise NotValid
-    check_services_on_sites(service_dep_ordered, list(settings.sm_conf.keys()), sm_dict)
+    check_services_on_sites(service_dep_ordered, list(settings.current().sm_conf.keys()), sm_dict)
 
 
 def validate_move_operation(sm_dict: SMClusterState, cmd, site=None, service_dep_ordered=None,
@@ -214,8 +237,8 @@ def validate_move_operation(sm_dict: SMClusterState, cmd, site=None, service_dep
     @param module: services module
     @returns: Allowed or not to proceed operation <cmd> on <site>
     """
-    if not all(check_site_ssl_available(site_i, sm_dict) for site_i in settings.sm_conf.keys()) or \
-            not check_services_on_sites(service_dep_ordered,  list(settings.sm_conf.keys()), sm_dict) or \
+    if not all(check_site_ssl_available(site_i, sm_dict) for site_i in settings.current().sm_conf.keys()) or \
+            not check_services_on_sites(service_dep_ordered,  list(settings.current().sm_conf.keys()), sm_dict) or \
             not check_dep_issue(sm_dict, cmd, module) or \
             not check_deps_consistency(sm_dict, service_dep_ordered, sm_dict.get_available_sites()) or \
             not check_sequence_consistency(sm_dict, service_dep_ordered, sm_dict.get_available_sites()):
@@ -237,7 +260,7 @@ def validate_readonly_operation(sm_dict: SMClusterState, cmd, site=None, service
     check_sequence_consistency(sm_dict, service_dep_ordered, sm_dict.get_available_sites())
 
     if not any([check_site_ssl_available(site, sm_dict)] if site else
-               [check_site_ssl_available(s, sm_dict) for s in settings.sm_conf.keys()]):
+               [check_site_ssl_available(s, sm_dict) for s in settings.current().sm_conf.keys()]):
         raise NotValid
 
     # Fail if required site (or site merging) has deps issues:
@@ -259,7 +282,7 @@ def validate_sites_operation(sm_dict: SMClusterState, cmd, site=None, service_de
     if not check_site_ssl_available(site, sm_dict) or \
             not check_services_on_sites(service_dep_ordered, [site], sm_dict) or \
             not check_dep_issue(sm_dict, cmd, module) or \
-            not check_state_restrictions(service_dep_ordered, site, cmd):
+            not check_state_restrictions(service_dep_ordered, site, cmd, sm_dict):
         raise NotValid
 
 
@@ -286,10 +309,12 @@ def validate_operation(sm_dict: SMClusterState, cmd, site=None, services_to_run=
     @returns: Allowed or not to proceed operation <cmd> on <site>
     """
 
-    service_dep_ordered = [s for s in services_to_run
-                           if sm_dict[sm_dict.get_available_sites()[0]]['services'].get(s, {})
-                           .get("module", settings.default_module) == module] \
-        if services_to_run else sm_dict.globals[module]['service_dep_ordered']
+    if services_to_run:
+        available_site_services = sm_dict[sm_dict.get_available_sites()[0]]['services']
+        service_dep_ordered = [s for s in services_to_run
+                               if available_site_services.get(s, {}).get("module", settings.default_module) == module]
+    else:
+        service_dep_ordered = sm_dict.globals[module]['service_dep_ordered']
 
     if cmd not in validation_func:
         raise NotValid
@@ -0,0 +1,112 @@
+import json
+import logging
+import resource
+import threading
+import time
+from collections import Counter
+
+import pytest
+import yaml
+from prettytable import PrettyTable
+
+from sm_client.api import DRSession
+from tests.bench.fake_site_manager import DURATION_MODELS, GRAPH_SHAPES, DurationModel, FakeSiteManager, \
+    make_services
+
+SITES = ("site-1", "site-2")
+
+results: list = []
+
+
+def pytest_addoption(parser):
+    parser.addoption("--bench-sizes", default="10,100,1000,5000", help="comma separated numbers of services")
+    parser.addoption("--bench-shape", default="tree", choices=GRAPH_SHAPES, help="dependency graph shape")
+    parser.addoption("--bench-duration", default="constant", choices=DURATION_MODELS,
+                     help="time-to-done distribution of services procedures")
+    parser.addoption("--bench-mean", default=0.05, type=float, help="mean time-to-done in seconds")
+    parser.addoption("--bench-latency", default=0.0, type=float, help="site-manager answer delay in seconds")
+    parser.addoption("--bench-failure-rate", default=0.0, type=float,
+                     help="the probability, that service procedure is failed")
+    parser.addoption("--bench-engine", default="threading", choices=("threading", "asyncio"),
+                     help="sm-client engine")
+    parser.addoption("--bench-report", default=None, help="the filename to save results in JSON format")
+
+
+def pytest_generate_tests(metafunc):
+    if "services_number" in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption("--bench-sizes").split(",")]
+        metafunc.parametrize("services_number", sizes)
+
+
+class ThreadsSampler:
+    """ Samples the number of sm-client threads in background to find the peak """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="bench-threads-sampler", daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, sum(thread.name.startswith("sm-client") for thread in threading.enumerate()))
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        self._thread.join()
+
+
+@pytest.fixture(name="bench")
+def run_bench(pytestconfig, tmp_path):
+    """ Returns function, that starts fake site-managers with services_number services, runs sm-client procedure
+    with DRSession and records wall time, requests, peak threads and RSS
+    """
+    site_managers: list = []
+
+    def bench(cmd, site, services_number, **options):
+        services = make_services(services_number, pytestconfig.getoption("--bench-shape"))
+        duration = DurationModel(pytestconfig.getoption("--bench-duration"), pytestconfig.getoption("--bench-mean"))
+        site_managers.extend(FakeSiteManager(services, mode, pytestconfig.getoption("--bench-latency"),
+                                             pytestconfig.getoption("--bench-failure-rate"), duration).start()
+                             for mode in ("active", "standby"))
+        config = {"sites": [{"name": name, "token": "12345", "site-manager": site_manager.url}
+                            for name, site_manager in zip(SITES, site_managers)],
+                  "sm-client": {"http_auth": False, "engine": pytestconfig.getoption("--bench-engine")},
+                  "flow": [{"stateful": None}]}
+        config_file = tmp_path / "sm-client-config.yaml"
+        config_file.write_text(yaml.safe_dump(config))
+
+        with ThreadsSampler() as sampler, DRSession(config=str(config_file), **options) as session:
+            start_time = time.perf_counter()
+            result = session.run(cmd, site)
+            wall_time = time.perf_counter() - start_time
+        requests = sum((site_manager.requests for site_manager in site_managers), Counter())
+        record = {"cmd": cmd, "site": site, "services": services_number, "ok": result.ok,
+                  "wall_time": round(wall_time, 3), "requests": sum(requests.values()), "endpoints": dict(requests),
+                  "peak_threads": sampler.peak,
+                  "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+        results.append(record)
+        logging.warning(f"Benchmark {cmd} {site} for {services_number} services: {record}")
+        return result, record
+
+    yield bench
+    for site_manager in site_managers:
+        site_manager.stop()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not results:
+        return
+    table = PrettyTable(["cmd", "services", "ok", "wall time, s", "requests", "peak threads", "max RSS, MB"])
+    for record in results:
+        table.add_row([f"{record['cmd']} {record['site'] or ''}".strip(), record["services"], record["ok"],
+                       record["wall_time"], record["requests"], record["peak_threads"], record["max_rss_mb"]])
+    terminalreporter.write_line(str(table))
+    if config.getoption("--bench-report"):
+        with open(config.getoption("--bench-report"), "w") as file:
+            json.dump(results, file, indent=2)
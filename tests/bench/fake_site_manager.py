@@ -0,0 +1,199 @@
+"""In-process fake of site-manager HTTP API for sm-client benchmarks.
+It keeps modes and statuses of generated services in memory, DR procedures of services are finished after the time
+from duration model. Supported API: services dictionary (GET), status with services list and long-poll,
+active/standby/disable procedures
+"""
+import http.server
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http import HTTPStatus
+
+GRAPH_SHAPES = ("independent", "chain", "tree", "layers")
+DURATION_MODELS = ("constant", "uniform", "lognormal")
+
+
+def make_services(count: int, shape="tree", seed=0, timeout=600) -> dict:
+    """ Makes services dictionary with dependencies of defined shape
+    @param count: the number of services
+    @param shape: dependency graph shape: independent - no dependencies, chain - every service depends on previous one,
+     tree - binary tree, layers - 10 layers, services depend on 1-3 random services from previous layer
+    @param seed: seed of random dependencies
+    @param timeout: polling timeout of services in seconds
+    @returns: {service: service definition in site-manager format}
+    """
+    if shape not in GRAPH_SHAPES:
+        raise ValueError(f"Unknown graph shape {shape}, supported: {GRAPH_SHAPES}")
+    rnd = random.Random(seed)
+    layer_size = max(count // 10, 1)
+    services = {}
+    for i in range(count):
+        if shape == "chain" and i:
+            after = [f"serv{i - 1}"]
+        elif shape == "tree" and i:
+            after = [f"serv{(i - 1) // 2}"]
+        elif shape == "layers" and i >= layer_size:
+            layer_start = (i // layer_size - 1) * layer_size
+            after = sorted({f"serv{rnd.randrange(layer_start, layer_start + layer_size)}"
+                            for _ in range(rnd.randint(1, 3))})
+        else:
+            after = []
+        services[f"serv{i}"] = {"CRname": f"serv{i}", "name": f"serv{i}", "namespace": "bench", "module": "stateful",
+                                "after": after, "before": [], "sequence": ["standby", "active"],
+                                "allowedStandbyStateList": ["up"], "timeout": timeout}
+    return services
+
+
+class DurationModel:
+    """
+    Time-to-done distribution of services DR procedures
+    @param str kind: constant, uniform (from 0 to 2 * mean) or lognormal
+    @param float mean: mean duration in seconds
+    @param int seed: seed of random durations
+    """
+
+    def __init__(self, kind="constant", mean=0.05, seed=0):
+        if kind not in DURATION_MODELS:
+            raise ValueError(f"Unknown duration model {kind}, supported: {DURATION_MODELS}")
+        self.kind = kind
+        self.mean = mean
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        with self._lock:
+            if self.kind == "uniform":
+                return self._random.uniform(0, 2 * self.mean)
+            if self.kind == "lognormal":  # sigma = 1, mu is chosen to keep the mean
+                return self._random.lognormvariate(0, 1) * self.mean / 1.6487
+            return self.mean
+
+
+class FakeSiteManager:
+    """
+    Site-manager of one site, that is served by ThreadingHTTPServer on localhost
+    @param dict services: services dictionary, see make_services
+    @param str mode: initial mode of services on the site
+    @param float latency: the delay in seconds before every answer
+    @param float failure_rate: the probability, that service procedure is finished with failed status
+    @param DurationModel duration: time-to-done of services procedures
+    @param list features: API features, that are returned in services dictionary
+    @param int seed: seed of random failures
+    """
+
+    def __init__(self, services: dict, mode="active", latency=0.0, failure_rate=0.0, duration: DurationModel = None,
+                 features=("services-list", "long-poll"), seed=0):
+        self.services = services
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.duration = duration or DurationModel()
+        self.features = list(features)
+        self.requests: Counter = Counter()  # {endpoint: count}
+        self._random = random.Random(seed)
+        self._states = {service: {"mode": mode, "status": "done", "done_at": 0, "failed": False}
+                        for service in services}
+        self._lock = threading.Condition()
+        self._server = http.server.ThreadingHTTPServer(("localhost", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-site-manager", daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://localhost:{self._server.server_address[1]}/sitemanager"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def get_status(self, service) -> dict:
+        """ Returns current status of the service in site-manager format """
+        with self._lock:
+            state = self._states[service]
+            status = state["status"]
+            if status == "running" and time.monotonic() >= state["done_at"]:
+                status = state["status"] = "failed" if state["failed"] else "done"
+            healthz = "down" if status == "failed" else "up"
+            return {"mode": state["mode"], "status": status, "healthz": healthz, "message": ""}
+
+    def start_procedure(self, service, mode):
+        """ Starts DR procedure of the service, it's done after the time from duration model """
+        with self._lock:
+            self._states[service] = {"mode": mode, "status": "running", "done_at": time.monotonic() + self.duration(),
+                                     "failed": self._random.random() < self.failure_rate}
+            self._lock.notify_all()
+
+    def wait_status(self, service, mode, wait_timeout) -> dict:
+        """ Long-poll status: waits till the service procedure is finished in required mode or wait timeout expired """
+        deadline = time.monotonic() + wait_timeout
+        while True:
+            status = self.get_status(service)
+            now = time.monotonic()
+            if status["status"] == "failed" or (status["status"] == "done" and status["mode"] == mode) or \
+                    now >= deadline:
+                return status
+            with self._lock:
+                self._lock.wait(min(max(self._states[service]["done_at"] - now, 0.001), deadline - now))
+
+    def count(self, endpoint):
+        """ Counts request to endpoint """
+        with self._lock:
+            self.requests[endpoint] += 1
+
+    def handle(self, body: dict):
+        """ Handles site-manager request
+        @returns: HTTP code and response
+        """
+        if not body:
+            self.count("list")
+            return HTTPStatus.OK, {"services": self.services, "features": self.features}
+        services = body.get("run-service")
+        if body.get("procedure") == "status":
+            if body.get("wait-timeout"):
+                self.count("wait")
+                return HTTPStatus.OK, {"services": {services: self.wait_status(services, body.get("wait-mode"),
+                                                                               body["wait-timeout"])},
+                                       "long-poll": True}
+            self.count("status")
+            services = services if isinstance(services, list) else [services]
+            return HTTPStatus.OK, {"services": {service: self.get_status(service) for service in services
+                                                if service in self.services}}
+        self.count(body.get("procedure"))
+        if services not in self.services:
+            return HTTPStatus.BAD_REQUEST, {"message": f"Service {services} doesn't exist"}
+        self.start_procedure(services, body["procedure"])
+        return HTTPStatus.OK, {"message": "Procedure is started", "run-service": services,
+                               "procedure": body["procedure"]}
+
+    def _make_handler(self):
+        site_manager = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.answer({})
+
+            def do_POST(self):
+                self.answer(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}"))
+
+            def answer(self, body):
+                if site_manager.latency:
+                    time.sleep(site_manager.latency)
+                code, response = site_manager.handle(body)
+                data = json.dumps(response).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,26 @@
+"""Benchmarks of sm-client procedures with in-process fake site-managers.
+Usage: python -m pytest tests/bench [--bench-sizes 10,100] [--bench-shape layers] [--bench-report report.json],
+see tests/bench/conftest.py for other options
+"""
+
+
+def test_status(bench, services_number):
+    result, record = bench("status", None, services_number)
+    assert result.ok
+    # statuses of all services are requested with one request per site
+    assert record["endpoints"].get("status", 0) <= 2
+
+
+def test_move(bench, services_number, pytestconfig):
+    result, record = bench("move", "site-2", services_number)
+    assert result.ok or pytestconfig.getoption("--bench-failure-rate")
+    if result.ok:
+        # every service is switched once on each site
+        assert record["endpoints"].get("standby") == record["endpoints"].get("active") == services_number
+
+
+def test_stop(bench, services_number, pytestconfig):
+    result, record = bench("stop", "site-1", services_number)
+    assert result.ok or pytestconfig.getoption("--bench-failure-rate")
+    if result.ok:
+        assert record["endpoints"].get("active") == services_number
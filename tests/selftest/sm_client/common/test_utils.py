@@ -9,6 +9,7 @@ test_config_wrong_env_token_path = os.path.abspath("tests/selftest/sm_client/res
 config_path_wrong_states = os.path.abspath("tests/selftest/sm_client/resources/config_test_wrong_states.yaml")
 config_path_correct_states = os.path.abspath("tests/selftest/sm_client/resources/config_test_correct_states.yaml")
 config_path_states_without_brackets = os.path.abspath("tests/selftest/sm_client/resources/config_test_states_without_brackets.yaml")
+test_config_pairs_path = os.path.abspath("tests/selftest/sm_client/resources/config_test_pairs.yaml")
 
 
 def pytest_namespace():
@@ -27,4 +28,11 @@ def args_init(config=None):
     args.command = "version"
     args.ignore_restrictions = False
     args.site = None
+    args.engine = None
+    args.pipeline = False
+    args.pair = None
+    args.journal = None
+    args.resume = None
+    args.trace_out = None
+    args.metrics_out = None
     return args
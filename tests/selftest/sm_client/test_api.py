@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from sm_client.api import DRSession, make_args, run_pairs
+from sm_client.data import settings
+from tests.selftest.sm_client.common.test_utils import *
+
+
+def mock_sm_process_service(site, service, site_cmd, no_wait=True, force=False):
+    """ Mock for site-manager: serv1 fails, other services are done """
+    if service == "site-manager":
+        services = {serv: {"module": "stateful", "after": [], "before": [], "sequence": ["standby", "active"],
+                           "timeout": 1, "allowedStandbyStateList": ["up"]} for serv in ("serv1", "serv2")}
+        return {"services": services}, True, 200
+    mode = "active" if site == "k8s-1" else "standby"
+    status = "failed" if service == "serv1" else "done"
+    return {"services": {service: {"healthz": "up", "mode": mode, "status": status}}}, True, 200
+
+
+def test_dr_sessions_in_parallel(mocker):
+    mocker.patch("sm_client.initialization.sm_process_service", side_effect=mock_sm_process_service)
+    mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
+    settings.current().service_results.clear()
+
+    sessions = {serv: DRSession(config=test_config_path, run_services=serv) for serv in ("serv1", "serv2")}
+    results = {}
+    threads = [threading.Thread(target=lambda serv=serv: results.update({serv: sessions[serv].run("active", "k8s-1")}))
+               for serv in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for session in sessions.values():
+        session.close()
+
+    assert not results["serv1"].ok and results["serv1"].failed == ("serv1",) and not results["serv1"].done
+    assert results["serv2"].ok and results["serv2"].done == ("serv2",) and not results["serv2"].failed
+    assert results["serv2"].services == ("serv2",) and "serv1" in results["serv2"].ignored
+    assert sessions["serv2"].call(lambda: list(settings.current().done_services)) == ["serv2"]
+    assert not settings.current().done_services and not settings.current().failed_services
+
+
+def test_dr_session_invalid_config():
+    result = DRSession(config="config_test_fake.yaml").run("status")
+    assert not result.ok and result.message == "Configuration is not valid"
+
+    with pytest.raises(TypeError):
+        make_args(unknown_option=True)
+
+
+def test_run_pairs(mocker):
+    import time
+
+    def mock_site_state(site, service, site_cmd, no_wait=True, force=False):
+        time.sleep(0.5)
+        return mock_sm_process_service(site, service, site_cmd)
+
+    mocker.patch("sm_client.initialization.sm_process_service", side_effect=mock_site_state)
+    mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
+    mocker.patch("sm_client.processing.sm_process_services_status", return_value=({}, False, None))
+    args = make_args(config=test_config_pairs_path)
+
+    start_time = time.monotonic()
+    results = run_pairs(args, "list")
+    assert time.monotonic() - start_time < 1
+    assert list(results) == ["pair-1", "pair-2"] and all(result.ok for result in results.values())
+    assert list(results["pair-1"].sm_dict.keys()) == ["k8s-1", "k8s-2"]
+    assert list(results["pair-2"].sm_dict.keys()) == ["k8s-3", "k8s-4"]
+
+    results = run_pairs(args, "status", pairs=["pair-2", "unknown"])
+    assert results["pair-2"].ok and results["pair-2"].services == ("serv1", "serv2")
+    assert not results["unknown"].ok and results["unknown"].message == "Configuration is not valid"
+
+    assert not DRSession(args).run("status").ok
+
+
+def test_smclient_run(mocker, capsys):
+    import smclient
+    from sm_client.initialization import init_and_check_config
+    mocker.patch("sm_client.initialization.sm_process_service", side_effect=mock_sm_process_service)
+    mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
+    mocker.patch("sm_client.processing.sm_process_services_status", return_value=({}, False, None))
+    init_and_check_config(args_init())
+    settings.current().service_results.clear()
+
+    # run keeps the old behaviour: prints results and exits, if procedure failed
+    assert smclient.run(cmd="list")
+    assert "Kubernetes services managed by site-manager: ['serv1', 'serv2']" in capsys.readouterr().out
+    with pytest.raises(SystemExit) as e:
+        smclient.run(["serv1"], "active", "k8s-1")
+    assert e.value.code == 1 and settings.current().failed_services == ["serv1"]
+    settings.current().service_results.clear()
@@ -0,0 +1,46 @@
+import json
+
+from sm_client import history
+from sm_client.api import DRSession
+
+
+def test_history(tmp_path):
+    history_file = tmp_path / "history.json"
+
+    # history is disabled
+    history.load_history(None)
+    history.record_duration("serv1", "active", 10)
+    assert history.get_expected_duration("serv1", "active") is None
+
+    # durations are collected as moving average and saved
+    history.load_history(str(history_file))
+    history.record_duration("serv1", "active", 10)
+    history.record_duration("serv1", "active", 20)
+    history.record_duration("serv1", "standby", 5)
+    history.save_history()
+    assert json.loads(history_file.read_text()) == {"serv1": {"active": 13.0, "standby": 5}}
+
+    # durations are loaded from file
+    history.load_history(str(history_file))
+    assert history.get_expected_duration("serv1", "active") == 13.0
+    assert history.get_expected_duration("serv2", "active") is None
+
+    # broken history file is ignored
+    history_file.write_text("broken")
+    history.load_history(str(history_file))
+    assert history.get_expected_duration("serv1", "active") is None
+    history.load_history(None)
+
+
+def test_history_per_session(tmp_path):
+    history_file = tmp_path / "history.json"
+    history_file.write_text(json.dumps({"serv1": {"active": 5}}))
+
+    session = DRSession()
+    session.call(history.load_history, str(history_file))
+    session.call(history.record_duration, "serv1", "standby", 3)
+    assert session.call(history.get_expected_duration, "serv1", "active") == 5
+    assert history.get_expected_duration("serv1", "active") is None
+    history.load_history(None)  # doesn't affect the session
+    session.call(history.save_history)
+    assert json.loads(history_file.read_text()) == {"serv1": {"active": 5, "standby": 3}}
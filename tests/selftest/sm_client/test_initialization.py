@@ -5,7 +5,7 @@ import pytest
 
 from sm_client.data import settings
 from sm_client.data.structures import *
-from sm_client.initialization import init_and_check_config
+from sm_client.initialization import init_and_check_config, sm_get_cluster_state
 from tests.selftest.sm_client.common.test_utils import *
 
 
@@ -45,10 +45,7 @@ def test_SMClusterState_init():
 def test_unexist_config_file_init():
     init_and_check_config(args_init())
 
-    with pytest.raises(SystemExit) as pytest_wrapped_e:
-        init_and_check_config(args_init("config_test_fake.yaml"))
-        assert pytest_wrapped_e.type == SystemExit
-        assert pytest_wrapped_e.value.code == 1
+    assert not init_and_check_config(args_init("config_test_fake.yaml"))
 
 
 def test_init_and_check_config(caplog):
@@ -93,7 +90,7 @@ def test_token_env_configuration(monkeypatch, caplog):
     # Check configuration
     args = args_init(config=test_config_env_token_path)
     assert init_and_check_config(args)
-    assert settings.sm_conf['k8s-2']['token'] == '12345'
+    assert settings.current().sm_conf['k8s-2']['token'] == '12345'
 
 
 def test_invalid_module_states_in_config(caplog):
@@ -116,3 +113,30 @@ def test_states_without_brackets_in_config(caplog):
     with caplog.at_level(logging.FATAL):
         assert not init_and_check_config(args)
         assert "Invalid states format for module 'custom_module'. Should be a list of states." in caplog.text
+
+
+def test_sm_get_cluster_state(mocker):
+    import time
+
+    def mock_sm_process_service(site, service, site_cmd):
+        if site == "k8s-1":  # unreachable site
+            time.sleep(5)
+            return {}, False, None
+        return {"services": {"serv1": {}}}, True, 200
+
+    init_and_check_config(args_init())
+    mocker.patch("sm_client.initialization.sm_process_service", side_effect=mock_sm_process_service)
+    settings.current().CLUSTER_STATE_GRACE = 0.1
+
+    start_time = time.monotonic()
+    sm_dict = sm_get_cluster_state(None, "k8s-2")
+    assert time.monotonic() - start_time < 1
+    assert sm_dict["k8s-2"]["status"] and sm_dict["k8s-2"]["services"] == {"serv1": {}}
+    assert sm_dict["k8s-2"]["response_time"] is not None
+    assert not sm_dict["k8s-1"]["status"] and sm_dict["k8s-1"]["response_time"] is None
+
+    settings.current().CLUSTER_STATE_TIMEOUT = 0.5
+    start_time = time.monotonic()
+    sm_dict = sm_get_cluster_state()
+    assert 0.5 <= time.monotonic() - start_time < 1
+    assert sm_dict["k8s-2"]["status"] and not sm_dict["k8s-1"]["status"]
@@ -0,0 +1,89 @@
+import json
+
+from sm_client.api import DRSession
+from sm_client.journal import Journal
+from tests.selftest.sm_client.common.test_utils import *
+
+
+def test_journal(tmp_path):
+    journal_file = tmp_path / "journal.jsonl"
+
+    # journal is disabled
+    journal = Journal()
+    journal.start("move", "k8s-1", ["serv1"])
+    journal.record_step("serv1", "k8s-2", "standby", True, "done")
+    journal.close(True)
+    assert not journal_file.exists()
+
+    journal = Journal(str(journal_file))
+    journal.start("move", "k8s-1", ["serv1", "serv2"])
+    journal.record_step("serv1", "k8s-2", "standby", True, "done")
+    journal.record_step("serv2", "k8s-2", "standby", False, "failed")
+    with open(journal_file, "a") as file:  # record is broken, when sm-client is killed
+        file.write('{"event":"step","serv')
+    start, steps = Journal.read(str(journal_file))
+    assert start["cmd"] == "move" and start["services"] == ["serv1", "serv2"] and len(steps) == 2
+
+    assert Journal(str(journal_file)).get_completed_steps("move", "k8s-1") == set()
+    resumed = Journal(str(journal_file), resume=True)
+    assert resumed.get_completed_steps("move", "k8s-1") == {("serv1", "k8s-2", "standby")}
+    assert resumed.get_completed_steps("move", "k8s-2") == set()
+
+
+def test_resume_procedure(mocker, tmp_path):
+    journal_file = tmp_path / "journal.jsonl"
+    failed_services = {"serv1"}
+
+    def mock_sm_process_service(site, service, site_cmd, no_wait=True, force=False):
+        if service == "site-manager":
+            services = {serv: {"module": "notstateful", "after": [], "before": [], "sequence": ["standby", "active"],
+                               "timeout": 1, "allowedStandbyStateList": ["up"]} for serv in ("serv1", "serv2")}
+            return {"services": services}, True, 200
+        status = "failed" if service in failed_services else "done"
+        return {"services": {service: {"healthz": "up", "mode": "active", "status": status}}}, True, 200
+
+    mocker.patch("sm_client.initialization.sm_process_service", side_effect=mock_sm_process_service)
+    process_service = mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
+    mocker.patch("sm_client.processing.sm_process_services_status", return_value=({}, False, None))
+
+    result = DRSession(config=test_config_path, journal=str(journal_file)).run("active", "k8s-1")
+    assert not result.ok and result.done == ("serv2",) and result.failed == ("serv1",)
+    records = [json.loads(line) for line in journal_file.read_text().splitlines()]
+    assert [record["event"] for record in records] == ["start", "step", "step", "end"]
+
+    # serv2 is verified with status request and isn't activated again
+    failed_services.clear()
+    process_service.reset_mock()
+    result = DRSession(config=test_config_path, resume=str(journal_file)).run("active", "k8s-1")
+    assert result.ok and set(result.done) == {"serv1", "serv2"}
+    activated = [call.args[1] for call in process_service.call_args_list if call.args[2] == "active"]
+    assert activated == ["serv1"]
+    records = [json.loads(line) for line in journal_file.read_text().splitlines()]
+    assert [record["event"] for record in records][4:] == ["resume", "step", "end"]
+
+    assert not DRSession(config=test_config_path, resume=str(tmp_path / "absent.jsonl")).run("active", "k8s-1").ok
+
+
+def test_resume_procedure_unhealthy(mocker, tmp_path):
+    journal_file = tmp_path / "journal.jsonl"
+    healthz = {"serv1": "up", "serv2": "up"}
+
+    def mock_sm_process_service(site, service, site_cmd, no_wait=True, force=False):
+        if service == "site-manager":
+            services = {serv: {"module": "notstateful", "after": [], "before": [], "sequence": ["standby", "active"],
+                               "timeout": 1, "allowedStandbyStateList": ["up"]} for serv in ("serv1", "serv2")}
+            return {"services": services}, True, 200
+        return {"services": {service: {"healthz": healthz[service], "mode": "active", "status": "done"}}}, True, 200
+
+    mocker.patch("sm_client.initialization.sm_process_service", side_effect=mock_sm_process_service)
+    process_service = mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
+    mocker.patch("sm_client.processing.sm_process_services_status", return_value=({}, False, None))
+
+    assert DRSession(config=test_config_path, journal=str(journal_file)).run("active", "k8s-1").ok
+
+    # serv2 is done in active mode, but it is not healthy anymore, so it is activated again
+    healthz["serv2"] = "down"
+    process_service.reset_mock()
+    DRSession(config=test_config_path, resume=str(journal_file)).run("active", "k8s-1")
+    activated = [call.args[1] for call in process_service.call_args_list if call.args[2] == "active"]
+    assert activated == ["serv2"]
@@ -0,0 +1,71 @@
+from sm_client.api import DRSession, make_result
+from sm_client.metrics import Metrics, format_labels
+from tests.selftest.sm_client.common.test_utils import *
+
+
+def test_format_labels():
+    assert format_labels() == ""
+    assert format_labels(service="serv1", site="k8s-1") == '{service="serv1",site="k8s-1"}'
+    assert format_labels(message='a "b"\\\n') == '{message="a \\"b\\"\\\\\\n"}'
+
+
+def test_metrics(tmp_path):
+    metrics_file = tmp_path / "sm_client.prom"
+
+    # metrics are disabled
+    metrics = Metrics()
+    metrics.observe_http("k8s-1", "status", 0.2)
+    metrics.export(make_result(True, "status", None), 1)
+    assert not metrics.http_requests and not metrics_file.exists()
+
+    metrics = Metrics(str(metrics_file))
+    metrics.observe_service("serv1", "k8s-1", "active", 12.5, True)
+    metrics.inc_polls("serv1", "k8s-1", "active")
+    metrics.inc_polls("serv1", "k8s-1", "active")
+    metrics.observe_http("k8s-1", "status", 0.2)
+    metrics.observe_http("k8s-1", "status", 3, retries=2)
+    metrics.export(make_result(False, "active", "k8s-1", services=["serv1"]), 15)
+
+    lines = metrics_file.read_text().splitlines()
+    assert 'sm_client_procedure_success{cmd="active",site="k8s-1"} 0' in lines
+    assert 'sm_client_procedure_duration_seconds{cmd="active",site="k8s-1"} 15.0' in lines
+    assert 'sm_client_service_duration_seconds{service="serv1",site="k8s-1",mode="active",status="ok"} 12.5' in lines
+    assert 'sm_client_service_polls_total{service="serv1",site="k8s-1",mode="active"} 2' in lines
+    assert 'sm_client_http_request_duration_seconds_bucket{site="k8s-1",endpoint="status",le="0.1"} 0' in lines
+    assert 'sm_client_http_request_duration_seconds_bucket{site="k8s-1",endpoint="status",le="0.25"} 1' in lines
+    assert 'sm_client_http_request_duration_seconds_bucket{site="k8s-1",endpoint="status",le="+Inf"} 2' in lines
+    assert 'sm_client_http_request_duration_seconds_count{site="k8s-1",endpoint="status"} 2' in lines
+    assert 'sm_client_http_retries_total{site="k8s-1"} 2' in lines
+    assert not (tmp_path / "sm_client.prom.tmp").exists()
+
+
+def test_procedure_metrics(mocker, tmp_path):
+    metrics_file = tmp_path / "sm_client.prom"
+    modes = {}  # {(url, service): mode}
+
+    def mock_io_make_http_json_request(url, token, cacert, body, use_auth=True, stats=None, timeout=None, sessions=None, breaker=None):
+        if not body:  # services list
+            services = {serv: {"module": "notstateful", "after": [], "before": [], "sequence": ["standby", "active"],
+                               "timeout": 1, "allowedStandbyStateList": ["up"]} for serv in ("serv1", "serv2")}
+            return True, {"services": services}, 200
+        services = body["run-service"] if isinstance(body["run-service"], list) else [body["run-service"]]
+        if body["procedure"] != "status":
+            modes.update({(url, serv): body["procedure"] for serv in services})
+        status = "failed" if body["procedure"] == "status" and services == ["serv2"] else "done"
+        return True, {"services": {serv: {"healthz": "up", "mode": modes.get((url, serv), "standby"),
+                                          "status": status} for serv in services}}, 200
+
+    mocker.patch("sm_client.utils.io_make_http_json_request", side_effect=mock_io_make_http_json_request)
+
+    result = DRSession(config=test_config_path, metrics_out=str(metrics_file)).run("standby", "k8s-1")
+    assert not result.ok
+
+    lines = metrics_file.read_text().splitlines()
+    assert 'sm_client_procedure_success{cmd="standby",site="k8s-1"} 0' in lines
+    assert 'sm_client_services{state="done"} 1' in lines
+    assert 'sm_client_services{state="failed"} 1' in lines
+    assert any(line.startswith('sm_client_service_duration_seconds{service="serv2",site="k8s-1",mode="standby",'
+                               'status="failed"}') for line in lines)
+    assert any(line.startswith('sm_client_http_request_duration_seconds_count{site="k8s-1",endpoint="standby"} ')
+               for line in lines)
+    assert any(line.startswith('sm_client_workers_peak{kind="threads"} ') for line in lines)
@@ -1,5 +1,7 @@
 import logging
 
+import pytest
+
 import smclient
 from sm_client.data import settings
 from sm_client.data.structures import SMClusterState, TopologicalSorter2
@@ -25,7 +27,7 @@ def create_sm_dict(stateful_services_deps: dict, notstateful_services_deps: dict
     """
     Function, that creates sm_dict with specified stateful and notstateful services
     """
-    settings.module_flow = [{"notstateful": ["standby"]}, {"stateful": None}, {"notstateful": ["active"]}]
+    settings.current().module_flow = [{"notstateful": ["standby"]}, {"stateful": None}, {"notstateful": ["active"]}]
     sm_dict = SMClusterState()
     sm_dict["k8s-1"] = {"services": {}, "status": True}
     sm_dict["k8s-2"] = {"services": {}, "status": True}
@@ -58,19 +60,21 @@ def create_sm_dict(stateful_services_deps: dict, notstateful_services_deps: dict
 
 def rerun_process_module_service(sm_dict, cmd, site):
     # Clear result lists
-    settings.done_services.clear()
-    settings.failed_services.clear()
-    settings.warned_services.clear()
-    settings.skipped_due_deps_services.clear()
+    settings.current().done_services.clear()
+    settings.current().failed_services.clear()
+    settings.current().warned_services.clear()
+    settings.current().skipped_due_deps_services.clear()
 
     # Run
     run_dr_or_site_procedure(sm_dict, cmd, site)
 
 
-def test_switchover_with_failed_services(mocker, caplog):
+@pytest.mark.parametrize("engine", settings.engines)
+def test_switchover_with_failed_services(mocker, caplog, engine):
     caplog.set_level(logging.INFO)
     smclient.args = args_init()
     init_and_check_config(args_init())
+    settings.current().ENGINE = engine
     caplog.set_level(logging.DEBUG)
     mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
     global service_failed_site
@@ -81,72 +85,74 @@ def test_switchover_with_failed_services(mocker, caplog):
     # Test when first notstateful service fails on standby site
     service_failed_site = {"ns-serv1": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "move", "k8s-1")
-    assert ["ns-serv1"] == settings.failed_services
-    assert [] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["ns-serv2", "serv1", "serv2"] == settings.skipped_due_deps_services
+    assert ["ns-serv1"] == settings.current().failed_services
+    assert [] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["ns-serv2", "serv1", "serv2"] == settings.current().skipped_due_deps_services
 
     # Test when second notstateful service fails on standby site
     service_failed_site = {"ns-serv2": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "move", "k8s-1")
-    assert ["ns-serv2"] == settings.failed_services
-    assert [] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["serv1", "serv2", "ns-serv1"] == settings.skipped_due_deps_services
+    assert ["ns-serv2"] == settings.current().failed_services
+    assert [] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["serv1", "serv2", "ns-serv1"] == settings.current().skipped_due_deps_services
 
     # Test when first stateful service fails on standby site
     service_failed_site = {"serv1": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "move", "k8s-1")
-    assert ["serv1"] == settings.failed_services
-    assert [] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["serv2", "ns-serv1", "ns-serv2"] == settings.skipped_due_deps_services
+    assert ["serv1"] == settings.current().failed_services
+    assert [] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["serv2", "ns-serv1", "ns-serv2"] == settings.current().skipped_due_deps_services
 
     # Test when second stateful service fails on standby site
     service_failed_site = {"serv2": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "move", "k8s-1")
-    assert ["serv2"] == settings.failed_services
-    assert ["serv1"] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["ns-serv1", "ns-serv2"] == settings.skipped_due_deps_services
+    assert ["serv2"] == settings.current().failed_services
+    assert ["serv1"] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["ns-serv1", "ns-serv2"] == settings.current().skipped_due_deps_services
 
     # Test when first stateful service fails on active site
     service_failed_site = {"serv1": ["k8s-1"]}
     rerun_process_module_service(sm_dict, "move", "k8s-1")
-    assert ["serv1"] == settings.failed_services
-    assert [] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["serv2", "ns-serv1", "ns-serv2"] == settings.skipped_due_deps_services
+    assert ["serv1"] == settings.current().failed_services
+    assert [] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["serv2", "ns-serv1", "ns-serv2"] == settings.current().skipped_due_deps_services
 
     # Test when second stateful service fails on active site
     service_failed_site = {"serv2": ["k8s-1"]}
     rerun_process_module_service(sm_dict, "move", "k8s-1")
-    assert ["serv2"] == settings.failed_services
-    assert ["serv1"] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["ns-serv1", "ns-serv2"] == settings.skipped_due_deps_services
+    assert ["serv2"] == settings.current().failed_services
+    assert ["serv1"] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["ns-serv1", "ns-serv2"] == settings.current().skipped_due_deps_services
 
     # Test when first notstateful services fails on active site
     service_failed_site = {"ns-serv1": ["k8s-1"]}
     rerun_process_module_service(sm_dict, "move", "k8s-1")
-    assert ["ns-serv1"] == settings.failed_services
-    assert ["serv1", "serv2"] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["ns-serv2"] == settings.skipped_due_deps_services
+    assert ["ns-serv1"] == settings.current().failed_services
+    assert ["serv1", "serv2"] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["ns-serv2"] == settings.current().skipped_due_deps_services
 
     # Test when second notstateful service fails on active site
     service_failed_site = {"ns-serv2": ["k8s-1"]}
     rerun_process_module_service(sm_dict, "move", "k8s-1")
-    assert ["ns-serv2"] == settings.failed_services
-    assert ["ns-serv1", "serv1", "serv2"] == settings.done_services
-    assert [] == settings.warned_services
-    assert [] == settings.skipped_due_deps_services
+    assert ["ns-serv2"] == settings.current().failed_services
+    assert ["ns-serv1", "serv1", "serv2"] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert [] == settings.current().skipped_due_deps_services
 
 
-def test_failover_with_failed_services(mocker, caplog):
+@pytest.mark.parametrize("engine", settings.engines)
+def test_failover_with_failed_services(mocker, caplog, engine):
     caplog.set_level(logging.INFO)
     smclient.args = args_init()
     init_and_check_config(args_init())
+    settings.current().ENGINE = engine
     caplog.set_level(logging.DEBUG)
     mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
     global service_failed_site
@@ -157,63 +163,63 @@ def test_failover_with_failed_services(mocker, caplog):
     # Test when second notstateful services fails on standby site
     service_failed_site = {"ns-serv2": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "stop", "k8s-2")
-    assert [] == settings.failed_services
-    assert ["ns-serv1", "serv1", "serv2"] == settings.done_services
-    assert ["ns-serv2"] == settings.warned_services
-    assert [] == settings.skipped_due_deps_services
+    assert [] == settings.current().failed_services
+    assert ["ns-serv1", "serv1", "serv2"] == settings.current().done_services
+    assert ["ns-serv2"] == settings.current().warned_services
+    assert [] == settings.current().skipped_due_deps_services
 
     # Test when all notstateful services fail on standby site
     service_failed_site = {"ns-serv1": ["k8s-2"], "ns-serv2": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "stop", "k8s-2")
-    assert [] == settings.failed_services
-    assert ["serv1", "serv2"] == settings.done_services
-    assert ["ns-serv1", "ns-serv2"] == settings.warned_services
-    assert [] == settings.skipped_due_deps_services
+    assert [] == settings.current().failed_services
+    assert ["serv1", "serv2"] == settings.current().done_services
+    assert ["ns-serv1", "ns-serv2"] == settings.current().warned_services
+    assert [] == settings.current().skipped_due_deps_services
 
     # Test when all stateful services fail on standby site
     service_failed_site = {"serv1": ["k8s-2"], "serv2": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "stop", "k8s-2")
-    assert [] == settings.failed_services
-    assert ["ns-serv1", "ns-serv2"] == settings.done_services
-    assert ["serv1", "serv2"] == settings.warned_services
-    assert [] == settings.skipped_due_deps_services
+    assert [] == settings.current().failed_services
+    assert ["ns-serv1", "ns-serv2"] == settings.current().done_services
+    assert ["serv1", "serv2"] == settings.current().warned_services
+    assert [] == settings.current().skipped_due_deps_services
 
     # Test when all services fail on standby site
     service_failed_site = {"ns-serv1": ["k8s-2"], "ns-serv2": ["k8s-2"], "serv1": ["k8s-2"], "serv2": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "stop", "k8s-2")
-    assert [] == settings.failed_services
-    assert [] == settings.done_services
-    assert ["ns-serv1", "ns-serv2", "serv1", "serv2"] == settings.warned_services
-    assert [] == settings.skipped_due_deps_services
+    assert [] == settings.current().failed_services
+    assert [] == settings.current().done_services
+    assert ["ns-serv1", "ns-serv2", "serv1", "serv2"] == settings.current().warned_services
+    assert [] == settings.current().skipped_due_deps_services
 
     # Test when first stateful service fails on active site and first notstateful service fails on standby site
     service_failed_site = {"serv1": ["k8s-1"], "ns-serv1": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "stop", "k8s-2")
-    assert ["serv1"] == settings.failed_services
-    assert [] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["serv2", "ns-serv1", "ns-serv2"] == settings.skipped_due_deps_services
+    assert ["serv1"] == settings.current().failed_services
+    assert [] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["serv2", "ns-serv1", "ns-serv2"] == settings.current().skipped_due_deps_services
 
     # Test when second stateful service fails on active site and first stateful service fails on standby site
     service_failed_site = {"serv2": ["k8s-1"], "serv1": ["k8s-2"]}
     rerun_process_module_service(sm_dict, "stop", "k8s-2")
-    assert ["serv2"] == settings.failed_services
-    assert [] == settings.done_services
-    assert ["serv1"] == settings.warned_services
-    assert ["ns-serv1", "ns-serv2"] == settings.skipped_due_deps_services
+    assert ["serv2"] == settings.current().failed_services
+    assert [] == settings.current().done_services
+    assert ["serv1"] == settings.current().warned_services
+    assert ["ns-serv1", "ns-serv2"] == settings.current().skipped_due_deps_services
 
     # Test when first notstateful service fails on standby site and second not stateful service fails on active site
     service_failed_site = {"ns-serv1": ["k8s-2"], "ns-serv2": ["k8s-1"]}
     rerun_process_module_service(sm_dict, "stop", "k8s-2")
-    assert ["ns-serv2"] == settings.failed_services
-    assert ["serv1", "serv2"] == settings.done_services
-    assert ["ns-serv1"] == settings.warned_services
-    assert [] == settings.skipped_due_deps_services
+    assert ["ns-serv2"] == settings.current().failed_services
+    assert ["serv1", "serv2"] == settings.current().done_services
+    assert ["ns-serv1"] == settings.current().warned_services
+    assert [] == settings.current().skipped_due_deps_services
 
     # Test when first notstateful service fails on both sites
     service_failed_site = {"ns-serv1": ["k8s-1", "k8s-2"]}
     rerun_process_module_service(sm_dict, "stop", "k8s-2")
-    assert ["ns-serv1"] == settings.failed_services
-    assert ["serv1", "serv2"] == settings.done_services
-    assert [] == settings.warned_services
-    assert ["ns-serv2"] == settings.skipped_due_deps_services
+    assert ["ns-serv1"] == settings.current().failed_services
+    assert ["serv1", "serv2"] == settings.current().done_services
+    assert [] == settings.current().warned_services
+    assert ["ns-serv2"] == settings.current().skipped_due_deps_services
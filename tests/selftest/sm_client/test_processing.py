@@ -1,21 +1,30 @@
+import asyncio
+import copy
 import functools
 import http.server
+import itertools
 import json
 import logging
 import ssl
 import threading
+import time
 from http import HTTPStatus
 
 import pytest
+import requests
 import urllib3.exceptions
 
 import smclient
+from sm_client import simulation, utils
 from sm_client.utils import io_make_http_json_request
 from sm_client.data import settings
 from sm_client.data.structures import *
 from sm_client.initialization import init_and_check_config
-from sm_client.processing import sm_process_service, thread_result_queue, process_ts_services, \
-    sm_poll_service_required_status, sm_process_service_with_polling, process_module_services
+from sm_client.processing import sm_process_service, process_ts_services, \
+    sm_poll_service_required_status, sm_process_service_with_polling, process_module_services, \
+    process_ts_services_async, sm_poll_service_required_status_async, ServiceScheduler, run_status_procedure, \
+    get_polling_delays, predict_makespan, init_service_scheduler, estimate_procedure_timing, ServicePipeline, \
+    StatusCache, init_status_cache, sm_process_services_status, AsyncPrioritySlots
 from tests.selftest.sm_client.common.test_utils import *
 
 
@@ -89,6 +98,107 @@ def test_io_http_json_request():
            ret is False
 
 
+def test_io_http_json_request_with_session_pool():
+    class JSONHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            body = json.dumps({"services": {}}).encode()
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('localhost', 0), JSONHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://localhost:{httpd.server_address[1]}/sitemanager"
+    try:
+        pool = utils.init_http_sessions({"site": {"url": url, "token": "XXX", "cacert": True}}, maxsize=2)
+        for _ in range(5):
+            ret, json_body, http_code = io_make_http_json_request(url, "XXX", True, sessions=pool)
+            assert ret and http_code == HTTPStatus.OK and json_body == {"services": {}}
+        assert pool.stats() == {"opened": 1, "reused": 4}
+
+        # pool with other maxsize doesn't affect sessions of running DR sessions, pool with the same one is shared
+        other_pool = utils.init_http_sessions({"site": {"url": url, "token": "XXX", "cacert": True}}, maxsize=3)
+        assert other_pool is not pool and pool.get(url, True, "XXX") is not None
+        assert utils.init_http_sessions({}, maxsize=2) is pool
+
+        # sessions are not used after closing
+        utils.close_http_sessions()
+        assert pool.get(url, True, "XXX") is None and other_pool.get(url, True, "XXX") is None
+        ret, _, http_code = io_make_http_json_request(url, "XXX", True, sessions=pool)
+        assert ret and http_code == HTTPStatus.OK
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_io_http_json_request_with_circuit_breaker(mocker):
+    url = "https://site-manager.k8s-1.legacy.qubership.org/sitemanager"
+    breaker = utils.init_circuit_breaker(threshold=2, cooldown=0.2)
+    get = mocker.patch("sm_client.utils.requests.Session.get",
+                       side_effect=requests.exceptions.ConnectionError("Connection refused"))
+    for _ in range(2):
+        assert io_make_http_json_request(url, retry=0, breaker=breaker) == (False, {}, False)
+    assert get.call_count == 2 and breaker.is_open(url)
+
+    # breaker with other limits doesn't drop state of endpoints, default breaker isn't affected
+    assert utils.init_circuit_breaker() is utils.circuit_breaker and not utils.circuit_breaker.is_open(url)
+    assert utils.init_circuit_breaker(threshold=2, cooldown=0.2) is breaker and breaker.is_open(url)
+
+    # requests fail immediately during cooldown
+    assert io_make_http_json_request(url, retry=0, breaker=breaker) == (False, {}, False)
+    assert get.call_count == 2
+
+    # one probe request after cooldown closes the circuit, if site answered
+    time.sleep(0.2)
+    fake_resp = mocker.Mock(status_code=HTTPStatus.OK)
+    fake_resp.json = mocker.Mock(return_value={"services": {}})
+    get.side_effect = None
+    get.return_value = fake_resp
+    assert io_make_http_json_request(url, retry=0, breaker=breaker) == (True, {"services": {}}, HTTPStatus.OK)
+    assert not breaker.is_open(url)
+
+
+def test_service_scheduler_limits():
+    lock = threading.Lock()
+    running = {"all": 0, "k8s-1": 0}
+    peak = {"all": 0, "k8s-1": 0}
+    started = []
+
+    def job(name, site, scheduler):
+        with scheduler.site_slot(site, name):
+            with lock:
+                started.append(name)
+                for key in ["all", site]:
+                    if key in running:
+                        running[key] += 1
+                        peak[key] = max(peak[key], running[key])
+            time.sleep(0.1)
+            with lock:
+                for key in ["all", site]:
+                    if key in running:
+                        running[key] -= 1
+        return name
+
+    scheduler = ServiceScheduler(max_workers=3, site_max_workers={"k8s-1": 1})
+    futures = [scheduler.submit(job, f"serv{i}", "k8s-1" if i % 2 else "k8s-2", scheduler, name=f"serv{i}")
+               for i in range(8)]
+    assert [future.result(timeout=10) for future in futures] == [f"serv{i}" for i in range(8)]
+    scheduler.shutdown()
+
+    assert peak["all"] == 3 and peak["k8s-1"] == 1
+    assert set(started[:3]) == {"serv0", "serv1", "serv2"}
+    assert scheduler.max_queue_depth == 5
+    assert scheduler.wait_times["serv7"] > 0
+
+
 def test_runservice_engine(caplog):
     init_and_check_config(args_init())
     def process_node(node):
@@ -97,7 +207,7 @@ def test_runservice_engine(caplog):
             node.service_status = False
         else:
             node.service_status = True
-        thread_result_queue.put(node)
+        settings.current().thread_result_queue.put(node)
 
     caplog.set_level(logging.INFO)
     ts = TopologicalSorter2()
@@ -111,11 +221,11 @@ def test_runservice_engine(caplog):
 
     process_ts_services(ts, process_node)
 
-    logging.info(f"failed_services: {settings.failed_services}")
-    logging.info(f"done_services: {settings.done_services}")
-    assert set(settings.done_services) == {'aa', 'cc', 'cc1'} \
-           and settings.failed_services == ['bb'] \
-           and settings.skipped_due_deps_services == ['bb1']
+    logging.info(f"failed_services: {settings.current().failed_services}")
+    logging.info(f"done_services: {settings.current().done_services}")
+    assert set(settings.current().done_services) == {'aa', 'cc', 'cc1'} \
+           and settings.current().failed_services == ['bb'] \
+           and settings.current().skipped_due_deps_services == ['bb1']
 
 
 def test_runservice_engine_with_dependencies(caplog):
@@ -126,7 +236,7 @@ def test_runservice_engine_with_dependencies(caplog):
             node.service_status = False
         else:
             node.service_status = True
-        thread_result_queue.put(node)
+        settings.current().thread_result_queue.put(node)
 
     caplog.set_level(logging.INFO)
     ts = TopologicalSorter2()
@@ -139,11 +249,120 @@ def test_runservice_engine_with_dependencies(caplog):
 
     process_ts_services(ts, process_node)
 
-    logging.info(f"failed_services: {settings.failed_services}")
-    logging.info(f"done_services: {settings.done_services}")
-    assert not settings.done_services \
-           and settings.failed_services == ['aa'] \
-           and set(settings.skipped_due_deps_services) == {'bb', 'cc'}
+    logging.info(f"failed_services: {settings.current().failed_services}")
+    logging.info(f"done_services: {settings.current().done_services}")
+    assert not settings.current().done_services \
+           and settings.current().failed_services == ['aa'] \
+           and set(settings.current().skipped_due_deps_services) == {'bb', 'cc'}
+
+
+def test_runservice_async_engine(caplog):
+    init_and_check_config(args_init())
+    async def process_node(node):
+        node = ServiceDRStatus({'services': {node: {}}})
+        node.service_status = node.service not in test_failed_services
+        return node
+
+    caplog.set_level(logging.INFO)
+    ts = TopologicalSorter2()
+    ts.add("aa")
+    ts.add("bb1", "bb")
+    ts.add("bb2", "bb1")
+    ts.add("cc")
+    ts.add("cc1", "cc")
+    test_failed_services = ['bb']
+    ts.prepare()
+
+    process_ts_services_async(ts, process_node)
+
+    assert set(settings.current().done_services) == {'aa', 'cc', 'cc1'} \
+           and settings.current().failed_services == ['bb'] \
+           and settings.current().skipped_due_deps_services == ['bb1', 'bb2']
+
+
+def test_critical_path_priorities(caplog):
+    init_and_check_config(args_init())
+    started = []
+
+    def process_node(node):
+        started.append(node)
+        settings.current().thread_result_queue.put(ServiceDRStatus({'services': {node: {}}}))
+
+    async def process_node_async(node):
+        started.append(node)
+        return ServiceDRStatus({'services': {node: {}}})
+
+    # short chain: aa -> aa1, long chain: bb -> bb1 -> bb2
+    ts = TopologicalSorter2()
+    ts.add("aa")
+    ts.add("aa1", "aa")
+    ts.add("bb")
+    ts.add("bb1", "bb")
+    ts.add("bb2", "bb1")
+    graph = ServiceGraph.from_sorter(ts)
+    durations = {"aa": 1, "aa1": 1, "bb": 1, "bb1": 1, "bb2": 1}
+    priorities = {service: -length for service, length in graph.critical_path_lengths(durations).items()}
+
+    init_service_scheduler(max_workers=1)
+    process_ts_services(graph, process_node, priorities=priorities)
+    assert started[0] == "bb"
+    started.clear()
+    process_ts_services_async(graph, process_node_async, priorities=priorities)
+    assert started[0] == "bb"
+    init_service_scheduler()
+
+    assert predict_makespan(graph, durations) == 3
+    assert predict_makespan(graph, durations, max_workers=1) == 5
+    assert predict_makespan(graph, {"aa": 10, "bb": 1, "bb1": 1, "bb2": 1}, max_workers=2) == 10
+
+
+def test_async_priority_slots_cancelled_waiter():
+    async def hold(slots, priority, started, release):
+        async with slots.slot(priority):
+            started.append(priority)
+            await release.wait()
+
+    async def scenario():
+        slots = AsyncPrioritySlots(1)
+        started = []
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(slots, 0, started, release))
+        await asyncio.sleep(0)
+        # waiter with the highest priority gives up before the slot is released
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(hold(slots, -1, started, release), 0.01)
+        waiter = asyncio.create_task(hold(slots, 1, started, release))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.wait_for(asyncio.gather(holder, waiter), 1)
+        # the slot isn't lost and is available again
+        async with slots.slot():
+            pass
+        return started
+
+    assert asyncio.run(scenario()) == [0, 1]
+
+
+def test_sm_poll_service_required_status_async(mocker, caplog):
+    init_and_check_config(args_init())
+    caplog.set_level(logging.INFO)
+
+    test_resp = {'services': {'serv1': {'healthz': 'up', 'mode': 'active', 'status': 'done'}}}
+    mocker.patch("sm_client.processing.sm_process_service", return_value=(test_resp, True, HTTPStatus.OK))
+    sm_dict = SMClusterState()
+    sm_dict["k8s-1"] = {"services": {"serv1": {"timeout": 100}}}
+    with caplog.at_level(logging.INFO):
+        caplog.clear()
+        dr_status = asyncio.run(sm_poll_service_required_status_async("k8s-1", "serv1", "active", sm_dict))
+        assert dr_status.is_ok() and "Expected state" in caplog.text
+
+    test_resp = {'services': {'serv1': {'healthz': 'down', 'mode': 'active', 'status': 'running'}}}
+    mocker.patch("sm_client.processing.sm_process_service", return_value=(test_resp, True, HTTPStatus.OK))
+    sm_dict["k8s-1"] = {"services": {"serv1": {"timeout": 1}}}
+    with caplog.at_level(logging.INFO):
+        caplog.clear()
+        dr_status = asyncio.run(sm_poll_service_required_status_async("k8s-1", "serv1", "active", sm_dict))
+        assert not dr_status.is_ok() and "Timeout expired" in caplog.text
 
 
 def test_sm_poll_service_required_status(mocker, caplog):
@@ -164,7 +383,7 @@ def test_sm_poll_service_required_status(mocker, caplog):
     with caplog.at_level(logging.INFO):
         caplog.clear()
         dr_status = sm_poll_service_required_status("k8s-1", "serv1", "active", sm_dict)
-        assert f"{settings.SERVICE_DEFAULT_TIMEOUT} seconds left until timeout" in caplog.text
+        assert f"{settings.current().SERVICE_DEFAULT_TIMEOUT} seconds left until timeout" in caplog.text
         assert dr_status.is_ok()
 
     # service specific timeout
@@ -234,6 +453,112 @@ def test_sm_poll_service_required_status(mocker, caplog):
                "Force mode enabled. Service healthz ignored" in caplog.text
 
 
+def test_status_cache(mocker):
+    init_and_check_config(args_init())
+    clock = simulation.VirtualClock()
+    mocker.patch.object(settings.current(), "clock", clock)
+    cache = StatusCache(ttl=0.2, maxsize=2)
+    done = {'healthz': 'up', 'mode': 'active', 'status': 'done'}
+    cache.put("k8s-1", "serv1", {'services': {'serv1': done}})
+    cache.put("k8s-1", "serv2", {'services': {'serv2': dict(done, status='running')}})  # not finished
+    assert cache.get("k8s-1", "serv1") == {'services': {'serv1': done}}
+    assert cache.get("k8s-1", "serv2") is None
+    cache.put("k8s-1", "serv3", {'services': {'serv3': done}})
+    cache.put("k8s-2", "serv1", {'services': {'serv1': done}})  # the least recently used is evicted
+    assert cache.get("k8s-1", "serv1") is None and cache.get("k8s-1", "serv3")
+    clock.advance(0.2)  # entries expire in time of the run clock
+    assert cache.get("k8s-1", "serv3") is None
+    assert (cache.hits, cache.misses) == (2, 3)
+
+    # status requests are cached, procedure request invalidates service
+    init_status_cache(ttl=10)
+    fake_resp = mocker.Mock(status_code=HTTPStatus.OK)
+    fake_resp.json = mocker.Mock(return_value={'services': {'serv1': done, 'serv2': done}})
+    post = mocker.patch("sm_client.utils.requests.Session.post", return_value=fake_resp)
+    assert sm_process_service("k8s-1", "serv1", "status")[1]
+    assert sm_process_service("k8s-1", "serv1", "status") == ({'services': {'serv1': done}}, True, HTTPStatus.OK)
+    assert post.call_count == 1
+    assert sm_process_services_status("k8s-1", ["serv1", "serv2"])[1]
+    assert post.call_args.kwargs["json"]["run-service"] == ["serv2"]
+    sm_process_service("k8s-1", "serv1", "standby")
+    sm_process_service("k8s-1", "serv1", "status")
+    assert post.call_count == 4
+    init_status_cache()
+
+
+def test_get_polling_delays(mocker):
+    init_and_check_config(args_init())
+    mocker.patch("sm_client.processing.random.uniform", side_effect=lambda low, high: high)
+    sm_dict = SMClusterState()
+    sm_dict["k8s-1"] = {"services": {"serv1": {"timeout": 100},
+                                     "serv2": {"timeout": 100, "pollingInitialDelay": 2, "pollingMaxDelay": 5}}}
+
+    # default delays from configuration
+    delays = get_polling_delays("k8s-1", "serv1", "active", sm_dict)
+    assert list(itertools.islice(delays, 6)) == [1, 2, 4, 8, 15, 15]
+
+    # delays specified in CR
+    delays = get_polling_delays("k8s-1", "serv2", "active", sm_dict)
+    assert list(itertools.islice(delays, 4)) == [2, 4, 5, 5]
+
+    # the first delay is seeded from history
+    mocker.patch("sm_client.processing.history.get_expected_duration", return_value=50)
+    delays = get_polling_delays("k8s-1", "serv1", "active", sm_dict)
+    assert list(itertools.islice(delays, 3)) == [45, 1, 2]
+
+
+def test_sm_poll_service_required_status_long_poll(mocker, caplog):
+    init_and_check_config(args_init())
+    caplog.set_level(logging.DEBUG)
+    running_resp = {'services': {'serv1': {'healthz': 'down', 'mode': 'active', 'status': 'running'}}, 'long-poll': True}
+    done_resp = {'services': {'serv1': {'healthz': 'up', 'mode': 'active', 'status': 'done'}}, 'long-poll': True}
+    mock_wait = mocker.patch("sm_client.processing.sm_wait_service_status",
+                             side_effect=[(running_resp, True, 200), (done_resp, True, 200)])
+    mock_process = mocker.patch("sm_client.processing.sm_process_service", return_value=(done_resp, True, 200))
+    mock_sleep = mocker.patch("sm_client.processing.time.sleep")
+    sm_dict = SMClusterState()
+    sm_dict["k8s-1"] = {"services": {"serv1": {"timeout": 100}}, "features": ["long-poll"]}
+
+    # site-manager waits for the end of procedure, sm-client doesn't sleep between requests
+    assert sm_poll_service_required_status("k8s-1", "serv1", "active", sm_dict).is_ok()
+    assert mock_wait.call_args_list[0].args == ("k8s-1", "serv1", "active", settings.current().LONG_POLL_TIMEOUT)
+    assert mock_wait.call_count == 2 and not mock_process.called and not mock_sleep.called
+
+    # site-manager ignores long-poll request, usual polling is used
+    mock_wait.side_effect = [({'services': running_resp['services']}, True, 200)]
+    assert sm_poll_service_required_status("k8s-1", "serv1", "active", sm_dict).is_ok()
+    assert mock_process.call_count == 1 and mock_sleep.call_count == 1
+    assert "doesn't support long-poll" in caplog.text
+
+    # long-poll is not used, if site-manager doesn't declare it
+    mock_wait.reset_mock()
+    sm_dict["k8s-1"] = {"services": {"serv1": {"timeout": 100}}}
+    assert sm_poll_service_required_status("k8s-1", "serv1", "active", sm_dict).is_ok()
+    assert not mock_wait.called
+
+
+def test_sm_poll_service_required_status_long_poll_unhealthy(mocker):
+    init_and_check_config(args_init())
+    mocker.patch("sm_client.processing.random.uniform", side_effect=lambda low, high: high)
+    # site-manager answers long-poll request immediately, because procedure is done, but healthz isn't expected
+    done_resp = {'services': {'serv1': {'healthz': '--', 'mode': 'active', 'status': 'done'}}, 'long-poll': True}
+    requests_count = itertools.count(1)
+
+    def mock_wait_service_status(site, service, mode, wait_timeout):
+        assert next(requests_count) < 100, "polling doesn't wait between requests"
+        return copy.deepcopy(done_resp), True, 200
+
+    mock_wait = mocker.patch("sm_client.processing.sm_wait_service_status", side_effect=mock_wait_service_status)
+    mocker.patch.object(settings.current(), "clock", simulation.VirtualClock())
+    sm_dict = SMClusterState()
+    sm_dict["k8s-1"] = {"services": {"serv1": {"timeout": 100}}, "features": ["long-poll"]}
+
+    assert not sm_poll_service_required_status("k8s-1", "serv1", "active", sm_dict).is_ok()
+    # backoff delays are used between requests: 1, 2, 4, 8, 15, ... seconds till timeout
+    assert mock_wait.call_count == 11
+    assert settings.current().clock.monotonic() == 100
+
+
 def test_sm_process_service_with_polling(mocker, caplog):
     smclient.args = args_init()
     init_and_check_config(args_init())
@@ -255,9 +580,9 @@ def test_sm_process_service_with_polling(mocker, caplog):
     with caplog.at_level(logging.INFO):
         caplog.clear()
         sm_process_service_with_polling("serv1", "k8s-1", "move", sm_dict)
-        service_response = thread_result_queue.get()
+        service_response = settings.current().thread_result_queue.get()
         service_response.sortout_service_results()
-        assert 'serv1' in settings.failed_services
+        assert 'serv1' in settings.current().failed_services
         assert "Service serv1 failed on k8s-1, skipping it on another site" in caplog.text
 
     # timeout expired fail
@@ -271,9 +596,9 @@ def test_sm_process_service_with_polling(mocker, caplog):
     with caplog.at_level(logging.INFO):
         caplog.clear()
         sm_process_service_with_polling("serv2", "k8s-1", "active", sm_dict)
-        service_response = thread_result_queue.get()
+        service_response = settings.current().thread_result_queue.get()
         service_response.sortout_service_results()
-        assert 'serv2' in settings.failed_services
+        assert 'serv2' in settings.current().failed_services
 
     # standby with  allowedStandbyStateList=down
     test_resp = {'services': {'serv3': {'healthz': 'down', 'mode': 'standby', 'status': 'done'}}}
@@ -289,9 +614,9 @@ def test_sm_process_service_with_polling(mocker, caplog):
     with caplog.at_level(logging.INFO):
         caplog.clear()
         sm_process_service_with_polling("serv3", "k8s-1", "standby", sm_dict)
-        service_response = thread_result_queue.get()
+        service_response = settings.current().thread_result_queue.get()
         service_response.sortout_service_results()
-        assert 'serv3' in settings.done_services
+        assert 'serv3' in settings.current().done_services
 
     # switchover with  allowedStandbyStateList=down
     def condition(*args, **kwargs):
@@ -319,9 +644,9 @@ def test_sm_process_service_with_polling(mocker, caplog):
     with caplog.at_level(logging.INFO):
         caplog.clear()
         sm_process_service_with_polling("serv4", "k8s-2", "move", sm_dict)
-        service_response = thread_result_queue.get()
+        service_response = settings.current().thread_result_queue.get()
         service_response.sortout_service_results()
-        assert 'serv4' in settings.done_services
+        assert 'serv4' in settings.current().done_services
 
     # no response from service
     # to test fix https://github.com/Netcracker/DRNavigator/pull/183
@@ -334,9 +659,67 @@ def test_sm_process_service_with_polling(mocker, caplog):
     with caplog.at_level(logging.INFO):
         caplog.clear()
         sm_process_service_with_polling("serv2", "k8s-1", "active", sm_dict)
-        service_response = thread_result_queue.get()
+        service_response = settings.current().thread_result_queue.get()
         service_response.sortout_service_results()
-        assert 'serv2' in settings.failed_services
+        assert 'serv2' in settings.current().failed_services
+
+def test_run_status_procedure(mocker):
+    init_and_check_config(args_init())
+    requested = []
+
+    def mock_io_make_http_json_request(url, token, verify, http_body, use_auth=True, stats=None, timeout=None, sessions=None, breaker=None):
+        requested.append((url, http_body["run-service"]))
+        if "k8s-2" in url:  # site-manager doesn't support list of services
+            return False, {"message": "run-service value should be defined and have String type"}, 400
+        return True, {"services": {serv: {'healthz': 'up', 'mode': 'active', 'status': 'done'}
+                                   for serv in http_body["run-service"] if serv != "serv3"}}, 200
+
+    def mock_sm_process_service(site, service, site_cmd, no_wait=True, force=False):
+        return {"services": {service: {'healthz': 'up', 'mode': 'standby', 'status': 'done'}}}, True, 200
+
+    mocker.patch("sm_client.utils.io_make_http_json_request", side_effect=mock_io_make_http_json_request)
+    mock_process = mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
+    sm_dict = SMClusterState()
+    sm_dict["k8s-1"] = {"services": {serv: {} for serv in ["serv1", "serv2", "serv3"]}, "status": True}
+    sm_dict["k8s-2"] = {"services": {serv: {} for serv in ["serv1", "serv2", "serv3"]}, "status": True}
+
+    settings.current().STATUS_BATCH_SIZE = 2
+    run_status_procedure(sm_dict, ["serv1", "serv2", "serv3"])
+    assert sorted(services for url, services in requested if "k8s-1" in url) == [["serv1", "serv2"], ["serv3"]]
+    # Per service requests are used only for missed service and site, that doesn't support bulk status
+    assert sorted((call.args[0], call.args[1]) for call in mock_process.call_args_list) == \
+           [("k8s-1", "serv3"), ("k8s-2", "serv1"), ("k8s-2", "serv2"), ("k8s-2", "serv3")]
+    assert [sm_dict["k8s-1"]["services"][serv]["status"].mode for serv in ["serv1", "serv2", "serv3"]] == \
+           ["active", "active", "standby"]
+    assert all(sm_dict["k8s-2"]["services"][serv]["status"].mode == "standby" for serv in ["serv1", "serv2", "serv3"])
+    settings.current().STATUS_BATCH_SIZE = 0
+
+
+def test_run_status_procedure_different_services(mocker):
+    init_and_check_config(args_init())
+    requested = []
+
+    def mock_io_make_http_json_request(url, token, verify, http_body, use_auth=True, stats=None, timeout=None, sessions=None, breaker=None):
+        requested.append((url, http_body["run-service"]))
+        return True, {"services": {serv: {'healthz': 'up', 'mode': 'active', 'status': 'done'}
+                                   for serv in http_body["run-service"]}}, 200
+
+    mocker.patch("sm_client.utils.io_make_http_json_request", side_effect=mock_io_make_http_json_request)
+    mock_process = mocker.patch("sm_client.processing.sm_process_service")
+    sm_dict = SMClusterState()
+    sm_dict["k8s-1"] = {"services": {"serv1": {}, "serv2": {}}, "status": True}
+    sm_dict["k8s-2"] = {"services": {"serv2": {}, "serv3": {}}, "status": True}
+
+    run_status_procedure(sm_dict, ["serv1", "serv2", "serv3"])
+    # every site gets only its own services
+    assert sorted((url, services) for url, services in requested) == \
+           [(settings.current().sm_conf["k8s-1"]["url"], ["serv1", "serv2"]),
+            (settings.current().sm_conf["k8s-2"]["url"], ["serv2", "serv3"])]
+    mock_process.assert_not_called()
+    assert sm_dict["k8s-1"]["services"]["serv2"]["status"].mode == "active"
+    assert sm_dict["k8s-1"]["services"]["serv3"]["status"] is False
+    assert sm_dict["k8s-2"]["services"]["serv1"]["status"] is False
+
 
 def test_process_module_services(mocker, caplog):
     caplog.set_level(logging.INFO)
@@ -350,7 +733,7 @@ def test_process_module_services(mocker, caplog):
 
     mocker.patch("sm_client.utils.requests.Session.post", return_value=fake_resp)
 
-    settings.done_services.clear()
+    settings.current().done_services.clear()
     sm_dict = SMClusterState()
     sm_dict["k8s-1"] = {
         "services": {
@@ -369,11 +752,37 @@ def test_process_module_services(mocker, caplog):
     sm_dict.globals = {"stateful": {"ts": ts}}
 
     process_module_services("stateful", "", "stop", "k8s-1", sm_dict)
-    assert "serv1" in settings.done_services
+    assert "serv1" in settings.current().done_services
 
-    settings.done_services.clear()
+    settings.current().done_services.clear()
     process_module_services("stateful", "", "active", "k8s-2", sm_dict)
-    assert "serv1" in settings.done_services
+    assert "serv1" in settings.current().done_services
+
+
+def test_estimate_procedure_timing(mocker):
+    init_and_check_config(args_init())
+    mocker.patch.dict(settings.current().history.durations, {"serv1": {"standby": 5.0, "active": 10.0}})
+    sm_dict = SMClusterState()
+    for site in ["k8s-1", "k8s-2"]:
+        sm_dict[site] = {"services": {"serv1": {"timeout": 100, "sequence": ['standby', 'active']},
+                                      "serv2": {"timeout": 50, "sequence": ['standby', 'active']},
+                                      "serv3": {"timeout": 30, "sequence": ['active', 'standby']}},
+                         "status": True}
+    ts = TopologicalSorter2()
+    ts.add("serv1")
+    ts.add("serv2")
+    ts.add("serv3", "serv1")
+    sm_dict.globals = {"notstateful": {"ts": None}, "stateful": {"ts": ts}}
+
+    report = estimate_procedure_timing(sm_dict, "move", "k8s-1")
+    assert [[service["service"] for service in stage["services"]] for stage in report["stages"]] == \
+           [["serv1", "serv2"], ["serv3"]]
+    assert report["stages"][0]["services"][0]["operations"] == [
+        {"site": "k8s-2", "mode": "standby", "expected": 5.0, "worst": 100, "history": True},
+        {"site": "k8s-1", "mode": "active", "expected": 10.0, "worst": 100, "history": True}]
+    assert [operation["site"] for operation in report["stages"][1]["services"][0]["operations"]] == ["k8s-1", "k8s-2"]
+    assert (report["stages"][0]["expected"], report["stages"][0]["worst"]) == (100, 200)
+    assert (report["expected"], report["worst"], report["predicted"]) == (160, 260, 100)
 
 
 def test_process_module_services_with_failed_service(mocker, caplog):
@@ -407,13 +816,13 @@ def test_process_module_services_with_failed_service(mocker, caplog):
     ts.prepare()
     sm_dict.globals = {"stateful": {"ts": ts}}
 
-    settings.done_services.clear()
-    settings.failed_services.clear()
-    settings.skipped_due_deps_services.clear()
+    settings.current().done_services.clear()
+    settings.current().failed_services.clear()
+    settings.current().skipped_due_deps_services.clear()
     process_module_services("stateful", "", "move", "k8s-1", sm_dict)
-    assert ["serv1"] == settings.failed_services
-    assert ["serv2"] == settings.done_services
-    assert [] == settings.skipped_due_deps_services
+    assert ["serv1"] == settings.current().failed_services
+    assert ["serv2"] == settings.current().done_services
+    assert [] == settings.current().skipped_due_deps_services
 
     # Check, when worked service depends on problem one
     ts = TopologicalSorter2()
@@ -421,13 +830,13 @@ def test_process_module_services_with_failed_service(mocker, caplog):
     ts.prepare()
     sm_dict.globals = {"stateful": {"ts": ts}}
 
-    settings.done_services.clear()
-    settings.failed_services.clear()
-    settings.skipped_due_deps_services.clear()
+    settings.current().done_services.clear()
+    settings.current().failed_services.clear()
+    settings.current().skipped_due_deps_services.clear()
     process_module_services("stateful", "", "move", "k8s-1", sm_dict)
-    assert [] == settings.done_services
-    assert ["serv1"] == settings.failed_services
-    assert ["serv2"] == settings.skipped_due_deps_services
+    assert [] == settings.current().done_services
+    assert ["serv1"] == settings.current().failed_services
+    assert ["serv2"] == settings.current().skipped_due_deps_services
 
     # Check, when problem service depends on worked one
     ts = TopologicalSorter2()
@@ -435,10 +844,56 @@ def test_process_module_services_with_failed_service(mocker, caplog):
     ts.prepare()
     sm_dict.globals = {"stateful": {"ts": ts}}
 
-    settings.done_services.clear()
-    settings.failed_services.clear()
-    settings.skipped_due_deps_services.clear()
+    settings.current().done_services.clear()
+    settings.current().failed_services.clear()
+    settings.current().skipped_due_deps_services.clear()
     process_module_services("stateful", "", "move", "k8s-1", sm_dict)
-    assert ["serv1"] == settings.failed_services
-    assert ["serv2"] == settings.done_services
-    assert [] == settings.skipped_due_deps_services
+    assert ["serv1"] == settings.current().failed_services
+    assert ["serv2"] == settings.current().done_services
+    assert [] == settings.current().skipped_due_deps_services
+
+
+def test_service_pipeline(mocker, caplog):
+    def mock_sm_process_service(site, service, site_cmd, no_wait=True, force=False):
+        status = 'failed' if service == 'serv1' and site == 'k8s-1' else 'done'
+        return {"services": {service: {'healthz': 'up', 'mode': site_cmd, 'status': status}}}, True, 200
+
+    def make_response(service):
+        return ServiceDRStatus({'services': {service: {'healthz': 'up', 'mode': 'standby', 'status': 'done'}}})
+
+    caplog.set_level(logging.INFO)
+    init_and_check_config(args_init())
+    mocker.patch("sm_client.processing.sm_process_service", side_effect=mock_sm_process_service)
+
+    sm_dict = SMClusterState()
+    for site in ["k8s-1", "k8s-2"]:
+        sm_dict[site] = {"services": {serv: {"timeout": 1, "sequence": ['standby', 'active'],
+                                             "allowedStandbyStateList": "up"} for serv in ["serv1", "serv2", "serv3"]},
+                         "status": True}
+    ts = TopologicalSorter2()
+    ts.add("serv2", "serv1")
+    ts.add("serv3", "serv2")
+
+    # standby step of successor starts, when standby step of predecessor is done
+    pipeline = ServicePipeline(ts, "k8s-1", "move", sm_dict)
+    assert [(serv, index, step.site) for serv, index, step in pipeline.get_ready()] == [("serv1", 0, "k8s-2")]
+    pipeline.done("serv1", 0, make_response("serv1"))
+    assert [(serv, index, step.site) for serv, index, step in pipeline.get_ready()] == \
+           [("serv1", 1, "k8s-1"), ("serv2", 0, "k8s-2")]
+    pipeline.done("serv2", 0, make_response("serv2"))
+    assert [(serv, index) for serv, index, _ in pipeline.get_ready()] == [("serv3", 0)]
+
+    # active step of serv1 fails, so rest steps of dependent services are skipped
+    for engine in settings.engines:
+        settings.current().done_services.clear()
+        settings.current().failed_services.clear()
+        settings.current().skipped_due_deps_services.clear()
+        settings.current().PIPELINE = True
+        settings.current().ENGINE = engine
+        sm_dict.globals = {"stateful": {"ts": ts}}
+        process_module_services("stateful", "", "move", "k8s-1", sm_dict)
+        assert settings.current().failed_services == ["serv1"]
+        assert set(settings.current().skipped_due_deps_services) == {"serv2", "serv3"}
+        assert settings.current().done_services == []
+    settings.current().PIPELINE = False
+    settings.current().ENGINE = "threading"
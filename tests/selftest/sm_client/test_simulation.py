@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from sm_client import simulation
+from sm_client.api import DRSession
+from tests.selftest.sm_client.common.test_utils import *
+
+
+def test_load_model(tmp_path, caplog):
+    assert simulation.load_model() == simulation.SimulationModel()
+    assert simulation.load_model(str(tmp_path / "missing.yaml")) is None
+
+    model_file = tmp_path / "model.yaml"
+    model_file.write_text("wrong_key: 1\n")
+    assert simulation.load_model(str(model_file)) is None
+    assert "Supported keys" in caplog.text
+
+    model_file.write_text("durations:\n  serv1:\n    active: 5\ndefault_duration: 10\nseed: 3\n")
+    model = simulation.load_model(str(model_file), services_number=20)
+    assert model.durations == {"serv1": {"active": 5}}
+    assert model.default_duration == 10 and model.seed == 3
+    assert model.services == simulation.make_synthetic_services(20, seed=3)
+
+
+def test_make_synthetic_services():
+    services = simulation.make_synthetic_services(100)
+    assert len(services) == 100
+    assert all(not services[f"serv{i}"]["after"] for i in range(10))
+    for i in range(10, 100):
+        assert services[f"serv{i}"]["after"]
+        assert all(int(dep[4:]) // 10 == i // 10 - 1 for dep in services[f"serv{i}"]["after"])
+
+
+def test_virtual_clock():
+    clock = simulation.VirtualClock()
+
+    async def wait_all():
+        await asyncio.gather(asyncio.sleep(100), asyncio.sleep(300), asyncio.to_thread(time.sleep, 0.01))
+        await asyncio.wait_for(asyncio.sleep(50), timeout=600)
+        return clock.monotonic()
+
+    start_time = time.monotonic()
+    assert clock.run(wait_all()) == 350
+    assert time.monotonic() - start_time < 5
+
+
+def test_simulate_procedure():
+    services = {f"serv{i}": {"name": f"serv{i}", "module": "notstateful", "after": [f"serv{i - 1}"] if i else [],
+                             "before": [], "sequence": ["standby", "active"], "allowedStandbyStateList": ["up"],
+                             "timeout": 600} for i in range(3)}
+    model = simulation.SimulationModel(services=services, durations={"serv1": {"standby": 100, "active": 200}},
+                                       default_duration=10)
+
+    start_time = time.monotonic()
+    with DRSession(config=test_config_path) as session:
+        result = session.simulate("move", "k8s-2", model)
+    assert time.monotonic() - start_time < 30
+
+    assert result.ok and sorted(result.done) == ["serv0", "serv1", "serv2"]
+    report = result.simulation
+    assert report["procedure"] == "move" and report["site"] == "k8s-2"
+    assert len(report["operations"]) == 6
+    assert report["requests"] > 6
+    # services are processed in dependency order: standby on k8s-1, then active on k8s-2
+    assert report["duration"] >= 10 + 10 + 100 + 200 + 10 + 10
+    operations = {(operation["service"], operation["site"]): operation for operation in report["operations"]}
+    assert operations[("serv0", "k8s-1")]["mode"] == "standby"
+    assert operations[("serv0", "k8s-2")]["mode"] == "active"
+    assert operations[("serv1", "k8s-1")]["done"] - operations[("serv1", "k8s-1")]["start"] == 100
+    assert operations[("serv2", "k8s-1")]["start"] >= operations[("serv1", "k8s-2")]["observed"]
+    assert all(operation["observed"] >= operation["done"] for operation in report["operations"])
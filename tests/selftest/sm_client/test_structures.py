@@ -1,3 +1,5 @@
+import threading
+
 import pytest
 
 from sm_client.data.structures import *
@@ -44,9 +46,30 @@ def test_make_ignored_services():
     assert set(ignore3) == {'serv1', 'serv2', 'serv3', 'serv4'}
 
 
+def test_SMClusterState_index():
+    sm_dict = SMClusterState(
+        {"site1": {"services": {"serv1": {"module": "stateful"}, "serv2": {"module": "custom"}, "serv3": {}}},
+         "site2": {"services": {"serv1": {"module": "stateful"}, "serv4": {"module": "stateful"}}}})
+    assert sm_dict.get_services_list_for_ok_site() == ["serv1", "serv2", "serv3", "serv4"]
+    assert sm_dict.get_module_services("site2", "stateful") == ["serv1", "serv4"]
+    assert sm_dict.has_service("site1", "serv3") and not sm_dict.has_service("site2", "serv3")
+
+    # index is rebuilt after site is changed or invalidated
+    sm_dict["site2"] = {"services": {"serv5": {"module": "stateful"}}}
+    assert sm_dict.get_module_services("site2", "stateful") == ["serv5"]
+    sm_dict["site1"]["services"]["serv6"] = {"module": "custom"}
+    sm_dict.invalidate_index()
+    assert sm_dict.get_module_services("site1", "custom") == ["serv2", "serv6"]
+
+
 def test_ServiceDRStatus_init():
     stat = ServiceDRStatus({'services': {'test': {'healthz': 'up', 'mode': 'disable', 'status': 'done'}}})
     assert stat.status in "done" and stat.healthz in 'up' and stat.mode in 'disable'
+    assert stat.status is ServiceStatus.DONE and stat.healthz is ServiceHealthz.UP and stat.mode is ServiceMode.DISABLE
+    assert not hasattr(stat, "__dict__")
+
+    stat = ServiceDRStatus({'services': {'test': {'healthz': ['up'], 'mode': 'unknown', 'status': None}}})
+    assert stat.healthz is ServiceHealthz.UNKNOWN and stat.mode == "--" and f"{stat.status}" == "--"
 
     assert not ServiceDRStatus({'services': {'test': {'healthz': 'up'}}}).healthz in "degraded"
 
@@ -113,3 +136,111 @@ def test_get_dr_operation_sequence():
 
     with pytest.raises(Exception):
         sm_dict4.get_dr_operation_sequence('serv1', 'wrong_command', 'k8s-1')
+
+
+def test_topological_sorter_successors():
+    # serv1 <- serv2 <- serv3 <- serv5
+    #       <- serv4 <----------|
+    ts = TopologicalSorter2()
+    ts.add("serv2", "serv1")
+    ts.add("serv3", "serv2")
+    ts.add("serv4", "serv1")
+    ts.add("serv5", "serv3", "serv4")
+    ts.add("serv6")
+
+    assert sorted(ts.successors("serv1")) == ["serv2", "serv4"]
+    assert ts.successors("serv5") == []
+    assert ts.successors("unknown") is None
+
+    assert sorted(ts.transitive_successors("serv1")) == ["serv2", "serv3", "serv4", "serv5"]
+    assert ts.transitive_successors("serv3") == ["serv5"]
+    assert ts.transitive_successors("serv6") == []
+    assert ts.transitive_successors("unknown") == []
+
+
+def test_service_graph():
+    import random
+    from graphlib import CycleError
+
+    def make_sorter():
+        rnd = random.Random(1)
+        ts = TopologicalSorter2()
+        for i in range(200):
+            ts.add(f"serv{i}", *[f"serv{rnd.randrange(i)}" for _ in range(rnd.randint(0, 3)) if i])
+        return ts
+
+    ts = make_sorter()
+    graph = ServiceGraph.from_sorter(ts)
+    ts.prepare()
+    assert list(graph.static_order()) == list(make_sorter().static_order())
+
+    # cursors return nodes in the same order as TopologicalSorter and don't affect each other
+    cursor, second_cursor = graph.cursor(), graph.cursor()
+    while ts.is_active():
+        ready = ts.get_ready()
+        assert cursor.get_ready() == ready
+        ts.done(*ready)
+        cursor.done(*ready)
+    assert not cursor.is_active()
+    new_ts = make_sorter()
+    new_ts.prepare()
+    assert second_cursor.is_active() and second_cursor.get_ready() == new_ts.get_ready()
+
+    assert sorted(graph.successors("serv0")) == sorted(ts.successors("serv0"))
+    assert sorted(graph.transitive_successors("serv0")) == sorted(ts.transitive_successors("serv0"))
+
+    with pytest.raises(ValueError):
+        graph.cursor().done("serv1")
+
+    cycle_ts = TopologicalSorter2()
+    cycle_ts.add("serv1", "serv2")
+    cycle_ts.add("serv2", "serv1")
+    with pytest.raises(CycleError):
+        ServiceGraph.from_sorter(cycle_ts)
+
+
+def test_service_graph_critical_path_lengths():
+    ts = TopologicalSorter2()
+    ts.add("aa")
+    ts.add("bb", "aa")
+    ts.add("cc", "aa")
+    ts.add("dd", "bb", "cc")
+    graph = ServiceGraph.from_sorter(ts)
+    assert graph.critical_path_lengths({"aa": 1, "bb": 5, "cc": 2, "dd": 1}) == \
+           {"aa": 7, "bb": 6, "cc": 3, "dd": 1}
+    assert graph.critical_path_lengths({}) == {"aa": 0, "bb": 0, "cc": 0, "dd": 0}
+
+
+def test_service_results():
+    results = ServiceResults()
+    done = results.view(ServiceResults.DONE)
+    failed = results.view(ServiceResults.FAILED)
+    warned = results.view(ServiceResults.WARNED)
+    skipped = results.view(ServiceResults.SKIPPED)
+
+    assert results.set_done("serv1") and results.set_done("serv2") and results.set_done("serv3")
+    assert not results.set_done("serv1")
+    assert results.set_warned("serv2") and results.set_failed("serv3")
+    assert done == ["serv1"] and warned == ["serv2"] and failed == ["serv3"]
+
+    assert results.set_skipped("serv1") and not results.set_skipped("serv3")
+    assert not results.set_done("serv1") and not results.set_warned("serv1")
+    assert results.set_failed("serv1")
+    assert done == [] and failed == ["serv3", "serv1"] and skipped == []
+    assert "serv1" in failed and "serv1" not in skipped and len(failed) == 2
+    assert results.get_state("serv2") == ServiceResults.WARNED
+
+    failed.clear()
+    assert failed == [] and results.get_state("serv1") is None and warned == ["serv2"]
+    results.clear()
+    assert warned == [] and results.set_done("serv2")
+
+    services = [f"serv{i}" for i in range(1000)]
+    results.clear()
+    threads = [threading.Thread(target=lambda: [results.set_done(s) or results.set_failed(s) for s in services])
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert done == [] and sorted(failed) == sorted(services)
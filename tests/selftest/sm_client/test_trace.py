@@ -0,0 +1,64 @@
+import json
+
+from sm_client import trace
+from sm_client.api import DRSession
+from sm_client.trace import Tracer
+from tests.selftest.sm_client.common.test_utils import *
+
+
+def test_tracer(tmp_path):
+    trace_file = tmp_path / "trace.json"
+
+    # tracing is disabled
+    tracer = Tracer()
+    with tracer.span("serv1", "service") as span:
+        span["ok"] = True
+    tracer.export()
+    assert not tracer.enabled and not trace_file.exists()
+
+    tracer = Tracer(str(trace_file))
+    with tracer.span("active k8s-1", "procedure"):
+        with trace.lane("serv1"), tracer.span("serv1 active on k8s-1", "service", site="k8s-1") as span:
+            with tracer.span("poll 1", "poll"):
+                pass
+            span["ok"] = True
+    tracer.export()
+
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    lanes = {event["tid"]: event["args"]["name"] for event in events if event["ph"] == "M"}
+    spans = {event["name"]: event for event in events if event["ph"] == "X"}
+    assert set(spans) == {"active k8s-1", "serv1 active on k8s-1", "poll 1"}
+    assert spans["serv1 active on k8s-1"]["args"] == {"site": "k8s-1", "ok": True}
+    assert lanes[spans["poll 1"]["tid"]] == lanes[spans["serv1 active on k8s-1"]["tid"]] == "serv1"
+    assert lanes[spans["active k8s-1"]["tid"]] != "serv1"
+    procedure, service = spans["active k8s-1"], spans["serv1 active on k8s-1"]
+    assert procedure["ts"] <= service["ts"] and \
+           service["ts"] + service["dur"] <= procedure["ts"] + procedure["dur"]
+
+
+def test_procedure_trace(mocker, tmp_path):
+    trace_file = tmp_path / "trace.json"
+
+    modes = {}  # {(url, service): mode}
+
+    def mock_io_make_http_json_request(url, token, cacert, body, use_auth=True, stats=None, timeout=None, sessions=None, breaker=None):
+        if not body:  # services list
+            services = {serv: {"module": "notstateful", "after": [], "before": [], "sequence": ["standby", "active"],
+                               "timeout": 1, "allowedStandbyStateList": ["up"]} for serv in ("serv1", "serv2")}
+            return True, {"services": services}, 200
+        services = body["run-service"] if isinstance(body["run-service"], list) else [body["run-service"]]
+        if body["procedure"] != "status":
+            modes.update({(url, serv): body["procedure"] for serv in services})
+        return True, {"services": {serv: {"healthz": "up", "mode": modes.get((url, serv), "standby"),
+                                          "status": "done"} for serv in services}}, 200
+
+    mocker.patch("sm_client.utils.io_make_http_json_request", side_effect=mock_io_make_http_json_request)
+
+    result = DRSession(config=test_config_path, trace_out=str(trace_file)).run("active", "k8s-1")
+    assert result.ok
+
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    categories = {event["cat"] for event in events if event["ph"] == "X"}
+    assert {"procedure", "validation", "module", "service", "poll", "http"} <= categories
+    lanes = {event["args"]["name"] for event in events if event["ph"] == "M"}
+    assert {"serv1", "serv2"} <= lanes
@@ -3,9 +3,10 @@ from http import HTTPStatus
 
 import pytest
 
+from sm_client.data import settings
 from sm_client.data.structures import *
 from sm_client.initialization import init_and_check_config
-from sm_client.validation import validate_operation
+from sm_client.validation import validate_operation, check_state_restrictions, compile_state_restrictions
 from tests.selftest.sm_client.common.test_utils import *
 
 
@@ -176,6 +177,31 @@ def test_validate_restrictions(mocker, caplog):
     assert validate_operation(sm_dict, "active", "k8s-1", ["serv1"])
 
 
+def test_check_state_restrictions_requests(mocker):
+    init_and_check_config(args_init(test_restrictions_config_path))
+    assert compile_state_restrictions(settings.current().state_restrictions, ["k8s-1", "k8s-2"]) == \
+           {"serv2": {("active", "active")}, "*": {("standby", "standby")}}
+
+    def mock_services_status(site, services):
+        return {"services": {serv: {"healthz": "up", "mode": "active", "status": "done"} for serv in services}}, \
+            True, 200
+
+    services_status = mocker.patch("sm_client.processing.sm_process_services_status",
+                                   side_effect=mock_services_status)
+    service_status = mocker.patch("sm_client.processing.sm_process_service")
+    sm_dict = SMClusterState()
+    sm_dict["k8s-1"] = {"status": True, "services": {"serv1": {}, "serv2": {}, "serv3": {}}}
+    sm_dict["k8s-2"] = {"status": True, "services": {
+        "serv1": {"status": ServiceDRStatus({"services": {"serv1": {"mode": "standby"}}})}, "serv2": {}, "serv3": {}}}
+
+    # known status is reused, the rest statuses are requested with one bulk request
+    assert not check_state_restrictions(["serv1", "serv2", "serv3"], "k8s-1", "active", sm_dict)
+    services_status.assert_called_once_with("k8s-2", ["serv2", "serv3"])
+    service_status.assert_not_called()
+    assert check_state_restrictions(["serv1", "serv3"], "k8s-1", "active", sm_dict)
+    assert not check_state_restrictions(["serv1"], "k8s-1", "standby", sm_dict)
+
+
 def test_deps_consistence_validation(mocker, caplog):
     init_and_check_config(args_init())
 